@@ -0,0 +1,27 @@
+# backend/admin_auth.py — Protección mínima para endpoints de administración
+from __future__ import annotations
+
+import hmac
+
+from flask import jsonify, request
+
+from settings import get_settings
+
+
+def _token_from_request() -> str:
+    tok = request.headers.get("X-Admin-Token") or ""
+    if not tok:
+        auth = request.headers.get("Authorization") or ""
+        if auth.lower().startswith("bearer "):
+            tok = auth[7:].strip()
+    return tok
+
+
+def require_admin():
+    """Devuelve una respuesta de error si el request no trae ADMIN_TOKEN, o None si está autorizado."""
+    expected = get_settings().admin_token
+    if not expected:
+        return jsonify({"error": "admin_disabled", "detail": "Configurar ADMIN_TOKEN"}), 403
+    if not hmac.compare_digest(_token_from_request(), expected):
+        return jsonify({"error": "unauthorized"}), 401
+    return None
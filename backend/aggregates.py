@@ -0,0 +1,115 @@
+# backend/aggregates.py — Conteos por grupo precalculados (empresa / sector / lugar_trabajo)
+#
+# Mantiene un contador por cada combinación de dimensiones (simples y cruzadas,
+# p. ej. empresa×sector) y lo actualiza fila a fila con los cambios de la
+# réplica: sumar la versión nueva y restar la anterior. Sin filtros de fecha la
+# respuesta sale de los contadores; con filtros se recorre la copia compacta en
+# memoria y el resultado se cachea hasta el próximo cambio.
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import Counter
+
+DIMENSIONS = ("empresa", "sector", "lugar_trabajo")
+
+COMBOS: tuple[tuple[str, ...], ...] = tuple(
+    c for n in range(1, len(DIMENSIONS) + 1) for c in itertools.combinations(DIMENSIONS, n)
+)
+
+# Posiciones dentro de la tupla compacta que se guarda por afiliado
+_IDX = {d: i for i, d in enumerate(DIMENSIONS)}
+_CREATED = len(DIMENSIONS)
+_UPDATED = len(DIMENSIONS) + 1
+
+
+def parse_dims(raw: str | None, default: str = "empresa") -> tuple[str, ...] | None:
+    """'sector,empresa' -> ('empresa', 'sector') en el orden canónico; None si es inválido."""
+    parts = [p.strip() for p in (raw or default).split(",") if p.strip()]
+    if not parts or any(p not in _IDX for p in parts):
+        return None
+    return tuple(d for d in DIMENSIONS if d in parts)
+
+
+class GroupAggregates:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: dict[int, tuple] = {}
+        self._counts: dict[tuple[str, ...], Counter] = {c: Counter() for c in COMBOS}
+        self._sorted: dict[tuple, list] = {}
+        self.version = 0
+        self.as_of: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _compact(row: dict) -> tuple:
+        return tuple(row.get(d) for d in DIMENSIONS) + (row.get("creado_en"), row.get("actualizado_en"))
+
+    def _bump(self, compact: tuple, delta: int):
+        for combo in COMBOS:
+            key = tuple(compact[_IDX[d]] for d in combo)
+            counter = self._counts[combo]
+            counter[key] += delta
+            if counter[key] <= 0:
+                del counter[key]
+
+    def apply(self, rows: list[dict], deleted_ids: list[int], reset: bool = False):
+        with self._lock:
+            if reset:
+                self._rows.clear()
+                for c in self._counts.values():
+                    c.clear()
+            for i in deleted_ids:
+                old = self._rows.pop(i, None)
+                if old is not None:
+                    self._bump(old, -1)
+            for row in rows:
+                i = row.get("id")
+                if i is None:
+                    continue
+                new = self._compact(row)
+                old = self._rows.get(i)
+                if old == new:
+                    continue
+                if old is not None:
+                    self._bump(old, -1)
+                self._rows[i] = new
+                self._bump(new, +1)
+            self._sorted.clear()
+            self.version += 1
+            self.as_of = time.time()
+
+    def query(self, dims: tuple[str, ...], limit: int = 500, created_from: str | None = None,
+              created_to: str | None = None, updated_from: str | None = None,
+              updated_to: str | None = None) -> list[tuple[tuple, int]]:
+        """[(valores, cantidad)] ordenado por cantidad desc."""
+        filtered = any((created_from, created_to, updated_from, updated_to))
+        cache_key = (dims, limit, created_from, created_to, updated_from, updated_to)
+        with self._lock:
+            hit = self._sorted.get(cache_key)
+            if hit is not None:
+                return hit
+            if not filtered:
+                counter = self._counts[dims]
+            else:
+                counter = Counter()
+                pos = [_IDX[d] for d in dims]
+                for r in self._rows.values():
+                    c, u = r[_CREATED] or "", r[_UPDATED] or ""
+                    if created_from and c < created_from:
+                        continue
+                    if created_to and (not c or c >= created_to):
+                        continue
+                    if updated_from and u < updated_from:
+                        continue
+                    if updated_to and (not u or u >= updated_to):
+                        continue
+                    counter[tuple(r[p] for p in pos)] += 1
+            out = counter.most_common(limit)
+            if len(self._sorted) >= 256:
+                self._sorted.clear()
+            self._sorted[cache_key] = out
+            return out
@@ -1,82 +1,149 @@
 # backend/app.py
-import os
+#
+# Arranque: el .env se lee una vez (settings.py) antes de importar los módulos
+# que leen variables; los blueprints se importan dentro de create_app (los
+# opcionales, sólo si figuran en BLUEPRINTS) y requests/urllib3 recién con la
+# primera consulta a Supabase. La app no se construye al importar este módulo:
+# wsgi.py llama a create_app() una vez.
+import importlib
 import time
 import uuid
 import logging
-from flask import Flask, jsonify, request, g
-from flask_cors import CORS
-from werkzeug.middleware.proxy_fix import ProxyFix
-from dotenv import load_dotenv
 
-load_dotenv()
+from settings import get_settings
 
-# ===== Blueprints =====
-from routes.afiliados import bp as afiliados_bp  # requerido
+_cfg = get_settings()
 
-# Opcionales: no fallar si no existen
-try:
-    from routes.tramites import bp as tramites_bp  # type: ignore
-except Exception:
-    tramites_bp = None  # type: ignore
+from flask import Flask, Response, jsonify, request, g  # noqa: E402
+from flask_cors import CORS  # noqa: E402
+from werkzeug.middleware.proxy_fix import ProxyFix  # noqa: E402
 
-try:
-    from routes.solicitudes import bp as solicitudes_bp  # type: ignore
-except Exception:
-    solicitudes_bp = None  # type: ignore
+import compression  # noqa: E402
+import json_provider  # noqa: E402
+import metrics  # noqa: E402
+import profiler  # noqa: E402
+import ratelimit  # noqa: E402
+import slowlog  # noqa: E402
+from admin_auth import require_admin  # noqa: E402
+from breaker import CircuitOpenError, UpstreamBusyError  # noqa: E402
+from cache import all_stats as _cache_stats  # noqa: E402
+from supabase_client import (  # noqa: E402
+    breaker_status as _breaker_status, gate_status as _gate_status, pool_stats as _pool_stats,
+)
 
-try:
-    from routes.ping import bp as ping_bp  # type: ignore
-except Exception:
-    ping_bp = None  # type: ignore
+# Blueprints opcionales: nombre en BLUEPRINTS -> módulo (se importan en create_app)
+OPTIONAL_BLUEPRINTS = {
+    "ping": "routes.ping",
+    "tramites": "routes.tramites",
+    "solicitudes": "routes.solicitudes",
+    "novedades": "routes.novedades",
+}
 
-# (para deep health opcional)
-try:
-    from routes.afiliados import _get_session as _supa_session
-except Exception:
-    _supa_session = None
+
+def _pool_metrics():
+    st = _pool_stats()
+    pid = {"pid": st["pid"]}
+    lines = []
+    for key in ("open", "idle", "in_use", "pool_maxsize"):
+        lines += metrics.gauge_lines(f"supabase_pool_{key}", f"Pool a Supabase: {key}", [(pid, st[key])])
+    for key in ("created", "new", "reused"):
+        lines += metrics.gauge_lines(f"supabase_pool_{key}_total", f"Pool a Supabase: {key}", [(pid, st[key])],
+                                     kind="counter")
+    br = _breaker_status()
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    lines += metrics.gauge_lines("supabase_breaker_state", "Circuit breaker: 0 closed, 1 half_open, 2 open",
+                                 [(pid, states[br["state"]])])
+    lines += metrics.gauge_lines("supabase_breaker_opened_total", "Veces que se abrió el circuito",
+                                 [(pid, br["opened_count"])], kind="counter")
+    lines += metrics.gauge_lines("supabase_retry_budget_denied_total", "Reintentos negados por presupuesto",
+                                 [(pid, br["retry_budget"]["denied"])], kind="counter")
+    return lines
+
+
+def _limit_metrics():
+    rl = ratelimit.status()
+    gate = _gate_status()
+    kinds = ("ip", "api_key")
+    lines = []
+    for key in ("allowed", "rejected"):
+        lines += metrics.gauge_lines(f"ratelimit_{key}_total", f"Rate limit por cliente: {key}",
+                                     [({"kind": k}, rl[k][key]) for k in kinds], kind="counter")
+    lines += metrics.gauge_lines("ratelimit_clients", "Clientes con balde activo",
+                                 [({"kind": k}, rl[k]["clients"]) for k in kinds])
+    lines += metrics.gauge_lines("supabase_gate_inflight", "Llamadas a Supabase en vuelo", [({}, gate["inflight"])])
+    lines += metrics.gauge_lines("supabase_gate_queued", "Llamadas a Supabase esperando lugar", [({}, gate["queued"])])
+    lines += metrics.gauge_lines("supabase_gate_rejected_total", "Llamadas rechazadas por la admisión",
+                                 [({"reason": "queue_full"}, gate["rejected_full"]),
+                                  ({"reason": "queue_timeout"}, gate["rejected_timeout"])], kind="counter")
+    return lines
+
+
+def _cache_metrics():
+    stats = _cache_stats()
+    lines = []
+    for key, kind in (("size", "gauge"), ("hits", "counter"), ("misses", "counter"),
+                      ("evictions", "counter"), ("stampedes_avoided", "counter")):
+        name = f"cache_{key}" if kind == "gauge" else f"cache_{key}_total"
+        lines += metrics.gauge_lines(name, f"Cachés en memoria: {key}",
+                                     [({"cache": st["name"]}, st[key]) for st in stats if key in st], kind=kind)
+    for key in ("calls", "upstream", "shared", "micro_hits"):
+        lines += metrics.gauge_lines(f"coalescer_{key}_total", f"Coalescing de consultas: {key}",
+                                     [({"coalescer": st["name"]}, st[key]) for st in stats if "calls" in st],
+                                     kind="counter")
+    return lines
+
+
+metrics.register_collector(_pool_metrics)
+metrics.register_collector(_cache_metrics)
+metrics.register_collector(_limit_metrics)
 
 
 def create_app():
+    cfg = get_settings()
+    # Requerido: sin afiliados no hay backend
+    from routes.afiliados import bp as afiliados_bp, _get_session as _supa_session, replica_status as _replica_status
+
     app = Flask(__name__)
 
     # ---------- Config ----------
     app.config["JSON_SORT_KEYS"] = False
     app.config["JSONIFY_PRETTYPRINT_REGULAR"] = False
     app.config["PROPAGATE_EXCEPTIONS"] = False
+    json_engine = json_provider.install(app)
 
-    APP_NAME = os.getenv("APP_NAME", "seccional-backend")
-    APP_VERSION = os.getenv("APP_VERSION", "1.0.0")
+    APP_NAME = cfg.app_name
+    APP_VERSION = cfg.app_version
 
     # Respetar X-Forwarded-* (Render/NGINX)
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1)  # type: ignore
 
     # ---------- CORS ----------
-    origins = os.getenv(
-        "CORS_ORIGINS",
-        "http://localhost:5173,http://127.0.0.1:5173"
-    ).split(",")
     CORS(
         app,
-        origins=[o.strip() for o in origins if o.strip()],
+        origins=list(cfg.cors_origins),
         supports_credentials=True,
         methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-        allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
-        expose_headers=["Content-Range", "X-Request-ID"],
+        allow_headers=["Content-Type", "Authorization", "X-Requested-With", "X-Admin-Token", "X-API-Key"],
+        expose_headers=["Content-Range", "X-Request-ID", "X-Cache", "ETag", "Server-Timing",
+                        "Retry-After", "RateLimit-Limit", "RateLimit-Remaining"],
         max_age=86400,
     )
 
     # ---------- Logging ----------
     if not logging.getLogger().handlers:
         logging.basicConfig(
-            level=os.getenv("LOG_LEVEL", "INFO"),
+            level=cfg.log_level,
             format="%(asctime)s %(levelname)s %(name)s: %(message)s",
         )
     start_ts = time.time()
+    METRICS_ENABLED = cfg.metrics_enabled
 
     # ---------- Hooks ----------
     @app.before_request
     def _add_request_id():
         g.request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        compression.strip_etag_suffix(request.environ)
+        metrics.begin_request(trace=slowlog.SLOWLOG_ENABLED)
 
     @app.after_request
     def _add_headers(resp):
@@ -86,11 +153,27 @@ def create_app():
         resp.headers.setdefault("Referrer-Policy", "strict-origin-when-cross-origin")
         # Observabilidad
         resp.headers["X-Request-ID"] = g.get("request_id", "-")
-        # Cache control mínimo para JSON
+        # Cache control mínimo para JSON (las rutas con política propia ya lo fijaron)
         if (getattr(resp, "mimetype", None) or "").startswith("application/json"):
             resp.headers.setdefault("Cache-Control", "no-store")
+        # Latencia por ruta + Server-Timing (upstream vs. local)
+        timing = metrics.end_request()
+        if timing is not None:
+            total_s = time.perf_counter() - timing.t0
+            resp.headers["Server-Timing"] = metrics.server_timing(timing, total_s)
+            if METRICS_ENABLED:
+                route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+                size = None if resp.is_streamed else resp.calculate_content_length()
+                metrics.observe_request(route, request.method, resp.status_code, total_s, size)
+        # gzip/brotli según Accept-Encoding (lo último: ya con todos los headers)
+        resp = compression.compress_response(resp, request.accept_encodings)
+        if timing is not None and timing.phases is not None:
+            slowlog.observe(timing, resp)
         return resp
 
+    # Límite por cliente (después de ProxyFix: la IP es la del cliente)
+    ratelimit.init_app(app)
+
     # ---------- Salud ----------
     @app.get("/")
     def root():
@@ -99,12 +182,13 @@ def create_app():
     @app.get("/api/health")
     def health():
         uptime_s = int(time.time() - start_ts)
-        return {"ok": True, "service": APP_NAME, "version": APP_VERSION, "uptime_s": uptime_s}
+        return {
+            "ok": True, "service": APP_NAME, "version": APP_VERSION, "uptime_s": uptime_s,
+            "worker_class": cfg.worker_class, "json": json_engine,
+        }
 
     @app.get("/api/health/deep")
     def deep_health():
-        if not _supa_session:
-            return jsonify({"ok": True, "supabase": "skip"}), 200
         supa_url, table, sess = _supa_session()
         if not sess:
             return jsonify({"ok": True, "supabase": "not_configured"}), 200
@@ -115,9 +199,84 @@ def create_app():
                 timeout=5
             )
             r.raise_for_status()
-            return jsonify({"ok": True, "supabase": "ok"}), 200
+            return jsonify({
+                "ok": True, "supabase": "ok", "pool": _pool_stats(),
+                "breaker": _breaker_status(), "gate": _gate_status(), "replica": _replica_status(),
+            }), 200
         except Exception as e:
-            return jsonify({"ok": False, "supabase": "error", "detail": str(e)[:180]}), 500
+            # Con el circuito abierto (o la admisión llena) no se llega a consultar:
+            # 503 (no es un error nuestro)
+            circuit_open = isinstance(e, CircuitOpenError)
+            state = "error"
+            if circuit_open:
+                state = "overloaded" if isinstance(e, UpstreamBusyError) else "circuit_open"
+            return jsonify({
+                "ok": False, "supabase": state, "detail": str(e)[:180],
+                "pool": _pool_stats(), "breaker": _breaker_status(), "gate": _gate_status(),
+                "replica": _replica_status(),
+            }), 503 if circuit_open else 500
+
+    @app.get("/api/health/pool")
+    def pool_health():
+        return jsonify({"ok": True, "pool": _pool_stats()}), 200
+
+    # ---------- Límites (admin) ----------
+    @app.get("/api/_limits")
+    def limits_status():
+        denied = require_admin()
+        if denied:
+            return denied
+        return jsonify({"ratelimit": ratelimit.status(top=20), "supabase_gate": _gate_status()}), 200
+
+    # ---------- Diagnóstico (admin) ----------
+    @app.get("/api/_slowlog")
+    def slowlog_entries():
+        denied = require_admin()
+        if denied:
+            return denied
+        try:
+            limit = int(request.args.get("limit") or 50)
+        except ValueError:
+            limit = 50
+        return jsonify(slowlog.status(limit)), 200
+
+    @app.get("/api/_profile")
+    def profile_worker():
+        # Muestrea ESTE worker durante `seconds`; con varios workers, cada llamada cae en uno
+        denied = require_admin()
+        if denied:
+            return denied
+        try:
+            seconds = float(request.args.get("seconds") or 10)
+            interval_ms = float(request.args.get("interval_ms") or profiler.PROFILE_INTERVAL_MS)
+        except ValueError:
+            return jsonify({"error": "parametro_invalido", "detail": "seconds/interval_ms deben ser números"}), 400
+        try:
+            result = profiler.sample(
+                seconds,
+                interval_ms / 1000,
+                only_requests=request.args.get("all") not in {"1", "true"},
+                by_thread=request.args.get("threads") in {"1", "true"},
+            )
+        except profiler.ProfilerBusy as e:
+            return jsonify({"error": "profile_en_curso", "detail": str(e)}), 409
+        headers = {
+            "Cache-Control": "no-store",
+            "X-Profile-Pid": str(result["pid"]),
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Ticks": str(result["ticks"]),
+        }
+        if (request.args.get("format") or "collapsed") == "json":
+            stacks = result.pop("stacks")
+            return jsonify({**result, "top": profiler.top_functions(stacks)}), 200, headers
+        return Response(profiler.collapsed(result["stacks"]), mimetype="text/plain", headers=headers)
+
+    # ---------- Métricas (Prometheus) ----------
+    @app.get("/metrics")
+    def prometheus_metrics():
+        if not METRICS_ENABLED:
+            return jsonify({"error": "not_found"}), 404
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
     # ---------- Manejadores de error ----------
     @app.errorhandler(404)
@@ -133,25 +292,28 @@ def create_app():
     app.logger.info("Registrando blueprint: afiliados")
     app.register_blueprint(afiliados_bp)
 
-    if ping_bp is not None:
-        app.logger.info("Registrando blueprint: ping")
-        app.register_blueprint(ping_bp)
-    else:
-        app.logger.warning("Blueprint 'ping' no encontrado. Saltando registro.")
-
-    if tramites_bp is not None:
-        app.logger.info("Registrando blueprint: tramites")
-        app.register_blueprint(tramites_bp)
-    else:
-        app.logger.warning("Blueprint 'tramites' no encontrado. Saltando registro.")
-
-    if solicitudes_bp is not None:
-        app.logger.info("Registrando blueprint: solicitudes")
-        app.register_blueprint(solicitudes_bp)
-    else:
-        app.logger.warning("Blueprint 'solicitudes' no encontrado. Saltando registro.")
+    # Opcionales: sólo se importan los habilitados, y no fallar si no existen
+    for name in cfg.blueprints:
+        module = OPTIONAL_BLUEPRINTS.get(name)
+        if module is None:
+            app.logger.warning("Blueprint '%s' desconocido. Saltando registro.", name)
+            continue
+        try:
+            bp = importlib.import_module(module).bp
+        except Exception as e:
+            app.logger.warning("Blueprint '%s' no disponible (%s). Saltando registro.", name, e)
+            continue
+        app.logger.info("Registrando blueprint: %s", name)
+        app.register_blueprint(bp)
 
+    # Con SLOWLOG_ENABLED: medir hooks vs. vista (ya con todas las rutas registradas)
+    slowlog.init_app(app)
     return app
 
 
-app = create_app()
+def __getattr__(name):
+    # `flask --app app run` busca app.app: se construye recién cuando se pide
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,116 @@
+# backend/bench/cache_hits.py — Hit rate de las cachés según backend y cantidad de workers
+#
+# Levanta el fake de PostgREST (contando los requests que le llegan) y el fake de
+# Redis, arranca gunicorn con cada CACHE_BACKEND y cada cantidad de workers, y
+# pide detalles por DNI sobre un conjunto acotado de DNIs. Hit rate = 1 -
+# consultas al upstream / requests.
+#
+#   cd backend && python bench/cache_hits.py --workers 1,2,4,8 --backends local,sqlite,redis
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import Client, gunicorn  # noqa: E402
+from fake_postgrest import serve as serve_postgrest  # noqa: E402
+from fake_redis import serve as serve_redis  # noqa: E402
+
+
+def _count_requests(srv) -> list[int]:
+    counter = [0]
+    lock = threading.Lock()
+    handler = srv.RequestHandlerClass
+    do_get = handler.do_GET
+
+    def counted(self):
+        with lock:
+            counter[0] += 1
+        return do_get(self)
+
+    handler.do_GET = counted
+    return counter
+
+
+def run(backend: str, workers: int, upstream, counter, redis_port: int, args) -> dict:
+    tmp = tempfile.mkdtemp(prefix="cache_hits_")
+    env = {
+        "SUPABASE_URL": f"http://127.0.0.1:{upstream.server_port}",
+        "SUPABASE_SERVICE_ROLE_KEY": "bench",
+        "SUPABASE_PREWARM": "0",
+        "REPLICA_SYNC": "0",
+        "WEB_CONCURRENCY": workers,
+        "CACHE_BACKEND": backend,
+        "CACHE_SQLITE_PATH": os.path.join(tmp, "cache.sqlite3"),
+        "CACHE_REDIS_URL": f"redis://127.0.0.1:{redis_port}/0",
+        "CACHE_PREFIX": f"bench{time.time_ns()}",
+    }
+    rnd = random.Random(args.seed)
+    dnis = [str(20_000_000 + i * 7 % 30_000_000) for i in rnd.sample(range(1, args.rows + 1), args.keys)]
+    with gunicorn(env, f"{backend}x{workers}") as port:
+        base = counter[0]
+        lock = threading.Lock()
+        todo = [args.requests]
+
+        def client():
+            c = Client("127.0.0.1", port)
+            r = random.Random()
+            while True:
+                with lock:
+                    if todo[0] <= 0:
+                        break
+                    todo[0] -= 1
+                c.get(f"/api/afiliados/{r.choice(dnis)}")
+            c.close()
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        upstream_calls = counter[0] - base
+    return {
+        "backend": backend, "workers": workers, "upstream": upstream_calls,
+        "hit_rate": 1 - upstream_calls / args.requests, "rps": args.requests / elapsed,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hit rate de las cachés según backend y cantidad de workers")
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--keys", type=int, default=500, help="DNIs distintos que se piden")
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--latency-ms", type=float, default=10.0)
+    ap.add_argument("--workers", default="1,4")
+    ap.add_argument("--backends", default="local,sqlite,redis")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    upstream = serve_postgrest(args.rows, latency_ms=args.latency_ms)
+    counter = _count_requests(upstream)
+    redis = serve_redis()
+    results = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+            print(f"-> {backend} x{workers} ...", flush=True)
+            results.append(run(backend, workers, upstream, counter, redis.server_address[1], args))
+    upstream.shutdown()
+    redis.shutdown()
+
+    print(f"\nkeys={args.keys} requests={args.requests} concurrency={args.concurrency} latency={args.latency_ms}ms")
+    print(f"{'backend':<9}{'workers':>8}{'upstream':>10}{'hit rate':>10}{'rps':>9}")
+    for r in results:
+        print(f"{r['backend']:<9}{r['workers']:>8}{r['upstream']:>10}{r['hit_rate']:>10.1%}{r['rps']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
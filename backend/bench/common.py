@@ -0,0 +1,135 @@
+# backend/bench/common.py — Utilidades compartidas por los scripts de benchmark
+from __future__ import annotations
+
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+class Client:
+    """Conexión keep-alive por hilo: mide el servidor, no el handshake TCP."""
+
+    def __init__(self, host: str, port: int, timeout: float = 60.0):
+        self.host, self.port, self.timeout = host, port, timeout
+        self._conn: http.client.HTTPConnection | None = None
+
+    def request(self, method: str, path: str, body: bytes | None = None,
+                headers: dict | None = None) -> tuple[int, int, float]:
+        """Devuelve (status, bytes leídos, segundos); status 0 = error de red."""
+        t0 = time.perf_counter()
+        for attempt in (0, 1):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers=headers or {})
+                r = self._conn.getresponse()
+                n = 0
+                while True:
+                    chunk = r.read(65536)
+                    if not chunk:
+                        break
+                    n += len(chunk)
+                if r.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return r.status, n, time.perf_counter() - t0
+            except (http.client.HTTPException, OSError):
+                # El servidor pudo cerrar la conexión ociosa: un reintento con una nueva
+                self.close()
+                if attempt:
+                    return 0, 0, time.perf_counter() - t0
+        return 0, 0, time.perf_counter() - t0
+
+    def get(self, path: str, headers: dict | None = None) -> tuple[int, int, float]:
+        return self.request("GET", path, headers=headers)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def wait_http(port: int, path: str, timeout: float = 30.0) -> bool:
+    deadline = time.time() + timeout
+    client = Client("127.0.0.1", port, timeout=2)
+    while time.time() < deadline:
+        if client.get(path)[0] == 200:
+            client.close()
+            return True
+        client.close()
+        time.sleep(0.2)
+    return False
+
+
+@contextmanager
+def gunicorn(env_overrides: dict, name: str = "backend"):
+    """Levanta `gunicorn wsgi:app -c gunicorn.conf.py` y devuelve su puerto."""
+    port = free_port()
+    env = dict(os.environ)
+    # Todo el tráfico sale de 127.0.0.1: sin límite por cliente salvo que se pida
+    env.update({"PORT": str(port), "GUNICORN_TIMEOUT": "120", "LOG_LEVEL": "WARNING", "RATE_LIMIT_ENABLED": "0"})
+    env.update({k: str(v) for k, v in env_overrides.items()})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_http(port, "/api/health", 30):
+            raise RuntimeError(f"gunicorn ({name}) no arrancó")
+        yield port
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def closed_loop(port: int, concurrency: int, duration: float, next_request, on_result):
+    """`concurrency` clientes pidiendo sin pausa durante `duration` segundos.
+    next_request(n) -> (método, path, body, headers); on_result(status, bytes, segundos)."""
+    stop = time.time() + duration
+    lock = threading.Lock()
+    counter = [0]
+
+    def worker():
+        client = Client("127.0.0.1", port)
+        try:
+            while time.time() < stop:
+                with lock:
+                    counter[0] += 1
+                    n = counter[0]
+                method, path, body, headers = next_request(n)
+                status, size, secs = client.request(method, path, body, headers)
+                with lock:
+                    on_result(status, size, secs)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
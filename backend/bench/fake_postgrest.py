@@ -0,0 +1,505 @@
+# backend/bench/fake_postgrest.py — Supabase/PostgREST de mentira para benchmarks
+#
+# Implementa el subconjunto que usan routes/afiliados.py y replica.py sobre un
+# padrón sintético en memoria:
+#   select=a,b | * | <grupo>,count:id (+ group=<grupo>)
+#   order=col.asc|desc[.nullsfirst|.nullslast],...   limit / offset / Range
+#   col=eq|neq|gt|gte|lt|lte|like|ilike|in|is.<valor>   or=(...) / and=(...) anidados
+#   Prefer: count=exact|planned|estimated  ->  Content-Range a-b/total
+#   POST [...] con on_conflict=dni (upsert; NOT NULL en apellido para filas nuevas)
+# con latencia y tasa de errores inyectables.
+#
+#   python bench/fake_postgrest.py --rows 200000 --port 54321 --latency-ms 20 --error-rate 0.01
+#   SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_ROLE_KEY=x flask run
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+COLUMNS = [
+    "id", "dni", "numero_socio", "apellido", "nombres", "sexo",
+    "empresa", "sector", "lugar_trabajo",
+    "direccion", "email", "celular",
+    "denominacion_funcion", "denominacion_posicion", "legajo",
+    "fecha_nacimiento", "fecha_primer_ingreso",
+    "creado_en", "actualizado_en", "apellido_nombre",
+]
+_POS = {c: i for i, c in enumerate(COLUMNS)}
+
+APELLIDOS = [
+    "Pérez", "González", "Gómez", "Fernández", "López", "Rodríguez", "Martínez", "Sánchez", "Díaz",
+    "Álvarez", "Romero", "Sosa", "Benítez", "Ruiz", "Acosta", "Torres", "Flores", "Medina", "Herrera",
+    "Suárez", "Aguirre", "Giménez", "Molina", "Castro", "Ortiz", "Silva", "Núñez", "Luna", "Juárez",
+    "Cabrera", "Ríos", "Ferreyra", "Godoy", "Morales", "Domínguez", "Moreno", "Peralta", "Vega",
+    "Carrizo", "Quiroga", "Castillo", "Ledesma", "Muñoz", "Ojeda", "Ponce", "Vera", "Vázquez",
+    "Villalba", "Cardozo", "Navarro",
+]
+NOMBRES = [
+    "Juan", "María", "José", "Ana", "Luis", "Lucía", "Nicolás", "Sofía", "Martín", "Valentina",
+    "Carlos", "Laura", "Jorge", "Paula", "Diego", "Camila", "Pablo", "Julieta", "Sergio", "Florencia",
+    "Miguel", "Daniela", "Héctor", "Gabriela", "Raúl", "Romina", "Walter", "Silvina", "Oscar", "Natalia",
+]
+EMPRESAS = ["YPF", "Pan American Energy", "Tecpetrol", "Pluspetrol", "Vista", "Shell", "TotalEnergies",
+            "Chevron", "Pampa Energía", "CGC", "Capex", "Roch", "Petroquímica Comodoro", "Aconcagua"]
+SECTORES = ["Producción", "Perforación", "Mantenimiento", "Logística", "Administración", "Seguridad",
+            "Laboratorio", "Workover", "Ingeniería", "Compras"]
+LUGARES = ["Comodoro Rivadavia", "Caleta Olivia", "Pico Truncado", "Las Heras", "Cañadón Seco",
+           "Sarmiento", "Rada Tilly", "Neuquén", "Añelo", "Rincón de los Sauces"]
+FUNCIONES = ["Operador de producción", "Técnico de mantenimiento", "Supervisor de campo",
+             "Analista administrativo", "Chofer de equipo pesado", "Enganchador", "Maquinista"]
+POSICIONES = ["Junior", "Semi senior", "Senior", "Jefe de turno", "Coordinador"]
+CALLES = ["San Martín", "Rivadavia", "Belgrano", "Mitre", "Sarmiento", "Moreno", "Alem", "Pellegrini"]
+
+
+# -----------------------------
+# Padrón sintético
+# -----------------------------
+def _ts(base: int, rnd: random.Random, span_days: int) -> str:
+    t = time.gmtime(base + rnd.randrange(span_days * 86400))
+    return time.strftime("%Y-%m-%dT%H:%M:%S", t)
+
+
+def generate(n: int, seed: int = 1) -> list[tuple]:
+    """Filas como tuplas (en el orden de COLUMNS); los textos repetidos se comparten."""
+    rnd = random.Random(seed)
+    base_2015 = 1420070400
+    rows = []
+    for i in range(1, n + 1):
+        ape = rnd.choice(APELLIDOS)
+        nom = rnd.choice(NOMBRES) if rnd.random() < 0.6 else f"{rnd.choice(NOMBRES)} {rnd.choice(NOMBRES)}"
+        creado = _ts(base_2015, rnd, 3000)
+        actualizado = max(creado, _ts(base_2015, rnd, 3500))
+        rows.append((
+            i,
+            str(20_000_000 + i * 7 % 30_000_000),
+            str(100_000 + i),
+            ape,
+            nom,
+            rnd.choice("MF"),
+            rnd.choice(EMPRESAS),
+            rnd.choice(SECTORES),
+            rnd.choice(LUGARES),
+            f"{rnd.choice(CALLES)} {rnd.randrange(1, 5000)}" if rnd.random() < 0.9 else None,
+            f"afiliado{i}@mail.com" if rnd.random() < 0.7 else None,
+            f"297{rnd.randrange(4_000_000, 5_000_000)}" if rnd.random() < 0.8 else None,
+            rnd.choice(FUNCIONES),
+            rnd.choice(POSICIONES),
+            str(rnd.randrange(1000, 99999)),
+            f"{rnd.randrange(1960, 2004)}-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}",
+            f"{rnd.randrange(1985, 2024)}-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}",
+            creado,
+            actualizado,
+            f"{ape} {nom}",
+        ))
+    return rows
+
+
+# -----------------------------
+# Filtros PostgREST
+# -----------------------------
+def _split_top(s: str) -> list[str]:
+    """Separa por comas de primer nivel (respeta paréntesis y comillas)."""
+    out, depth, buf, quoted, esc = [], 0, [], False, False
+    for ch in s:
+        if esc:
+            buf.append(ch)
+            esc = False
+            continue
+        if ch == "\\" and quoted:
+            buf.append(ch)
+            esc = True
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            out.append("".join(buf))
+            buf = []
+            continue
+        buf.append(ch)
+    if buf:
+        out.append("".join(buf))
+    return out
+
+
+def _unquote(v: str) -> str:
+    if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", v[1:-1])
+    return v
+
+
+def _like_regex(pattern: str, ci: bool) -> re.Pattern:
+    rx = "".join(".*" if ch in "*%" else re.escape(ch) for ch in pattern)
+    return re.compile(f"^{rx}$", re.IGNORECASE | re.DOTALL if ci else re.DOTALL)
+
+
+def _leaf(col: str, expr: str):
+    """Predicado sobre una fila para `col` + "op.valor" (admite "not.")."""
+    neg = False
+    if expr.startswith("not."):
+        neg, expr = True, expr[4:]
+    op, _, raw = expr.partition(".")
+    pos = _POS.get(col)
+    if pos is None:
+        raise ValueError(f"columna desconocida: {col}")
+
+    if op == "is":
+        want = {"null": None, "true": True, "false": False}[raw.lower()]
+        pred = (lambda r: r[pos] is want)
+    elif op == "in":
+        vals = {_unquote(v) for v in _split_top(raw.strip("()"))}
+        pred = (lambda r: r[pos] is not None and str(r[pos]) in vals)
+    elif op in ("like", "ilike"):
+        pattern = _unquote(raw)
+        inner = pattern.strip("*%")
+        if pattern.startswith(("*", "%")) and pattern.endswith(("*", "%")) and not any(c in inner for c in "*%"):
+            # *texto*: búsqueda de subcadena, bastante más rápida que una regex
+            if op == "ilike":
+                needle = inner.lower()
+                pred = (lambda r: r[pos] is not None and needle in str(r[pos]).lower())
+            else:
+                pred = (lambda r: r[pos] is not None and inner in str(r[pos]))
+        else:
+            rx = _like_regex(pattern, op == "ilike")
+            pred = (lambda r: r[pos] is not None and rx.match(str(r[pos])) is not None)
+    else:
+        v = _unquote(raw)
+        typed = int(v) if col == "id" and v.lstrip("-").isdigit() else v
+        cmp = {
+            "eq":  lambda a: a == typed,
+            "neq": lambda a: a != typed,
+            "gt":  lambda a: a > typed,
+            "gte": lambda a: a >= typed,
+            "lt":  lambda a: a < typed,
+            "lte": lambda a: a <= typed,
+        }[op]
+        pred = (lambda r: r[pos] is not None and cmp(r[pos]))
+    return (lambda r: not pred(r)) if neg else pred
+
+
+def _logic(kind: str, body: str):
+    """or=(...) / and=(...), con and(...)/or(...) anidados y condiciones col.op.valor."""
+    parts = []
+    for item in _split_top(body.strip()[1:-1]):
+        item = item.strip()
+        if item.startswith(("and(", "or(")):
+            sub, _, rest = item.partition("(")
+            parts.append(_logic(sub, "(" + rest))
+        else:
+            col, _, expr = item.partition(".")
+            parts.append(_leaf(col, expr))
+    if kind == "or":
+        return lambda r: any(p(r) for p in parts)
+    return lambda r: all(p(r) for p in parts)
+
+
+# -----------------------------
+# Motor de consultas
+# -----------------------------
+class Table:
+    def __init__(self, rows: list[tuple]):
+        self.rows = rows
+        self.by_dni = {r[_POS["dni"]]: r for r in rows}
+        self._sorted: dict[tuple, list[tuple]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _order_keys(order: str) -> tuple:
+        keys = []
+        for part in order.split(","):
+            bits = part.split(".")
+            col, desc = bits[0], "desc" in bits[1:]
+            # Como Postgres: NULL es el mayor valor salvo que se pida otra cosa
+            nulls_first = "nullsfirst" in bits[1:] or (desc and "nullslast" not in bits[1:])
+            keys.append((_POS[col], desc, nulls_first))
+        return tuple(keys)
+
+    @staticmethod
+    def _sort(rows: list[tuple], keys: tuple) -> list[tuple]:
+        rows = list(rows)
+        for pos, desc, nulls_first in reversed(keys):
+            # Orden estable por clave, de la menos a la más significativa
+            present = [r for r in rows if r[pos] is not None]
+            missing = [r for r in rows if r[pos] is None]
+            present.sort(key=lambda r: r[pos], reverse=desc)
+            rows = missing + present if nulls_first else present + missing
+        return rows
+
+    def _ordered(self, order: str) -> list[tuple]:
+        """Todas las filas en el orden pedido; cada orden se calcula una vez."""
+        k = self._order_keys(order)
+        with self._lock:
+            hit = self._sorted.get(k)
+        if hit is not None:
+            return hit
+        rows = self._sort(self.rows, k)
+        with self._lock:
+            if len(self._sorted) > 16:
+                self._sorted.clear()
+            self._sorted[k] = rows
+        return rows
+
+    def query(self, params: list[tuple[str, str]], want_count: bool, range_hdr: tuple[int, int] | None):
+        select = "*"
+        order = "id.asc"
+        limit = offset = None
+        group = None
+        preds = []
+        dni_eq = dni_in = None
+        id_gt = None
+        for k, v in params:
+            if k == "select":
+                select = v
+            elif k == "order":
+                order = v
+            elif k == "limit":
+                limit = int(v)
+            elif k == "offset":
+                offset = int(v)
+            elif k == "group":
+                group = v
+            elif k in ("or", "and"):
+                preds.append(_logic(k, v))
+            elif k in _POS:
+                if k == "dni" and v.startswith("eq."):
+                    dni_eq = _unquote(v[3:])
+                elif k == "dni" and v.startswith("in."):
+                    dni_in = [_unquote(x) for x in _split_top(v[3:].strip("()"))]
+                elif k == "id" and v.startswith("gt.") and order.startswith("id.asc"):
+                    id_gt = int(v[3:])
+                preds.append(_leaf(k, v))
+            else:
+                raise ValueError(f"parámetro no soportado: {k}")
+
+        if range_hdr and limit is None:
+            offset = range_hdr[0]
+            limit = range_hdr[1] - range_hdr[0] + 1
+
+        # Candidatos: atajos por índice antes del recorrido genérico
+        if dni_eq is not None or dni_in is not None:
+            found = (self.by_dni.get(d) for d in ([dni_eq] if dni_eq is not None else dni_in))
+            source = self._sort([r for r in found if r is not None], self._order_keys(order))
+        elif id_gt is not None:
+            # Filas ya en orden de id (puede haber huecos si se borraron filas)
+            source = self.rows[bisect.bisect_right(self.rows, id_gt, key=lambda r: r[0]):]
+        elif group:
+            source = self.rows                   # el orden es por el conteo
+        else:
+            source = self._ordered(order)
+
+        if group:
+            return self._group(select, group, source, preds, order, limit)
+
+        offset = offset or 0
+        end = None if limit is None else offset + limit
+        if not preds:
+            matched, total = source[offset:end], len(source)
+        else:
+            # Se corta apenas se llena la página, salvo que haga falta el total
+            hits: list[tuple] = []
+            total = 0
+            for r in source:
+                if all(p(r) for p in preds):
+                    total += 1
+                    if end is None or total <= end:
+                        hits.append(r)
+                    elif not want_count:
+                        break
+            matched = hits[offset:end]
+        page = matched
+
+        cols = COLUMNS if select.strip() == "*" else [c.strip() for c in select.split(",")]
+        for c in cols:
+            if c not in _POS:
+                raise ValueError(f"columna desconocida: {c}")
+        idx = [(c, _POS[c]) for c in cols]
+        data = [{c: r[p] for c, p in idx} for r in page]
+        return data, offset, (total if want_count else None)
+
+    def _group(self, select: str, group: str, source, preds, order: str, limit: int | None):
+        dims = [g.strip() for g in group.split(",")]
+        counts = Counter(tuple(r[_POS[d]] for d in dims) for r in source if all(p(r) for p in preds))
+        items = counts.most_common() if "count.desc" in order else sorted(counts.items(), key=lambda kv: kv[1])
+        if limit is not None:
+            items = items[:limit]
+        alias = "count"
+        for part in select.split(","):
+            if ":" in part and part.split(":")[1].strip() == "id":
+                alias = part.split(":")[0].strip()
+        data = [{**dict(zip(dims, vals)), alias: n} for vals, n in items]
+        return data, 0, None
+
+    def upsert(self, records: list, on_conflict: str | None) -> int:
+        """Inserta o actualiza por DNI. Como Postgres, un error rechaza el lote entero."""
+        if on_conflict != "dni":
+            raise ValueError("sólo se soporta on_conflict=dni")
+        now = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+        changes = []
+        for rec in records:
+            if not isinstance(rec, dict):
+                raise ValueError("se espera un array de objetos")
+            for k in rec:
+                if k not in _POS or k in ("id", "apellido_nombre"):
+                    raise ValueError(f'Could not find the "{k}" column of "afiliados_personal"')
+            dni = rec.get("dni")
+            if not isinstance(dni, str) or not dni.isdigit():
+                raise ValueError(f'invalid input value for dni: "{dni}"')
+            changes.append(rec)
+        with self._lock:
+            index = {r[_POS["dni"]]: i for i, r in enumerate(self.rows)}
+            next_id = max((r[0] for r in self.rows), default=0) + 1
+            staged = []
+            for rec in changes:
+                i = index.get(rec["dni"])
+                if i is None and not rec.get("apellido"):
+                    raise ValueError('null value in column "apellido" violates not-null constraint')
+                staged.append((i, rec))
+            for i, rec in staged:
+                if i is None:
+                    row = [None] * len(COLUMNS)
+                    row[0], row[_POS["creado_en"]] = next_id, now
+                    next_id += 1
+                else:
+                    row = list(self.rows[i])
+                for k, v in rec.items():
+                    row[_POS[k]] = v
+                row[_POS["actualizado_en"]] = now
+                row[_POS["apellido_nombre"]] = f"{row[_POS['apellido']] or ''} {row[_POS['nombres']] or ''}".strip()
+                row = tuple(row)
+                if i is None:
+                    self.rows.append(row)
+                    index[rec["dni"]] = len(self.rows) - 1
+                else:
+                    self.rows[i] = row
+                self.by_dni[rec["dni"]] = row
+            self._sorted.clear()
+        return len(staged)
+
+
+# -----------------------------
+# Servidor HTTP
+# -----------------------------
+class Settings:
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    table_name = "afiliados_personal"
+
+
+def make_handler(table: Table, settings: Settings):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: bytes, headers: dict | None = None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            if u.path in ("/", "/rest/v1", "/rest/v1/"):
+                return self._send(200, json.dumps({"rows": len(table.rows)}).encode())
+            if u.path != f"/rest/v1/{settings.table_name}":
+                return self._send(404, b'{"message":"relation does not exist"}')
+
+            delay = settings.latency_ms + (random.random() * settings.jitter_ms if settings.jitter_ms else 0)
+            if delay:
+                time.sleep(delay / 1000.0)
+            if settings.error_rate and random.random() < settings.error_rate:
+                return self._send(503, b'{"message":"injected error"}')
+
+            prefer = self.headers.get("Prefer") or ""
+            m = re.search(r"count=(exact|planned|estimated)", prefer)
+            rng = None
+            if self.headers.get("Range"):
+                a, _, b = self.headers["Range"].partition("-")
+                rng = (int(a), int(b))
+            try:
+                data, start, total = table.query(parse_qsl(u.query, keep_blank_values=True), bool(m), rng)
+            except (ValueError, KeyError) as e:
+                return self._send(400, json.dumps({"message": str(e)}).encode())
+
+            if total is not None and m.group(1) != "exact":
+                total = int(total * random.uniform(0.97, 1.03))   # conteos aproximados
+            span = f"{start}-{start + len(data) - 1}" if data else "*"
+            status = 206 if (total is not None and rng and len(data) < total) else 200
+            self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                       {"Content-Range": f"{span}/{total if total is not None else '*'}"})
+
+        def do_POST(self):
+            u = urlparse(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if u.path != f"/rest/v1/{settings.table_name}":
+                return self._send(404, b'{"message":"relation does not exist"}')
+            delay = settings.latency_ms + (random.random() * settings.jitter_ms if settings.jitter_ms else 0)
+            if delay:
+                time.sleep(delay / 1000.0)
+            if settings.error_rate and random.random() < settings.error_rate:
+                return self._send(503, b'{"message":"injected error"}')
+            try:
+                records = json.loads(body or b"[]")
+                table.upsert(records if isinstance(records, list) else [records],
+                             dict(parse_qsl(u.query)).get("on_conflict"))
+            except ValueError as e:
+                return self._send(400, json.dumps({"message": str(e)}).encode())
+            self._send(201, b"")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(rows: int, port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+          seed: int = 1, table_name: str = "afiliados_personal") -> ThreadingHTTPServer:
+    """Arranca el servidor en un hilo y lo devuelve (server.server_port = puerto)."""
+    settings = Settings()
+    settings.latency_ms, settings.jitter_ms, settings.error_rate = latency_ms, jitter_ms, error_rate
+    settings.table_name = table_name
+    table = Table(generate(rows, seed))
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 1024
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(table, settings))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PostgREST de mentira con un padrón sintético")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--port", type=int, default=54321)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="latencia fija por request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="latencia aleatoria adicional (0..jitter)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fracción de requests que devuelven 503")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--table", default="afiliados_personal")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    srv = serve(args.rows, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.seed, args.table)
+    print(f"fake PostgREST: {args.rows} filas en {time.perf_counter() - t0:.1f}s -> "
+          f"http://127.0.0.1:{srv.server_port}/rest/v1/{args.table}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
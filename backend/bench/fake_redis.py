@@ -0,0 +1,201 @@
+# backend/bench/fake_redis.py — Redis de mentira (RESP) para probar CACHE_BACKEND=redis
+#
+# Implementa lo que usa shared_cache.RedisBackend y poco más, en memoria y con
+# vencimientos: PING, AUTH, SELECT, GET, SET [EX|PX] [NX|XX], DEL, EXISTS, INCR,
+# SADD, SMEMBERS, PEXPIRE, TTL/PTTL, DBSIZE, FLUSHDB, FLUSHALL. Lleva la cuenta de comandos por tipo
+# (INFO devuelve ese conteo).
+#
+#   python bench/fake_redis.py --port 6399
+#   CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6399/0 flask run
+from __future__ import annotations
+
+import argparse
+import socketserver
+import threading
+import time
+from collections import Counter
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dbs: dict[int, dict[bytes, tuple[bytes, float | None]]] = {}
+        self.commands: Counter = Counter()
+
+    def db(self, n: int) -> dict:
+        return self.dbs.setdefault(n, {})
+
+    def live(self, db: dict, key: bytes):
+        item = db.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del db[key]
+            return None
+        return item
+
+
+def _bulk(v: bytes | None) -> bytes:
+    return b"$-1\r\n" if v is None else b"$%d\r\n%s\r\n" % (len(v), v)
+
+
+def _int(n: int) -> bytes:
+    return b":%d\r\n" % n
+
+
+def _array(items: list[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(_bulk(v) for v in items)
+
+
+def _err(msg: str) -> bytes:
+    return b"-ERR " + msg.encode() + b"\r\n"
+
+
+def _read_command(f) -> list[bytes] | None:
+    line = f.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):   # comando inline (redis-cli / telnet)
+        return line.strip().split()
+    out = []
+    for _ in range(int(line[1:-2])):
+        n = int(f.readline()[1:-2])
+        out.append(f.read(n + 2)[:-2])
+    return out
+
+
+def make_handler(store: Store):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            db_n = 0
+            while True:
+                try:
+                    args = _read_command(self.rfile)
+                except (OSError, ValueError):
+                    return
+                if args is None:
+                    return
+                if not args:
+                    continue
+                cmd = args[0].upper().decode(errors="replace")
+                with store.lock:
+                    store.commands[cmd] += 1
+                    db = store.db(db_n)
+                    if cmd == "SELECT":
+                        db_n = int(args[1])
+                        reply = b"+OK\r\n"
+                    else:
+                        reply = self.execute(cmd, args[1:], db)
+                try:
+                    self.wfile.write(reply)
+                except OSError:
+                    return
+
+        def execute(self, cmd: str, a: list[bytes], db: dict) -> bytes:
+            if cmd == "PING":
+                return b"+PONG\r\n" if not a else _bulk(a[0])
+            if cmd == "AUTH":
+                return b"+OK\r\n"
+            if cmd == "GET":
+                item = store.live(db, a[0])
+                return _bulk(item[0] if item else None)
+            if cmd == "SET":
+                key, value, opts = a[0], a[1], [o.upper() for o in a[2:]]
+                exp = None
+                for flag, mult in ((b"EX", 1.0), (b"PX", 0.001)):
+                    if flag in opts:
+                        exp = time.monotonic() + int(a[2 + opts.index(flag) + 1]) * mult
+                exists = store.live(db, key) is not None
+                if (b"NX" in opts and exists) or (b"XX" in opts and not exists):
+                    return _bulk(None)
+                db[key] = (value, exp)
+                return b"+OK\r\n"
+            if cmd == "DEL":
+                n = 0
+                for k in a:
+                    if store.live(db, k) is not None:
+                        del db[k]
+                        n += 1
+                return _int(n)
+            if cmd == "EXISTS":
+                return _int(sum(store.live(db, k) is not None for k in a))
+            if cmd == "INCR":
+                item = store.live(db, a[0])
+                try:
+                    n = int(item[0]) + 1 if item else 1
+                except ValueError:
+                    return _err("value is not an integer or out of range")
+                db[a[0]] = (str(n).encode(), item[1] if item else None)
+                return _int(n)
+            if cmd == "SADD":
+                item = store.live(db, a[0])
+                members = item[0] if item else set()
+                if not isinstance(members, set):
+                    return _err("WRONGTYPE Operation against a key holding the wrong kind of value")
+                n = len(set(a[1:]) - members)
+                members.update(a[1:])
+                db[a[0]] = (members, item[1] if item else None)
+                return _int(n)
+            if cmd == "SMEMBERS":
+                item = store.live(db, a[0])
+                return _array(sorted(item[0]) if item else [])
+            if cmd == "PEXPIRE":
+                item = store.live(db, a[0])
+                if item is None:
+                    return _int(0)
+                db[a[0]] = (item[0], time.monotonic() + int(a[1]) / 1000)
+                return _int(1)
+            if cmd in {"TTL", "PTTL"}:
+                item = store.live(db, a[0])
+                if item is None:
+                    return _int(-2)
+                if item[1] is None:
+                    return _int(-1)
+                left = item[1] - time.monotonic()
+                return _int(int(left * 1000) if cmd == "PTTL" else int(left))
+            if cmd == "DBSIZE":
+                return _int(sum(store.live(db, k) is not None for k in list(db)))
+            if cmd == "FLUSHDB":
+                db.clear()
+                return b"+OK\r\n"
+            if cmd == "FLUSHALL":
+                store.dbs.clear()
+                return b"+OK\r\n"
+            if cmd == "INFO":
+                body = "\r\n".join(f"cmdstat_{k.lower()}:calls={v}" for k, v in sorted(store.commands.items()))
+                return _bulk(body.encode())
+            return _err(f"unknown command '{cmd}'")
+
+    return Handler
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+def serve(port: int = 0) -> _Server:
+    """Arranca el servidor en un hilo y lo devuelve (server.server_address[1] = puerto; .store = datos)."""
+    store = Store()
+    srv = _Server(("127.0.0.1", port), make_handler(store))
+    srv.store = store
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Redis de mentira (RESP) en memoria")
+    ap.add_argument("--port", type=int, default=6399)
+    args = ap.parse_args()
+    srv = serve(args.port)
+    print(f"fake Redis: redis://127.0.0.1:{srv.server_address[1]}/0", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
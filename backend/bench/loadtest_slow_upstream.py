@@ -0,0 +1,135 @@
+# backend/bench/loadtest_slow_upstream.py — Throughput con un Supabase lento, por perfil de worker
+#
+# Levanta un upstream falso que tarda --delay segundos en responder, arranca
+# gunicorn con cada perfil (sync / gthread / gevent) apuntando a él y mide
+# requests por segundo, latencias y cuánto tarda /api/health bajo carga.
+#
+#   cd backend && python bench/loadtest_slow_upstream.py --delay 1 --concurrency 200 --duration 10
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import Client, free_port, gunicorn, percentile  # noqa: E402
+
+
+def start_slow_upstream(delay: float) -> tuple[ThreadingHTTPServer, int]:
+    body = json.dumps([{"id": 1, "dni": "20000001", "apellido": "Pérez", "nombres": "Juan"}]).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Range", "0-0/1")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 1024
+    port = free_port()
+    srv = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, port
+
+
+def run_profile(profile: str, upstream_port: int, args) -> dict:
+    env = {
+        "WEB_CONCURRENCY": args.workers,
+        "GUNICORN_WORKER_CLASS": profile,
+        "SUPABASE_URL": f"http://127.0.0.1:{upstream_port}",
+        "SUPABASE_SERVICE_ROLE_KEY": "bench",
+        "SUPABASE_PREWARM": "0",
+    }
+    with gunicorn(env, profile) as port:
+        stop = time.time() + args.duration
+        lat: list[float] = []
+        health: list[float] = []
+        errors = 0
+        lock = threading.Lock()
+        counter = [0]
+
+        def client():
+            nonlocal errors
+            c = Client("127.0.0.1", port, timeout=args.delay * 20 + 10)
+            while time.time() < stop:
+                with lock:
+                    counter[0] += 1
+                    n = counter[0]
+                # q distinto en cada request: nada de cachés ni coalescing
+                status, _, secs = c.get(f"/api/afiliados/?q=bench{n}&count=none")
+                with lock:
+                    if status == 200:
+                        lat.append(secs)
+                    else:
+                        errors += 1
+            c.close()
+
+        def prober():
+            c = Client("127.0.0.1", port, timeout=30)
+            while time.time() < stop:
+                status, _, secs = c.get("/api/health")
+                health.append(secs if status == 200 else float("inf"))
+                time.sleep(0.25)
+            c.close()
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(args.concurrency)]
+        threads.append(threading.Thread(target=prober, daemon=True))
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+    return {
+        "profile": profile,
+        "ok": len(lat),
+        "errors": errors,
+        "rps": len(lat) / elapsed,
+        "p50_ms": percentile(lat, 50) * 1000,
+        "p95_ms": percentile(lat, 95) * 1000,
+        "p99_ms": percentile(lat, 99) * 1000,
+        "health_p95_ms": percentile(health, 95) * 1000,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--delay", type=float, default=1.0, help="segundos que tarda el upstream")
+    ap.add_argument("--concurrency", type=int, default=200)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--profiles", default="sync,gthread,gevent")
+    args = ap.parse_args()
+
+    srv, upstream_port = start_slow_upstream(args.delay)
+    results = []
+    for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        print(f"-> {profile} ...", flush=True)
+        results.append(run_profile(profile, upstream_port, args))
+    srv.shutdown()
+
+    print(f"\nupstream delay={args.delay}s concurrency={args.concurrency} "
+          f"workers={args.workers} duration={args.duration}s")
+    print(f"{'perfil':<9}{'ok':>7}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'health p95':>12}")
+    for r in results:
+        print(f"{r['profile']:<9}{r['ok']:>7}{r['errors']:>6}{r['rps']:>9.1f}{r['p50_ms']:>10.0f}"
+              f"{r['p95_ms']:>10.0f}{r['p99_ms']:>10.0f}{r['health_p95_ms']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# backend/bench/run.py — Benchmark de los endpoints de afiliados contra un PostgREST local
+#
+# Levanta bench/fake_postgrest.py con un padrón sintético, arranca el backend con
+# gunicorn apuntando a él y mide, escenario por escenario, RPS y p50/p95/p99 con
+# N clientes concurrentes. Sirve de línea de base para comparar cambios:
+#
+#   cd backend
+#   python bench/run.py --rows 100000 --concurrency 32 --duration 15
+#   python bench/run.py --scenarios list,detail --latency-ms 30 --json out/base.json
+#   python bench/run.py --target http://127.0.0.1:5000     # contra un backend ya levantado
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import quote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BACKEND_DIR, closed_loop, free_port, gunicorn, percentile, wait_http  # noqa: E402
+from fake_postgrest import APELLIDOS, EMPRESAS  # noqa: E402
+
+GROUPS = ["empresa", "sector", "lugar_trabajo", "empresa,sector"]
+
+
+def _dni(rows: int, rnd: random.Random) -> str:
+    # Mismo esquema que fake_postgrest.generate (un 5% no existe)
+    i = rnd.randrange(1, rows + 1)
+    return str(20_000_000 + i * 7 % 30_000_000) if rnd.random() > 0.05 else str(10_000_000 + i)
+
+
+def scenarios(rows: int) -> dict:
+    """nombre -> función(n, rnd) que arma (método, path, body, headers)."""
+    pages = max(1, min(rows // 50, 200))
+    return {
+        "list": lambda n, rnd: ("GET", f"/api/afiliados/?page={rnd.randrange(1, pages + 1)}&page_size=50", None, {}),
+        "list_search": lambda n, rnd: (
+            "GET", f"/api/afiliados/?q={quote(rnd.choice(APELLIDOS)[:4])}&page_size=50", None, {},
+        ),
+        "list_big": lambda n, rnd: ("GET", f"/api/afiliados/?page={rnd.randrange(1, 4)}&page_size=5000", None,
+                                    {"Accept-Encoding": "gzip"}),
+        "detail": lambda n, rnd: ("GET", f"/api/afiliados/{_dni(rows, rnd)}", None, {}),
+        "count": lambda n, rnd: ("GET", "/api/afiliados/count", None, {}),
+        "stats": lambda n, rnd: ("GET", f"/api/afiliados/stats?group={quote(rnd.choice(GROUPS))}", None, {}),
+        "lookup": lambda n, rnd: (
+            "POST", "/api/afiliados/lookup",
+            json.dumps({"dnis": [_dni(rows, rnd) for _ in range(200)]}).encode(),
+            {"Content-Type": "application/json"},
+        ),
+        "export": lambda n, rnd: (
+            "GET", f"/api/afiliados/export?format=csv&empresa={quote(rnd.choice(EMPRESAS))}", None, {},
+        ),
+    }
+
+
+def run_scenario(port: int, name: str, make, args) -> dict:
+    rnd = random.Random(args.seed)
+    lat: list[float] = []
+    sizes: list[int] = []
+    errors = [0]
+
+    def on_result(status, size, secs):
+        if 200 <= status < 400:
+            lat.append(secs)
+            sizes.append(size)
+        else:
+            errors[0] += 1
+
+    # Calentamiento corto (pools, cachés de orden del fake) fuera de la medición
+    closed_loop(port, min(4, args.concurrency), min(2.0, args.duration / 5), lambda n: make(n, rnd), lambda *a: None)
+    elapsed = closed_loop(port, args.concurrency, args.duration, lambda n: make(n, rnd), on_result)
+    return {
+        "scenario": name,
+        "ok": len(lat),
+        "errors": errors[0],
+        "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": round(percentile(lat, 50) * 1000, 1),
+        "p95_ms": round(percentile(lat, 95) * 1000, 1),
+        "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        "avg_kb": round(sum(sizes) / len(sizes) / 1024, 1) if sizes else 0,
+    }
+
+
+def print_table(results: list[dict], header: str):
+    print(f"\n{header}")
+    print(f"{'escenario':<12}{'ok':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'KB/resp':>10}")
+    for r in results:
+        print(f"{r['scenario']:<12}{r['ok']:>8}{r['errors']:>6}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}"
+              f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['avg_kb']:>10.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de /api/afiliados contra un PostgREST local")
+    ap.add_argument("--rows", type=int, default=100_000, help="tamaño del padrón sintético")
+    ap.add_argument("--latency-ms", type=float, default=10.0, help="latencia fija del fake por request")
+    ap.add_argument("--jitter-ms", type=float, default=5.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=10.0, help="segundos por escenario")
+    ap.add_argument("--scenarios", default="list,list_search,detail,count,stats,lookup,export")
+    ap.add_argument("--workers", type=int, default=2, help="WEB_CONCURRENCY")
+    ap.add_argument("--worker-class", default="", help="GUNICORN_WORKER_CLASS (default: el de gunicorn.conf.py)")
+    ap.add_argument("--env", action="append", default=[], help="VAR=valor extra para el backend (repetible)")
+    ap.add_argument("--target", default="", help="URL de un backend ya levantado (no arranca fake ni gunicorn)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", default="", help="guardar resultados en este archivo")
+    args = ap.parse_args()
+
+    all_scenarios = scenarios(args.rows)
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in names if s not in all_scenarios]
+    if unknown:
+        ap.error(f"escenarios desconocidos: {', '.join(unknown)} (hay: {', '.join(all_scenarios)})")
+
+    results: list[dict] = []
+    if args.target:
+        port = urlparse(args.target).port or 80
+        for name in names:
+            print(f"-> {name} ...", flush=True)
+            results.append(run_scenario(port, name, all_scenarios[name], args))
+    else:
+        # El fake corre en su propio proceso para no competir por el GIL con los clientes
+        fake_port = free_port()
+        t0 = time.perf_counter()
+        fake = subprocess.Popen(
+            [sys.executable, os.path.join("bench", "fake_postgrest.py"), "--rows", str(args.rows),
+             "--port", str(fake_port), "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+             "--error-rate", str(args.error_rate)],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+        )
+        if not wait_http(fake_port, "/rest/v1/", timeout=max(60.0, args.rows / 5000)):
+            fake.kill()
+            sys.exit("fake_postgrest no arrancó")
+        print(f"fake PostgREST: {args.rows} filas ({time.perf_counter() - t0:.1f}s), puerto {fake_port}")
+        env = {
+            "SUPABASE_URL": f"http://127.0.0.1:{fake_port}",
+            "SUPABASE_SERVICE_ROLE_KEY": "bench",
+            "WEB_CONCURRENCY": args.workers,
+            "ALLOW_DEV_NO_SUPA": "0",
+        }
+        if args.worker_class:
+            env["GUNICORN_WORKER_CLASS"] = args.worker_class
+        for kv in args.env:
+            k, _, v = kv.partition("=")
+            env[k] = v
+        try:
+            with gunicorn(env) as port:
+                for name in names:
+                    print(f"-> {name} ...", flush=True)
+                    results.append(run_scenario(port, name, all_scenarios[name], args))
+        finally:
+            fake.terminate()
+            fake.wait(10)
+
+    header = (f"rows={args.rows} latency={args.latency_ms}±{args.jitter_ms}ms errors={args.error_rate} "
+              f"concurrency={args.concurrency} workers={args.workers} duration={args.duration}s")
+    print_table(results, header)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"config": vars(args), "results": results, "at": time.time()}, fh, indent=2)
+        print(f"\nresultados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/bench/startup.py — Tiempo de arranque en frío del backend
+#
+# Mide, en procesos nuevos:
+#   import  — `import wsgi` (módulos + create_app), mediana de --runs corridas
+#   health  — desde lanzar gunicorn hasta el primer 200 de /api/health
+#   first   — desde lanzar gunicorn hasta el primer 200 de un endpoint que
+#             consulta Supabase (contra bench/fake_postgrest.py)
+#
+#   cd backend && python bench/startup.py --runs 10
+#   python bench/startup.py --env SUPABASE_PREWARM=0 --env BLUEPRINTS=
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BACKEND_DIR, Client, free_port  # noqa: E402
+from fake_postgrest import serve  # noqa: E402
+
+_IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import wsgi; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def _env(extra: dict) -> dict:
+    env = dict(os.environ)
+    env.update({"LOG_LEVEL": "WARNING", "REPLICA_SYNC": "0", "RATE_LIMIT_ENABLED": "0"})
+    env.update(extra)
+    return env
+
+
+def time_import(env: dict, runs: int) -> list[float]:
+    out = []
+    for _ in range(runs):
+        r = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET], cwd=BACKEND_DIR, env=_env(env),
+                           capture_output=True, text=True, check=True)
+        out.append(float(r.stdout.strip().splitlines()[-1]))
+    return out
+
+
+def time_gunicorn(env: dict, path: str, timeout: float = 30.0) -> float:
+    port = free_port()
+    env = _env({**env, "PORT": str(port), "WEB_CONCURRENCY": "1"})
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        client = Client("127.0.0.1", port, timeout=5)
+        while time.perf_counter() - t0 < timeout:
+            if client.get(path)[0] == 200:
+                return (time.perf_counter() - t0) * 1000
+            client.close()
+            time.sleep(0.005)
+        raise RuntimeError(f"gunicorn no respondió {path} en {timeout}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tiempo de arranque en frío del backend")
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--latency-ms", type=float, default=30.0, help="latencia del fake (simula el RTT a Supabase)")
+    ap.add_argument("--env", action="append", default=[], help="VAR=valor extra (repetible)")
+    args = ap.parse_args()
+
+    srv = serve(2000, latency_ms=args.latency_ms)
+    env = {"SUPABASE_URL": f"http://127.0.0.1:{srv.server_port}", "SUPABASE_SERVICE_ROLE_KEY": "bench"}
+    for kv in args.env:
+        k, _, v = kv.partition("=")
+        env[k] = v
+
+    imports = time_import(env, args.runs)
+    health = [time_gunicorn(env, "/api/health") for _ in range(max(1, args.runs // 2))]
+    first = [time_gunicorn(env, "/api/afiliados/20000007") for _ in range(max(1, args.runs // 2))]
+    srv.shutdown()
+
+    print(f"{'medición':<10}{'mediana ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, values in (("import", imports), ("health", health), ("first", first)):
+        print(f"{name:<10}{statistics.median(values):>12.0f}{min(values):>10.0f}{max(values):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
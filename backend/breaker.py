@@ -0,0 +1,267 @@
+# backend/breaker.py — Circuit breaker y presupuesto de reintentos para el upstream
+#
+# CircuitBreaker mira una ventana deslizante de llamadas: si la proporción de
+# errores (o de llamadas lentas) supera el umbral, abre el circuito y durante
+# `open_s` segundos las llamadas fallan al instante con CircuitOpenError. Luego
+# pasa a half-open: deja salir unas pocas de prueba y, según cómo les vaya,
+# cierra o vuelve a abrir.
+#
+# RetryBudget limita los reintentos a una fracción del tráfico (token bucket):
+# con Supabase caído, los reintentos no multiplican la carga ni las esperas.
+#
+# AdmissionGate acota las llamadas en vuelo: las que sobran esperan en una cola
+# corta y, si la cola está llena o la espera vence, fallan enseguida con
+# UpstreamBusyError en vez de sumarse a un Supabase saturado.
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: no se intentó la llamada."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"circuito '{name}' abierto; reintentar en {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window_s: float = 30.0, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call_s: float = 5.0, slow_rate: float = 0.8, open_s: float = 15.0, half_open_calls: int = 3):
+        self.name = name
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.half_open_calls = max(1, half_open_calls)
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._calls: deque[tuple[float, bool, bool]] = deque()   # (t, falló, lenta)
+        self._failed = 0
+        self._slow = 0
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0          # llamadas de prueba en vuelo (half-open)
+        self._probe_ok = 0
+        self.opened_count = 0
+        self.rejected = 0
+        self.last_error: str | None = None
+
+    # -----------------------------
+    # Ventana
+    # -----------------------------
+    def _prune(self, now: float):
+        limit = now - self.window_s
+        while self._calls and self._calls[0][0] < limit:
+            _, failed, slow = self._calls.popleft()
+            self._failed -= failed
+            self._slow -= slow
+
+    def _trip(self, now: float, reason: str):
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = self._probe_ok = 0
+        self.opened_count += 1
+        self.last_error = reason
+
+    # -----------------------------
+    # API
+    # -----------------------------
+    def allow(self) -> bool:
+        """¿Se puede llamar ahora? Si devuelve True hay que llamar a record() después."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_s:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes = self._probe_ok = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def is_open(self) -> bool:
+        """True mientras dura la apertura (no consume llamadas de prueba)."""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.open_s
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 1.0
+            return max(1.0, self.open_s - (time.monotonic() - self._opened_at))
+
+    def record(self, ok: bool, seconds: float, error: str | None = None):
+        now = time.monotonic()
+        slow = seconds >= self.slow_call_s
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if not ok or slow:
+                    self._trip(now, error or "llamada lenta en half-open")
+                    return
+                self._probe_ok += 1
+                if self._probe_ok >= self.half_open_calls:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    self._failed = self._slow = 0
+                return
+            if self.state == OPEN:
+                return   # respuesta tardía de antes de abrir
+
+            self._calls.append((now, not ok, slow))
+            self._failed += not ok
+            self._slow += slow
+            if error:
+                self.last_error = error
+            self._prune(now)
+            n = len(self._calls)
+            if n < self.min_calls:
+                return
+            if self._failed / n >= self.error_rate:
+                self._trip(now, error or f"{self._failed}/{n} errores")
+            elif self._slow / n >= self.slow_rate:
+                self._trip(now, f"{self._slow}/{n} llamadas de más de {self.slow_call_s:g}s")
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            n = len(self._calls)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "window_calls": n,
+                "error_rate": round(self._failed / n, 3) if n else 0.0,
+                "slow_rate": round(self._slow / n, 3) if n else 0.0,
+                "open_for_s": round(max(0.0, self.open_s - (now - self._opened_at)), 1) if self.state == OPEN else 0,
+                "opened_count": self.opened_count,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+                "thresholds": {
+                    "window_s": self.window_s, "min_calls": self.min_calls, "error_rate": self.error_rate,
+                    "slow_call_s": self.slow_call_s, "slow_rate": self.slow_rate, "open_s": self.open_s,
+                },
+            }
+
+
+class RetryBudget:
+    """Cada request deposita `ratio` fichas (hasta `cap`); cada reintento gasta una."""
+
+    def __init__(self, ratio: float = 0.2, cap: float = 10.0):
+        self.ratio = ratio
+        self.cap = cap
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._tokens = self.cap
+        self.spent = 0
+        self.denied = 0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"ratio": self.ratio, "tokens": round(self._tokens, 2), "spent": self.spent, "denied": self.denied}
+
+
+class UpstreamBusyError(CircuitOpenError):
+    """Demasiadas llamadas en vuelo: no se intentó la llamada (como con el circuito abierto)."""
+
+    def __init__(self, name: str, retry_after: float, reason: str):
+        Exception.__init__(self, f"'{name}' saturado ({reason}); reintentar en {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionGate:
+    def __init__(self, name: str, max_inflight: int = 32, max_queue: int = 64, queue_timeout_s: float = 2.0):
+        self.name = name
+        self.max_inflight = max_inflight    # 0 = sin límite
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.reset()
+
+    def reset(self):
+        self._cond = threading.Condition(threading.Lock())
+        self.inflight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.waited = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.peak_inflight = 0
+
+    def acquire(self):
+        """Ocupa un lugar o lanza UpstreamBusyError; si no lanza, hay que llamar a release()."""
+        if self.max_inflight <= 0:
+            return
+        with self._cond:
+            if self.inflight >= self.max_inflight:
+                if self.queued >= self.max_queue:
+                    self.rejected_full += 1
+                    raise UpstreamBusyError(self.name, 1.0, "cola llena")
+                self.queued += 1
+                self.waited += 1
+                deadline = time.monotonic() + self.queue_timeout_s
+                try:
+                    while self.inflight >= self.max_inflight:
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            self.rejected_timeout += 1
+                            raise UpstreamBusyError(self.name, max(1.0, self.queue_timeout_s), "espera vencida")
+                        self._cond.wait(left)
+                finally:
+                    self.queued -= 1
+            self.inflight += 1
+            self.admitted += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+
+    def release(self):
+        if self.max_inflight <= 0:
+            return
+        with self._cond:
+            self.inflight = max(0, self.inflight - 1)
+            self._cond.notify()
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "name": self.name,
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "queue_timeout_s": self.queue_timeout_s,
+                "inflight": self.inflight,
+                "queued": self.queued,
+                "peak_inflight": self.peak_inflight,
+                "admitted": self.admitted,
+                "waited": self.waited,
+                "rejected_full": self.rejected_full,
+                "rejected_timeout": self.rejected_timeout,
+            }
@@ -0,0 +1,261 @@
+# backend/cache.py — Caché en memoria del proceso (TTL + LRU) con single-flight
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+# Todas las cachés/coalescers vivos del proceso (para /metrics)
+_instances: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def all_stats() -> list[dict]:
+    return sorted((c.stats() for c in list(_instances)), key=lambda st: st["name"])
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave: una sola ejecuta `fn`,
+    el resto espera y recibe el mismo resultado (o la misma excepción)."""
+
+    class _Call:
+        __slots__ = ("event", "result", "error", "waiters")
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error: BaseException | None = None
+            self.waiters = 0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, SingleFlight._Call] = {}
+        self.shared = 0   # llamadas que se ahorraron esperando a otra
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """Devuelve (resultado, compartido)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = SingleFlight._Call()
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class TTLCache:
+    """Caché acotada: expira por TTL y desaloja por LRU al superar `maxsize`.
+
+    Con `stale_ttl` > 0 las entradas vencidas se conservan ese tiempo extra:
+    get() ya no las devuelve, pero get_stale() sí (para servir algo cuando el
+    upstream no responde)."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0, stale_ttl: float = 0.0,
+                 group: Callable[[Hashable], Hashable] | None = None):
+        self.name = name
+        self.group = group
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.stale_ttl = max(0.0, stale_ttl)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        _instances.add(self)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return False, None
+            expires, value = item
+            if expires <= now:
+                if expires + self.stale_ttl <= now:
+                    del self._data[key]
+                    self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def get_stale(self, key: Hashable) -> tuple[bool, Any]:
+        """Como get(), pero acepta entradas vencidas dentro de `stale_ttl`."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] + self.stale_ttl <= now:
+                return False, None
+            self.stale_hits += 1
+            return True, item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl_for: Callable[[Any], float] | None = None,
+    ) -> tuple[Any, bool]:
+        """Devuelve (valor, hit). En un miss, las llamadas concurrentes por la
+        misma clave comparten una sola ejecución de `loader`."""
+        hit, value = self.get(key)
+        if hit:
+            return value, True
+
+        def _load():
+            # Otro hilo pudo haber cargado la clave mientras esperábamos el lock
+            with self._lock:
+                item = self._data.get(key)
+                if item is not None and item[0] > time.monotonic():
+                    return item[1]
+            v = loader()
+            self.set(key, v, ttl_for(v) if ttl_for else None)
+            return v
+
+        value, _ = self._flight.do(key, _load)
+        return value, False
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def delete_where(self, pred: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            keys = [k for k in self._data if pred(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def delete_group(self, group: Hashable) -> int:
+        """Borra las entradas cuyo grupo (según `group`) es `group`."""
+        if self.group is None:
+            raise TypeError(f"la caché {self.name} no tiene `group`")
+        return self.delete_where(lambda k: self.group(k) == group)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_ttl_s": self.stale_ttl,
+                "stale_hits": self.stale_hits,
+                "stampedes_avoided": self._flight.shared,
+            }
+
+
+class Coalescer:
+    """Single-flight por clave + micro-caché opcional de `micro_ttl` segundos.
+
+    Pensado para consultas upstream idénticas que llegan juntas: mientras una
+    está en vuelo las demás esperan su resultado, y si `micro_ttl` > 0 las que
+    llegan justo después lo reutilizan sin volver a salir. El resultado se
+    comparte entre requests, así que quien lo recibe no debe mutarlo."""
+
+    def __init__(self, name: str, micro_ttl: float = 0.0, maxsize: int = 256):
+        self.name = name
+        self.micro_ttl = micro_ttl
+        self._flight = SingleFlight()
+        self._micro = TTLCache(f"{name}_micro", maxsize=maxsize, ttl=micro_ttl) if micro_ttl > 0 else None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream = 0
+        self.micro_hits = 0
+        _instances.add(self)
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        cacheable: Callable[[Any], bool] | None = None,
+    ) -> tuple[Any, str]:
+        """Devuelve (resultado, origen) con origen en "upstream", "shared" o "micro"."""
+        with self._lock:
+            self.calls += 1
+        if self._micro is not None:
+            hit, value = self._micro.get(key)
+            if hit:
+                with self._lock:
+                    self.micro_hits += 1
+                return value, "micro"
+
+        def _call():
+            with self._lock:
+                self.upstream += 1
+            v = fn()
+            if self._micro is not None and (cacheable is None or cacheable(v)):
+                self._micro.set(key, v)
+            return v
+
+        value, shared = self._flight.do(key, _call)
+        return value, "shared" if shared else "upstream"
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls, upstream, micro_hits = self.calls, self.upstream, self.micro_hits
+        saved = calls - upstream
+        return {
+            "name": self.name,
+            "calls": calls,
+            "upstream": upstream,
+            "shared": self._flight.shared,
+            "micro_hits": micro_hits,
+            "saved": saved,
+            "saved_ratio": round(saved / calls, 4) if calls else None,
+            "inflight": self._flight.inflight(),
+            "micro_ttl_s": self.micro_ttl,
+        }
@@ -0,0 +1,76 @@
+# backend/compression.py — Compresión de respuestas negociada por Accept-Encoding
+#
+# Comprime en el after_request las respuestas no-streaming de tipo texto/JSON
+# que superan COMPRESS_MIN_BYTES. Prefiere brotli (si el paquete `brotli` está
+# instalado y el cliente lo acepta) y si no gzip. El ETag de la versión
+# comprimida lleva un sufijo (-br / -gz) para no confundirla con la plana; al
+# revalidar se quita el sufijo antes de comparar.
+from __future__ import annotations
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None  # type: ignore
+
+from settings import get_settings  # noqa: E402
+
+_cfg = get_settings()
+
+COMPRESS_ENABLED   = _cfg.compress
+COMPRESS_MIN_BYTES = _cfg.compress_min_bytes
+COMPRESS_LEVEL     = _cfg.compress_level      # gzip 1-9
+BROTLI_QUALITY     = _cfg.brotli_quality      # 0-11; >5 es caro para respuestas dinámicas
+
+_COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+_SUFFIXES = {"br": "-br", "gzip": "-gz"}
+
+
+def negotiate(accept_encoding) -> str | None:
+    """Mejor codificación soportada según el Accept-Encoding del request."""
+    if brotli is not None and accept_encoding["br"] > 0:
+        return "br"
+    if accept_encoding["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def strip_etag_suffix(environ: dict):
+    """Quita -br/-gz de If-None-Match para que la comparación con el ETag plano funcione."""
+    raw = environ.get("HTTP_IF_NONE_MATCH")
+    if not raw or "-" not in raw:
+        return
+    for suffix in _SUFFIXES.values():
+        raw = raw.replace(f'{suffix}"', '"')
+    environ["HTTP_IF_NONE_MATCH"] = raw
+
+
+def compress_response(resp, accept_encoding):
+    if not COMPRESS_ENABLED or resp.status_code != 200 or resp.direct_passthrough or resp.is_streamed:
+        return resp
+    if "Content-Encoding" in resp.headers:
+        return resp
+    mimetype = resp.mimetype or ""
+    if not mimetype.startswith(_COMPRESSIBLE):
+        return resp
+
+    resp.vary.add("Accept-Encoding")
+    body = resp.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return resp
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return resp
+
+    if encoding == "br":
+        data = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+    resp.set_data(data)
+    resp.headers["Content-Encoding"] = encoding
+
+    etag, weak = resp.get_etag()
+    if etag:
+        resp.set_etag(etag + _SUFFIXES[encoding], weak=weak)
+    return resp
@@ -0,0 +1,59 @@
+# backend/gunicorn.conf.py — gunicorn lo carga automáticamente desde el cwd
+#
+# Perfiles de worker (GUNICORN_WORKER_CLASS):
+#   gevent  (default si está instalado): cada request es una greenlet; un proceso
+#           sostiene cientos de esperas a Supabase sin bloquear /api/health.
+#   gthread (fallback): N hilos por worker (GUNICORN_THREADS).
+#   sync:   un request por worker a la vez (comportamiento anterior).
+# No usar preload_app con gevent: el monkey-patch tiene que ocurrir antes de
+# importar requests/ssl, y gunicorn lo hace en cada worker antes de cargar la app.
+# La configuración sale de settings.py; use_worker_class() la rearma acá, en el
+# master, y los workers la heredan con el fork (pool a Supabase y /api/health
+# incluidos).
+import importlib.util
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from settings import get_settings, use_worker_class  # noqa: E402
+
+_env = get_settings()
+_HAS_GEVENT = importlib.util.find_spec("gevent") is not None
+worker_class = _env.gunicorn_worker_class or ("gevent" if _HAS_GEVENT else "gthread")
+if worker_class == "gevent" and not _HAS_GEVENT:
+    worker_class = "gthread"
+_cfg = use_worker_class(worker_class)
+
+bind = f"0.0.0.0:{_cfg.port}"
+timeout = _cfg.gunicorn_timeout
+workers = _cfg.web_concurrency
+# Conexiones HTTP inactivas del cliente (navegador/proxy)
+keepalive = _cfg.gunicorn_keepalive
+
+if worker_class == "gevent":
+    # Las greenlets que sobran esperan una conexión libre del pool (Settings.pool_block)
+    worker_connections = _cfg.gunicorn_worker_connections
+elif worker_class == "gthread":
+    threads = _cfg.gunicorn_threads
+
+
+def _prewarm(worker):
+    try:
+        import supabase_client
+        n = supabase_client.warm()
+        worker.log.info("Worker %s: %s conexiones a Supabase precalentadas", worker.pid, n)
+    except Exception as e:  # nunca impedir el arranque del worker
+        worker.log.warning("Worker %s: no se pudo precalentar Supabase: %s", worker.pid, e)
+
+
+def post_worker_init(worker):
+    # Cada worker (ya con la app y el .env cargados) abre su propio pool a
+    # Supabase antes de recibir tráfico. Con SUPABASE_PREWARM_ASYNC=1 lo hace en
+    # segundo plano: el worker atiende enseguida (health, réplica) y las primeras
+    # consultas a Supabase que lleguen antes abren su propia conexión.
+    if _cfg.supabase_prewarm_async:
+        import threading
+        threading.Thread(target=_prewarm, args=(worker,), name="supabase-prewarm", daemon=True).start()
+    else:
+        _prewarm(worker)
@@ -0,0 +1,393 @@
+# backend/imports.py — Importaciones masivas en segundo plano (CSV / NDJSON)
+#
+# El request sólo guarda el archivo en disco (instance/imports/<id>/) y crea el
+# trabajo; un hilo lo procesa: parsea, normaliza fila por fila y manda lotes a
+# `upsert` en paralelo. Cada tanda de lotes terminada deja un checkpoint en
+# state.json, así que un trabajo interrumpido (deploy, worker reiniciado) se
+# retoma desde ahí. Los errores por fila van a errors.ndjson.
+#
+# Con varios workers de gunicorn, el estado se lee del disco desde cualquiera y
+# un lock de archivo por trabajo asegura que lo procese uno solo.
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos (un solo worker en dev)
+    fcntl = None  # type: ignore
+
+from settings import get_settings  # noqa: E402
+
+log = logging.getLogger("imports")
+
+_cfg = get_settings()
+
+IMPORTS_DIR       = _cfg.imports_dir
+IMPORT_BATCH_SIZE = _cfg.import_batch_size
+IMPORT_WORKERS    = _cfg.import_workers
+IMPORT_MAX_BYTES  = _cfg.import_max_bytes
+IMPORT_MAX_ERRORS = _cfg.import_max_errors   # más errores = se aborta
+
+FORMATS = ("csv", "ndjson")
+
+# normalize(registro) -> fila lista para upsert; ValueError = fila inválida
+Normalizer = Callable[[dict], dict]
+# upsert(filas) -> [(índice dentro del lote, mensaje)] de las filas rechazadas
+Upserter = Callable[[list[dict]], list[tuple[int, str]]]
+
+
+class ImportFailed(Exception):
+    """Error del trabajo completo (no de una fila): queda en estado failed."""
+
+
+def _now() -> float:
+    return round(time.time(), 3)
+
+
+def _write_json(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def last_done(root: str = IMPORTS_DIR) -> str | None:
+    """Marca de la última importación terminada. Está en disco, así que la ven
+    todos los workers: cuando cambia, lo que tengan en memoria puede estar viejo."""
+    try:
+        with open(os.path.join(root, "last_done.json"), encoding="utf-8") as fh:
+            return json.load(fh).get("mark")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _header_key(h: str) -> str:
+    return "_".join((h or "").strip().lower().split())
+
+
+# -----------------------------
+# Lectura de la fuente
+# -----------------------------
+def _iter_csv(fh: io.TextIOBase) -> Iterator[dict]:
+    sample = fh.readline()
+    # Las planillas exportadas en español suelen usar ";" como separador
+    delimiter = ";" if sample.count(";") > sample.count(",") else ","
+    header = [_header_key(h) for h in next(csv.reader([sample], delimiter=delimiter), [])]
+    for values in csv.reader(fh, delimiter=delimiter):
+        if not any(v.strip() for v in values):
+            yield {}
+            continue
+        yield dict(zip(header, values))
+
+
+def _iter_ndjson(fh: io.TextIOBase) -> Iterator[dict]:
+    for line in fh:
+        line = line.strip()
+        if not line:
+            yield {}
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError as e:
+            yield {"__error__": f"JSON inválido: {e}"}
+            continue
+        if not isinstance(rec, dict):
+            yield {"__error__": "se espera un objeto por línea"}
+            continue
+        yield {_header_key(k): v for k, v in rec.items()}
+
+
+# -----------------------------
+# Trabajo
+# -----------------------------
+class ImportJob:
+    def __init__(self, job_id: str, root: str = IMPORTS_DIR):
+        if not job_id or not all(ch.isalnum() or ch == "-" for ch in job_id):
+            raise KeyError(job_id)
+        self.id = job_id
+        self.dir = os.path.join(root, job_id)
+        self.state_path = os.path.join(self.dir, "state.json")
+        self.errors_path = os.path.join(self.dir, "errors.ndjson")
+        self._lock_fh = None
+
+    @classmethod
+    def create(cls, stream, fmt: str, encoding: str = "utf-8-sig", root: str = IMPORTS_DIR,
+               options: dict | None = None) -> "ImportJob":
+        """Copia `stream` a disco por bloques (sin cargarlo en memoria) y registra el trabajo."""
+        job_id = time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(3)
+        job = cls(job_id, root)
+        os.makedirs(job.dir, exist_ok=True)
+        size = 0
+        with open(job.source_path(fmt), "wb") as out:
+            while True:
+                chunk = stream.read(64 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    out.close()
+                    job.delete()
+                    raise ImportFailed(f"El archivo supera IMPORT_MAX_BYTES ({IMPORT_MAX_BYTES} bytes)")
+                out.write(chunk)
+        _write_json(job.state_path, {
+            "id": job_id,
+            "status": "queued",
+            "format": fmt,
+            "encoding": encoding,
+            "bytes": size,
+            "options": options or {},
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "rows_read": 0,          # checkpoint: registros ya procesados (se retoma desde acá)
+            "upserted": 0,
+            "rejected": 0,
+            "errors_bytes": 0,       # tamaño de errors.ndjson en el checkpoint
+            "columns": None,
+            "ignored_columns": [],
+            "attempts": 0,
+            "error": None,
+        })
+        return job
+
+    def source_path(self, fmt: str) -> str:
+        return os.path.join(self.dir, f"source.{fmt}")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.state_path)
+
+    def load(self) -> dict:
+        with open(self.state_path, encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def _save(self, state: dict):
+        _write_json(self.state_path, state)
+
+    def delete(self):
+        for name in os.listdir(self.dir) if os.path.isdir(self.dir) else ():
+            try:
+                os.remove(os.path.join(self.dir, name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(self.dir)
+        except OSError:
+            pass
+
+    # -----------------------------
+    # Lock entre procesos
+    # -----------------------------
+    def _try_lock(self) -> bool:
+        if fcntl is None:
+            return True
+        fh = open(os.path.join(self.dir, "lock"), "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._lock_fh = fh
+        return True
+
+    def _unlock(self):
+        if self._lock_fh is not None:
+            self._lock_fh.close()
+            self._lock_fh = None
+
+    def is_locked(self) -> bool:
+        """¿Lo está procesando algún proceso ahora?"""
+        if fcntl is None:
+            return False
+        try:
+            fh = open(os.path.join(self.dir, "lock"), "a+")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            return False
+        except OSError:
+            return True
+        finally:
+            fh.close()
+
+    def status(self) -> dict:
+        st = self.load()
+        # "running" sin nadie que tenga el lock = el proceso murió a mitad de camino
+        stuck = st["status"] == "running" or (st["status"] == "queued" and time.time() - st["created_at"] > 30)
+        if stuck and not self.is_locked():
+            st["status"] = "interrupted"
+        st["resumable"] = st["status"] in ("interrupted", "failed")
+        if st.get("started_at"):
+            end = st.get("finished_at") or time.time()
+            st["elapsed_s"] = round(end - st["started_at"], 1)
+            if st["rows_read"] and st["elapsed_s"]:
+                st["rows_per_s"] = round(st["rows_read"] / st["elapsed_s"], 1)
+        return st
+
+    # -----------------------------
+    # Proceso
+    # -----------------------------
+    def _records(self, st: dict) -> Iterator[dict]:
+        with open(self.source_path(st["format"]), encoding=st["encoding"], errors="strict", newline="") as fh:
+            yield from (_iter_csv(fh) if st["format"] == "csv" else _iter_ndjson(fh))
+
+    def run(self, normalize: Normalizer, upsert: Upserter, on_done: Callable[[dict], None] | None = None,
+            known_columns: set[str] | None = None, batch_size: int = IMPORT_BATCH_SIZE,
+            workers: int = IMPORT_WORKERS) -> dict | None:
+        """Procesa el trabajo desde el último checkpoint. Devuelve el estado final,
+        o None si otro proceso ya lo está procesando."""
+        if not self._try_lock():
+            return None
+        try:
+            return self._run(normalize, upsert, on_done, known_columns, max(1, batch_size), max(1, workers))
+        finally:
+            self._unlock()
+
+    def _run(self, normalize, upsert, on_done, known_columns, batch_size, workers) -> dict:
+        st = self.load()
+        if st["status"] == "done":
+            return st
+        skip = st["rows_read"]
+        # Lo escrito después del último checkpoint se vuelve a procesar: sin errores duplicados
+        with open(self.errors_path, "a+b") as fh:
+            fh.truncate(st["errors_bytes"])
+        st.update(status="running", error=None, attempts=st["attempts"] + 1, finished_at=None)
+        st["started_at"] = st["started_at"] or _now()
+        self._save(st)
+        log.info("Importación %s: %s desde el registro %s", self.id, "retomada" if skip else "iniciada", skip)
+
+        errors_fh = open(self.errors_path, "a", encoding="utf-8")
+        _CKPT = ("rows_read", "upserted", "rejected", "errors_bytes")
+        ckpt = {k: st[k] for k in _CKPT}
+
+        def _reject(line: int, rec: dict, msg: str):
+            st["rejected"] += 1
+            errors_fh.write(json.dumps(
+                {"line": line, "dni": rec.get("dni"), "error": msg}, ensure_ascii=False, default=str,
+            ) + "\n")
+
+        def _send(batch: list[tuple[int, dict, dict]]) -> list[tuple[int, str]]:
+            return upsert([row for _, _, row in batch])
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                wave: list[list[tuple[int, dict, dict]]] = [[]]
+                n = 0
+
+                def _flush():
+                    # Una tanda = hasta `workers` lotes en paralelo; al terminar, checkpoint
+                    batches = [b for b in wave if b]
+                    results = list(ex.map(_send, batches))
+                    for batch, rejected in zip(batches, results):
+                        bad = dict(rejected)
+                        st["upserted"] += len(batch) - len(bad)
+                        for i, msg in bad.items():
+                            line, rec, _ = batch[i]
+                            _reject(line, rec, msg)
+                    errors_fh.flush()
+                    st["rows_read"] = n
+                    st["errors_bytes"] = os.path.getsize(self.errors_path)
+                    self._save(st)
+                    ckpt.update((k, st[k]) for k in _CKPT)
+                    wave[:] = [[]]
+                    if st["rejected"] > IMPORT_MAX_ERRORS:
+                        raise ImportFailed(f"Demasiados errores ({st['rejected']}); importación abortada")
+
+                for n, rec in enumerate(self._records(st), start=1):
+                    if n <= skip:
+                        continue
+                    line = n + 1 if st["format"] == "csv" else n   # +1: encabezado
+                    if not rec:
+                        continue
+                    if st["columns"] is None:
+                        st["columns"] = sorted(k for k in rec if not k.startswith("__"))
+                        if known_columns is not None:
+                            st["ignored_columns"] = [c for c in st["columns"] if c not in known_columns]
+                    if "__error__" in rec:
+                        _reject(line, {}, rec["__error__"])
+                        continue
+                    try:
+                        row = normalize(rec)
+                    except ValueError as e:
+                        _reject(line, rec, str(e))
+                        continue
+                    wave[-1].append((line, rec, row))
+                    if len(wave[-1]) >= batch_size:
+                        if len(wave) >= workers:
+                            _flush()
+                        else:
+                            wave.append([])
+                _flush()
+        except Exception as e:
+            # Lo posterior al checkpoint se rehace al retomar: los contadores vuelven a él
+            st.update(ckpt)
+            if isinstance(e, UnicodeDecodeError):
+                error = f"Codificación inválida ({st['encoding']}): {e.reason}"
+            else:
+                error = str(e)[:240]
+            st.update(status="failed", error=error, finished_at=_now())
+            log.warning("Importación %s fallida en el registro %s: %s", self.id, st["rows_read"], st["error"])
+        else:
+            st.update(status="done", finished_at=_now())
+            log.info("Importación %s: %s filas, %s rechazadas", self.id, st["upserted"], st["rejected"])
+        finally:
+            errors_fh.close()
+        self._save(st)
+        if st["status"] == "done":
+            _write_json(os.path.join(os.path.dirname(self.dir), "last_done.json"),
+                        {"mark": f"{time.time_ns()}-{self.id}", "job": self.id, "at": st["finished_at"]})
+            if on_done is not None:
+                on_done(st)
+        return st
+
+    def start(self, normalize: Normalizer, upsert: Upserter, on_done: Callable[[dict], None] | None = None,
+              known_columns: set[str] | None = None) -> bool:
+        """Como run(), en un hilo. False si otro proceso ya lo está procesando."""
+        if not self._try_lock():
+            return False
+        st = self.load()
+        st["status"] = "running"
+        self._save(st)
+
+        def _target():
+            try:
+                self._run(normalize, upsert, on_done, known_columns, max(1, IMPORT_BATCH_SIZE), max(1, IMPORT_WORKERS))
+            finally:
+                self._unlock()
+
+        threading.Thread(target=_target, name=f"import-{self.id}", daemon=True).start()
+        return True
+
+    def iter_errors(self, limit: int | None = None) -> Iterator[str]:
+        if not os.path.exists(self.errors_path):
+            return
+        with open(self.errors_path, encoding="utf-8") as fh:
+            for i, line in enumerate(fh):
+                if limit is not None and i >= limit:
+                    return
+                yield line
+
+
+def list_jobs(root: str = IMPORTS_DIR, limit: int = 50) -> list[dict]:
+    if not os.path.isdir(root):
+        return []
+    out = []
+    for name in sorted(os.listdir(root), reverse=True)[:limit]:
+        job = ImportJob(name, root)
+        if job.exists():
+            try:
+                out.append(job.status())
+            except (OSError, ValueError):
+                pass
+    return out
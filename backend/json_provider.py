@@ -0,0 +1,65 @@
+# backend/json_provider.py — Serialización JSON de la app (orjson si está instalado)
+#
+# JSON_PROVIDER=auto (default) usa orjson cuando está disponible y, si no, el
+# json de la stdlib que trae Flask; JSON_PROVIDER=stdlib fuerza el de Flask.
+# La salida es equivalente: claves ordenadas y fechas como las formatea Flask.
+from __future__ import annotations
+
+from typing import Any
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from settings import get_settings
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None  # type: ignore
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _option(self) -> int:
+        # datetime/date pasan por `default` para mantener el formato de Flask
+        opt = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            opt |= orjson.OPT_SORT_KEYS
+        return opt
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs.get("indent") or kwargs.get("cls"):
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode("utf-8")
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Igual que dumps() pero sin pasar por str (para armar cuerpos a mano)."""
+        return orjson.dumps(obj, default=self.default, option=self._option())
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._option() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def dumpb(app: Flask, obj: Any) -> bytes:
+    """Serializa a bytes con el provider de la app, con o sin orjson."""
+    provider = app.json
+    if isinstance(provider, OrjsonProvider):
+        return provider.dumpb(obj)
+    return provider.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def install(app: Flask) -> str:
+    """Configura app.json según JSON_PROVIDER; devuelve el nombre del elegido."""
+    choice = get_settings().json_provider
+    if choice in ("auto", "orjson") and orjson is not None:
+        app.json = OrjsonProvider(app)
+        return "orjson"
+    return "stdlib"
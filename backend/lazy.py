@@ -0,0 +1,25 @@
+# backend/lazy.py — Importación diferida de módulos pesados
+#
+# lazy_import("requests") devuelve el módulo sin ejecutarlo: se carga de verdad
+# con el primer acceso a un atributo (p. ej. requests.exceptions). Sirve para que
+# el arranque del worker no pague requests/urllib3 (~80 ms) si todavía no hace falta.
+from __future__ import annotations
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
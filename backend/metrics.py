@@ -0,0 +1,248 @@
+# backend/metrics.py — Métricas del proceso en formato de texto Prometheus
+#
+# Histogramas de latencia por ruta/método/status, tiempo y bytes de las
+# llamadas a Supabase (con reintentos), y al exportar se agregan el pool de
+# conexiones y las cachés. Cada worker de gunicorn tiene sus propios contadores:
+# Prometheus los distingue por instancia/pid.
+#
+# Por request se acumula el tiempo upstream (ContextVar) para armar el header
+# Server-Timing: upstream vs. local (filtros, serialización, etc.). Con trace
+# (slowlog.py) además se desglosa por fase y se guardan los parámetros de cada
+# llamada a Supabase.
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        # labels -> [conteos por bucket (no acumulados)..., suma, total]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, s in sorted(series.items()):
+            acc = 0
+            for i, b in enumerate(self.buckets):
+                acc += s[i]
+                le = 'le="%s"' % _fmt(b)
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {acc}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_fmt(s[-2])}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {s[-1]}"
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for labels, v in sorted(values.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_fmt(v)}"
+
+
+# -----------------------------
+# Métricas
+# -----------------------------
+http_latency = Histogram(
+    "http_request_duration_seconds", "Duración de los requests HTTP", ("route", "method", "status"),
+)
+http_bytes = Histogram(
+    "http_response_size_bytes", "Tamaño de las respuestas (sin streaming)", ("route",), BYTES_BUCKETS,
+)
+upstream_latency = Histogram(
+    "supabase_request_duration_seconds", "Duración de las llamadas a Supabase (incluye reintentos)",
+    ("method", "status"),
+)
+upstream_bytes = Histogram(
+    "supabase_response_size_bytes", "Tamaño de las respuestas de Supabase", (), BYTES_BUCKETS,
+)
+upstream_retries = Counter("supabase_retries_total", "Reintentos hechos por urllib3 hacia Supabase")
+upstream_errors = Counter("supabase_errors_total", "Llamadas a Supabase que terminaron en excepción", ("kind",))
+
+_start = time.time()
+
+
+# -----------------------------
+# Tiempos por request (Server-Timing)
+# -----------------------------
+class RequestTiming:
+    __slots__ = ("t0", "upstream_s", "upstream_calls", "waited_s", "phases", "calls")
+
+    def __init__(self, trace: bool = False):
+        self.t0 = time.perf_counter()
+        self.upstream_s = 0.0
+        self.upstream_calls = 0
+        self.waited_s = 0.0   # esperando una llamada idéntica de otro request (coalescing)
+        # Sólo con trace (slowlog): segundos por fase y detalle de cada llamada upstream
+        self.phases: dict[str, float] | None = {} if trace else None
+        self.calls: list[dict] | None = [] if trace else None
+
+
+_current: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+
+def begin_request(trace: bool = False) -> RequestTiming:
+    timing = RequestTiming(trace)
+    _current.set(timing)
+    return timing
+
+
+def current() -> RequestTiming | None:
+    return _current.get()
+
+
+def end_request() -> RequestTiming | None:
+    timing = _current.get()
+    _current.set(None)
+    return timing
+
+
+def record_upstream(method: str, status: int | None, seconds: float, size: int | None = None,
+                    retries: int = 0, error: str | None = None, url: str | None = None, params=None):
+    """Lo llama la sesión de supabase_client en cada llamada real (url/params sólo
+    se guardan si el request se está trazando)."""
+    upstream_latency.observe(seconds, method, str(status) if status is not None else "error")
+    if size is not None:
+        upstream_bytes.observe(size)
+    if retries:
+        upstream_retries.inc(retries)
+    if error:
+        upstream_errors.inc(1, error)
+    timing = _current.get()
+    if timing is not None:
+        timing.upstream_s += seconds
+        timing.upstream_calls += 1
+        if timing.calls is not None:
+            timing.calls.append({
+                "method": method, "url": url, "params": params, "status": status,
+                "ms": round(seconds * 1000, 1), "bytes": size, "retries": retries, "error": error,
+            })
+
+
+def record_wait(seconds: float):
+    """Tiempo que un request esperó el resultado de una llamada compartida."""
+    timing = _current.get()
+    if timing is not None:
+        timing.waited_s += seconds
+
+
+@contextmanager
+def phase(name: str):
+    """Suma a la fase `name` el tiempo del bloque (sólo si el request se traza)."""
+    timing = _current.get()
+    if timing is None or timing.phases is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.phases[name] = timing.phases.get(name, 0.0) + time.perf_counter() - t0
+
+
+def server_timing(timing: RequestTiming, total_s: float) -> str:
+    upstream = timing.upstream_s + timing.waited_s
+    parts = [f'upstream;dur={upstream * 1000:.1f};desc="{timing.upstream_calls} calls"']
+    if timing.waited_s:
+        parts.append(f"coalesced;dur={timing.waited_s * 1000:.1f}")
+    parts.append(f"app;dur={max(0.0, total_s - upstream) * 1000:.1f}")
+    parts.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def observe_request(route: str, method: str, status: int, seconds: float, size: int | None):
+    http_latency.observe(seconds, route, method, str(status))
+    if size is not None:
+        http_bytes.observe(size, route)
+
+
+# -----------------------------
+# Exportación
+# -----------------------------
+_collectors: list[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[str]]):
+    """Agrega líneas calculadas al momento de exportar (gauges de pool, cachés...)."""
+    _collectors.append(fn)
+
+
+def gauge_lines(name: str, doc: str, values: Iterable[tuple[dict, float]], kind: str = "gauge") -> list[str]:
+    out = [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+    for labels, v in values:
+        if v is None:
+            continue
+        names = tuple(labels.keys())
+        out.append(f"{name}{_labels(names, tuple(labels.values()))} {_fmt(v)}")
+    return out
+
+
+def render() -> str:
+    lines: list[str] = []
+    for m in (http_latency, http_bytes, upstream_latency, upstream_bytes, upstream_retries, upstream_errors):
+        lines.extend(m.render())
+    lines += gauge_lines("process_uptime_seconds", "Segundos desde que arrancó el proceso",
+                         [({"pid": os.getpid()}, round(time.time() - _start, 1))])
+    for fn in _collectors:
+        try:
+            lines.extend(fn())
+        except Exception as e:  # un collector roto no tira abajo /metrics
+            lines.append(f"# collector error: {type(e).__name__}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,239 @@
+# backend/novedades_feed.py — Feed de novedades publicado, en memoria
+#
+# Todas las novedades del proceso viven acá; las visibles (publicada y con
+# fecha_publicacion ya cumplida) se mantienen ordenadas (más nuevas primero) y
+# indexadas por título/resumen/contenido (search_index.NameIndex). Los cambios
+# se aplican fila por fila (apply), sin reconstruir todo: se reubica la fila en
+# el orden y en el índice y se sube la versión.
+#
+# Las páginas se serializan una vez por versión y quedan en una TTLCache con su
+# ETag (hash del cuerpo: igual en todos los workers con los mismos datos). Las
+# programadas a futuro aparecen solas cuando llega su fecha.
+from __future__ import annotations
+
+import bisect
+import datetime as dt
+import hashlib
+import threading
+import time
+from typing import Any, Callable
+
+from cache import TTLCache
+from search_index import NameIndex, fold, tokens
+
+SEARCH_FIELDS = ("titulo", "resumen", "contenido")
+
+
+def _epoch(iso) -> float:
+    if not iso:
+        return 0.0
+    try:
+        ts = dt.datetime.fromisoformat(str(iso).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=dt.timezone.utc)
+    return ts.timestamp()
+
+
+def _etag(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+class NovedadesFeed:
+    def __init__(self, list_fields: tuple[str, ...], page_cache_size: int = 256):
+        self.list_fields = list_fields
+        self._lock = threading.RLock()
+        self._rows: dict[int, dict] = {}
+        self._keys: dict[int, tuple[float, int]] = {}   # id -> (-fecha, -id): orden del feed
+        self._order: list[tuple[float, int]] = []       # claves de las visibles, ordenadas
+        self._scheduled: dict[int, float] = {}          # publicadas con fecha futura
+        self._next_publish: float | None = None
+        self._index = NameIndex(SEARCH_FIELDS)
+        self._details: dict[int, tuple[str, bytes]] = {}
+        self._pages = TTLCache("novedades_pages", maxsize=page_cache_size, ttl=3600)
+        self.version = 0
+        self.loaded = False
+        self.loaded_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # -----------------------------
+    # Mantenimiento
+    # -----------------------------
+    def _hide_locked(self, doc_id: int):
+        key = self._keys.get(doc_id)
+        if key is None:
+            return
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+            self._index.apply([], [doc_id])
+
+    def _remove_locked(self, doc_id: int):
+        self._hide_locked(doc_id)
+        self._rows.pop(doc_id, None)
+        self._keys.pop(doc_id, None)
+        self._scheduled.pop(doc_id, None)
+        self._details.pop(doc_id, None)
+
+    def _add_locked(self, row: dict, now: float):
+        doc_id = row["id"]
+        ts = _epoch(row.get("fecha_publicacion"))
+        key = (-ts, -doc_id)
+        self._rows[doc_id] = row
+        self._keys[doc_id] = key
+        if not row.get("publicada"):
+            return
+        if ts > now:
+            self._scheduled[doc_id] = ts
+            return
+        bisect.insort(self._order, key)
+        self._index.apply([row], [])
+
+    def _changed_locked(self):
+        self.version += 1
+        self._next_publish = min(self._scheduled.values()) if self._scheduled else None
+        self._pages.clear()
+
+    def apply(self, rows: list[dict], deleted_ids: list[int], reset: bool = False) -> int:
+        """Aplica altas/modificaciones y bajas; devuelve cuántas filas cambiaron de verdad."""
+        now = time.time()
+        changed = 0
+        with self._lock:
+            if reset:
+                changed = len(self._rows)
+                self._rows.clear()
+                self._keys.clear()
+                self._order.clear()
+                self._scheduled.clear()
+                self._details.clear()
+                self._index.clear()
+            for doc_id in deleted_ids:
+                if doc_id in self._rows:
+                    self._remove_locked(doc_id)
+                    changed += 1
+            for row in rows:
+                doc_id = row.get("id")
+                if doc_id is None or self._rows.get(doc_id) == row:
+                    continue   # la misma fila que ya teníamos (p. ej. la escribió este worker)
+                self._remove_locked(doc_id)
+                self._add_locked(dict(row), now)
+                changed += 1
+            if changed or reset:
+                self._changed_locked()
+            if reset:
+                self.loaded = True
+                self.loaded_at = time.time()
+        return changed
+
+    def _publish_due(self):
+        """Pasa al feed las programadas cuya fecha ya llegó."""
+        nxt = self._next_publish
+        if nxt is None or time.time() < nxt:
+            return
+        now = time.time()
+        with self._lock:
+            due = [i for i, ts in self._scheduled.items() if ts <= now]
+            for doc_id in due:
+                del self._scheduled[doc_id]
+                bisect.insort(self._order, self._keys[doc_id])
+                self._index.apply([self._rows[doc_id]], [])
+            if due:
+                self._changed_locked()
+            else:
+                self._next_publish = min(self._scheduled.values()) if self._scheduled else None
+
+    # -----------------------------
+    # Consulta
+    # -----------------------------
+    def _visible(self, doc_id: int) -> bool:
+        key = self._keys.get(doc_id)
+        if key is None:
+            return False
+        i = bisect.bisect_left(self._order, key)
+        return i < len(self._order) and self._order[i] == key
+
+    def _matching_ids(self, q: str, drafts: bool) -> list[int]:
+        if drafts:
+            # Vista de administración (todas, incluidas borradores y programadas): recorrido lineal
+            ids = sorted(self._rows, key=self._keys.__getitem__)
+            qt = tokens(q)
+            if not qt:
+                return ids
+            hay = {i: fold(" ".join(str(self._rows[i].get(f) or "") for f in SEARCH_FIELDS)) for i in ids}
+            return [i for i in ids if all(t in hay[i] for t in qt)]
+        if not q:
+            return [-k[1] for k in self._order]
+        ranked, _ = self._index.search(q, limit=max(1, len(self._order)))
+        # Relevancia primero; a igual relevancia, la más nueva
+        ranked.sort(key=lambda t: (-t[1], self._keys[t[0]]))
+        return [i for i, _ in ranked]
+
+    def page(self, q: str, page: int, page_size: int, dumps: Callable[[Any], bytes],
+             drafts: bool = False) -> tuple[str, bytes]:
+        """(ETag, cuerpo JSON) de la página pedida; se arma una vez por versión."""
+        self._publish_due()
+        key = (self.version, " ".join(tokens(q)), page, page_size, drafts)
+        hit, cached = self._pages.get(key)
+        if hit:
+            return cached
+        with self._lock:
+            ids = self._matching_ids(q, drafts)
+            start = (page - 1) * page_size
+            items = [{f: self._rows[i].get(f) for f in self.list_fields} for i in ids[start:start + page_size]]
+            payload = {
+                "items": items,
+                "total": len(ids),
+                "page": page,
+                "page_size": page_size,
+                "has_next": start + page_size < len(ids),
+            }
+            if q:
+                payload["q"] = q
+        body = dumps(payload)
+        out = (_etag(body), body)
+        self._pages.set(key, out)
+        return out
+
+    def detail(self, doc_id: int, dumps: Callable[[Any], bytes],
+               drafts: bool = False) -> tuple[str, bytes] | None:
+        """(ETag, cuerpo JSON) de una novedad, o None si no existe (o no es visible)."""
+        self._publish_due()
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None or (not drafts and not self._visible(doc_id)):
+                return None
+            cached = self._details.get(doc_id)
+            if cached is None:
+                body = dumps(row)
+                cached = self._details[doc_id] = (_etag(body), body)
+            return cached
+
+    def get(self, doc_id: int) -> dict | None:
+        with self._lock:
+            row = self._rows.get(doc_id)
+            return dict(row) if row is not None else None
+
+    def ids(self) -> list[int]:
+        with self._lock:
+            return list(self._rows)
+
+    def max_id(self) -> int:
+        with self._lock:
+            return max(self._rows, default=0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "version": self.version,
+                "rows": len(self._rows),
+                "visible": len(self._order),
+                "scheduled": len(self._scheduled),
+                "next_publish": (dt.datetime.fromtimestamp(self._next_publish, dt.timezone.utc).isoformat()
+                                 if self._next_publish else None),
+                "index": self._index.stats(),
+                "pages": self._pages.stats(),
+            }
@@ -0,0 +1,211 @@
+# backend/profiler.py — Profiler por muestreo del proceso, bajo demanda
+#
+# Un hilo de sistema mira cada `interval_s` el stack de todos los hilos
+# (sys._current_frames) durante `seconds` y cuenta cuántas veces aparece cada
+# stack. El resultado sale en formato "collapsed" (frame;frame;frame N), el que
+# aceptan flamegraph.pl, speedscope e inferno. No instrumenta nada: fuera de la
+# ventana de muestreo el costo es cero, y durante la ventana es una lectura
+# de stacks cada pocos ms.
+#
+# Con gevent el hilo de muestreo es un hilo real (no una greenlet). Además del
+# stack que está corriendo, lee el `gr_frame` de cada greenlet suspendida: así
+# aparecen también los requests que esperan red (p. ej. a Supabase). Las
+# greenlets se toman de gc al empezar y, durante la ventana, de
+# greenlet.settrace (las que se crean o despiertan).
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+
+from settings import get_settings
+
+_cfg = get_settings()
+
+PROFILE_MAX_S       = _cfg.profile_max_s
+PROFILE_INTERVAL_MS = _cfg.profile_interval_ms
+PROFILE_MAX_DEPTH   = _cfg.profile_max_depth
+
+# Un solo perfil a la vez por proceso
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _originals():
+    """start_new_thread / get_ident / sleep sin el monkey-patch de gevent (si lo hay)."""
+    import _thread
+
+    try:
+        from gevent import monkey
+    except ImportError:
+        return _thread.start_new_thread, _thread.get_ident, time.sleep
+    if not monkey.is_module_patched("threading"):
+        return _thread.start_new_thread, _thread.get_ident, time.sleep
+    return (
+        monkey.get_original("_thread", "start_new_thread"),
+        monkey.get_original("_thread", "get_ident"),
+        monkey.get_original("time", "sleep"),
+    )
+
+
+def _track_greenlets():
+    """Con gevent: (greenlets del proceso, función que quita el trace). Sin gevent: (None, None).
+
+    Se llama desde el hilo del hub (el request que pidió el perfil): settrace es por hilo.
+    """
+    try:
+        import greenlet
+        from gevent import monkey
+    except ImportError:
+        return None, None
+    if not monkey.is_module_patched("threading"):
+        return None, None
+    seen = weakref.WeakSet(o for o in gc.get_objects() if isinstance(o, greenlet.greenlet))
+    previous = None
+
+    def _trace(event, args):
+        if event in ("switch", "throw"):
+            seen.add(args[1])
+        if previous is not None:
+            previous(event, args)
+
+    previous = greenlet.settrace(_trace)
+    return seen, lambda: greenlet.settrace(previous)
+
+
+def _snapshot(greenlets: weakref.WeakSet) -> list:
+    # El hub puede agregar greenlets mientras el muestreo las recorre
+    for _ in range(3):
+        try:
+            return list(greenlets)
+        except RuntimeError:
+            continue
+    return []
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    parts = filename.replace("\\", "/").rsplit("/", 2)
+    short = "/".join(parts[-2:]) if len(parts) > 1 else filename
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+def _stack(frame, labels: dict) -> tuple[str, ...]:
+    out = []
+    while frame is not None and len(out) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        label = labels.get(code)
+        if label is None:
+            label = labels[code] = _label(code)
+        out.append(label)
+        frame = frame.f_back
+    out.reverse()
+    return tuple(out)
+
+
+def _in_request(stack: tuple[str, ...]) -> bool:
+    return any(f.startswith("wsgi_app (flask/app.py") for f in stack)
+
+
+def sample(seconds: float, interval_s: float | None = None, only_requests: bool = True,
+           by_thread: bool = False) -> dict:
+    """Muestrea el proceso durante `seconds` y devuelve los stacks contados.
+
+    only_requests: descarta los hilos que no están atendiendo un request (el
+    arbiter de gunicorn, el sync de la réplica esperando, etc.).
+    by_thread: agrega el nombre del hilo (o de la greenlet) como raíz de cada stack.
+    Bloquea al llamador: con gevent espera cediendo el control (time.sleep parcheado).
+    """
+    seconds = max(0.1, min(float(seconds), PROFILE_MAX_S))
+    interval_s = max(0.001, interval_s if interval_s is not None else PROFILE_INTERVAL_MS / 1000)
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("ya hay un perfil en curso en este proceso")
+
+    start_thread, get_ident, real_sleep = _originals()
+    stacks: Counter = Counter()
+    state = {"samples": 0, "done": False, "error": None}
+    try:
+        greenlets, untrace = _track_greenlets()
+    except BaseException:
+        _busy.release()
+        raise
+
+    def _run():
+        me = get_ident()
+        labels: dict = {}
+        waiting = _label(sample.__code__)   # el request que pidió el perfil, esperando
+        deadline = time.perf_counter() + seconds
+
+        def _count(frame, root: str):
+            st = _stack(frame, labels)
+            if waiting in st:
+                return
+            if only_requests and not _in_request(st):
+                return
+            if by_thread:
+                st = (root,) + st
+            stacks[st] += 1
+
+        try:
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()} if by_thread else {}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        _count(frame, f"thread:{names.get(ident, ident)}")
+                if greenlets is not None:
+                    # La greenlet en ejecución tiene gr_frame None: ya salió en _current_frames
+                    for gr in _snapshot(greenlets):
+                        frame = gr.gr_frame
+                        if frame is not None:
+                            _count(frame, f"greenlet:{getattr(gr, 'name', None) or hex(id(gr))}")
+                state["samples"] += 1
+                real_sleep(interval_s)
+        except Exception as e:  # el perfil se corta, pero se devuelve lo que haya
+            state["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            state["done"] = True
+
+    t0 = time.perf_counter()
+    try:
+        start_thread(_run, ())
+        while not state["done"]:
+            time.sleep(min(0.05, interval_s * 5))
+    finally:
+        if untrace is not None:
+            untrace()
+        _busy.release()
+    return {
+        "pid": os.getpid(),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "interval_ms": round(interval_s * 1000, 3),
+        "ticks": state["samples"],
+        "samples": sum(stacks.values()),
+        "error": state["error"],
+        "greenlets": len(greenlets) if greenlets is not None else None,
+        "stacks": stacks,
+    }
+
+
+def collapsed(stacks: Counter) -> str:
+    """Formato de flamegraph.pl: una línea por stack, frames separados por ';'."""
+    return "".join(f"{';'.join(st)} {n}\n" for st, n in stacks.most_common())
+
+
+def top_functions(stacks: Counter, limit: int = 30) -> list[dict]:
+    """Frames con más muestras: propias (hoja del stack) y acumuladas."""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for st, n in stacks.items():
+        if not st:
+            continue
+        own[st[-1]] += n
+        for f in set(st):
+            total[f] += n
+    return [{"frame": f, "self": own[f], "total": n} for f, n in total.most_common(limit)]
@@ -0,0 +1,198 @@
+# backend/ratelimit.py — Límite de requests por cliente (token bucket con costo por ruta)
+#
+# Apagado por defecto (RATE_LIMIT_ENABLED=1 lo activa): sin API keys el cliente es
+# la IP, y una oficina entera detrás de un NAT comparte un mismo balde.
+# Cada cliente (API key de RATE_LIMIT_API_KEYS, o IP después de ProxyFix) tiene
+# un balde de RATE_LIMIT_BURST fichas que se recarga a RATE_LIMIT_RATE fichas por
+# segundo. Cada request gasta lo que cuesta su ruta: 1 por defecto, más para las
+# que pesan sobre Supabase (páginas grandes, export, stats; ver @cost). Sin
+# fichas: 429 con Retry-After.
+#
+# El estado es por proceso: con varios workers cada uno aplica 1/N del límite
+# (N = RATE_LIMIT_WORKERS, por defecto WEB_CONCURRENCY), así el total por cliente
+# queda aproximadamente en lo configurado.
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable
+
+from flask import Flask, g, jsonify, request
+
+from settings import get_settings
+
+_cfg = get_settings()
+
+RATE_LIMIT_ENABLED     = _cfg.rate_limit_enabled
+RATE_LIMIT_RATE        = _cfg.rate_limit_rate
+RATE_LIMIT_BURST       = _cfg.rate_limit_burst
+RATE_LIMIT_KEY_RATE    = _cfg.rate_limit_key_rate
+RATE_LIMIT_KEY_BURST   = _cfg.rate_limit_key_burst
+RATE_LIMIT_MAX_CLIENTS = _cfg.rate_limit_max_clients
+RATE_LIMIT_WORKERS     = _cfg.rate_limit_workers
+RATE_LIMIT_API_KEYS    = _cfg.rate_limit_api_keys
+
+# Rutas que no se limitan (salud, métricas, preflight de CORS)
+EXEMPT_PREFIXES = ("/api/health", "/metrics")
+
+
+def _parse_keys(raw: str) -> dict[str, str]:
+    out = {}
+    for item in raw.split(","):
+        name, sep, key = item.strip().partition(":")
+        if sep and name.strip() and key.strip():
+            out[key.strip()] = name.strip()
+    return out
+
+
+class TokenBuckets:
+    """Un balde por cliente; se olvidan los menos recientes pasado `max_clients`."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max(1, max_clients)
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()   # cliente -> [fichas, t]
+        self.allowed = 0
+        self.rejected = 0
+        self.rejected_by: Counter = Counter()
+
+    def take(self, client: str, cost: float) -> tuple[bool, float, float]:
+        """Devuelve (permitido, fichas restantes, segundos hasta poder pagar `cost`)."""
+        cost = min(cost, self.burst)   # un request caro nunca queda bloqueado para siempre
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(client)
+            if b is None:
+                b = self._buckets[client] = [self.burst, now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+                self._buckets.move_to_end(client)
+            if b[0] >= cost:
+                b[0] -= cost
+                self.allowed += 1
+                return True, b[0], 0.0
+            self.rejected += 1
+            self.rejected_by[client] += 1
+            return False, b[0], (cost - b[0]) / self.rate if self.rate > 0 else 60.0
+
+    def status(self, top: int = 0) -> dict:
+        with self._lock:
+            out = {
+                "rate_per_s": self.rate,
+                "burst": self.burst,
+                "clients": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+            }
+            if top:
+                out["top_rejected"] = [{"client": c, "rejected": n} for c, n in self.rejected_by.most_common(top)]
+            return out
+
+
+_ip_buckets = TokenBuckets(RATE_LIMIT_RATE / RATE_LIMIT_WORKERS, RATE_LIMIT_BURST / RATE_LIMIT_WORKERS,
+                           RATE_LIMIT_MAX_CLIENTS)
+_key_buckets = TokenBuckets(RATE_LIMIT_KEY_RATE / RATE_LIMIT_WORKERS, RATE_LIMIT_KEY_BURST / RATE_LIMIT_WORKERS,
+                            RATE_LIMIT_MAX_CLIENTS)
+_api_keys = _parse_keys(RATE_LIMIT_API_KEYS)
+
+
+def _after_fork_in_child():
+    for b in (_ip_buckets, _key_buckets):
+        b.__init__(b.rate, b.burst, b.max_clients)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# -----------------------------
+# Costo por ruta
+# -----------------------------
+def cost(weight: float | Callable[[], float]):
+    """Decorador: cuántas fichas gasta la ruta (número, o función sin argumentos
+    que mira el request, p. ej. el page_size)."""
+
+    def deco(fn):
+        fn._rate_cost = weight
+        return fn
+
+    return deco
+
+
+def per_rows(param: str, default: int, rows_per_token: int, base: float = 1.0) -> Callable[[], float]:
+    """Costo que crece con el tamaño pedido: base + <param> / rows_per_token."""
+
+    def _cost() -> float:
+        try:
+            n = int(request.args.get(param) or default)
+        except ValueError:
+            n = default
+        return base + max(0, n) / rows_per_token
+
+    return _cost
+
+
+def _request_cost(app: Flask) -> float:
+    view = app.view_functions.get(request.endpoint) if request.endpoint else None
+    weight = getattr(view, "_rate_cost", 1.0)
+    return float(weight() if callable(weight) else weight)
+
+
+def _client() -> tuple[str, TokenBuckets]:
+    key = request.headers.get("X-API-Key") or ""
+    name = _api_keys.get(key) if key else None
+    if name:
+        return f"key:{name}", _key_buckets
+    return f"ip:{request.remote_addr or '-'}", _ip_buckets
+
+
+# -----------------------------
+# Integración con Flask
+# -----------------------------
+def init_app(app: Flask):
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    @app.before_request
+    def _rate_limit():
+        if request.method == "OPTIONS" or request.path.startswith(EXEMPT_PREFIXES):
+            return None
+        client, buckets = _client()
+        ok, remaining, wait_s = buckets.take(client, _request_cost(app))
+        g.rate_limit = (buckets.burst, remaining)
+        if ok:
+            return None
+        retry_after = max(1, int(math.ceil(wait_s)))
+        resp = jsonify({
+            "error": "rate_limited",
+            "detail": "Demasiados requests; reintentar más tarde",
+            "retry_after_s": retry_after,
+        })
+        resp.status_code = 429
+        resp.headers["Retry-After"] = str(retry_after)
+        return resp
+
+    @app.after_request
+    def _rate_limit_headers(resp):
+        state = g.get("rate_limit")
+        if state is not None:
+            resp.headers["RateLimit-Limit"] = str(int(state[0]))
+            resp.headers["RateLimit-Remaining"] = str(int(state[1]))
+        return resp
+
+
+def status(top: int = 0) -> dict:
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "workers_divisor": RATE_LIMIT_WORKERS,
+        "ip": _ip_buckets.status(top),
+        "api_key": {**_key_buckets.status(top), "keys": len(_api_keys)},
+    }
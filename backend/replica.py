@@ -0,0 +1,701 @@
+# backend/replica.py — Réplica local (SQLite) de la tabla de afiliados
+#
+# Un hilo de sincronización hace una carga completa y luego trae sólo las filas
+# cuyo `actualizado_en` cambió desde la última marca de agua. Con varios workers
+# de gunicorn, un lock de archivo asegura que sincronice uno solo; el resto lee
+# el mismo archivo (modo WAL). Cada lote escrito recibe un número de secuencia
+# (`_seq`) para que otros componentes puedan refrescarse de forma incremental.
+# Sin réplica, TableScanFollower mantiene esas mismas estructuras recorriendo
+# Supabase directamente.
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos (un solo worker en dev)
+    fcntl = None  # type: ignore
+
+from settings import get_settings
+from supabase_client import get_client
+
+log = logging.getLogger("replica")
+
+_cfg = get_settings()
+
+REPLICA_PATH     = _cfg.replica_path
+SYNC_INTERVAL_S  = _cfg.replica_sync_interval_s
+FULL_RESYNC_S    = _cfg.replica_full_resync_s
+SYNC_CHUNK       = _cfg.replica_sync_chunk
+HTTP_TIMEOUT     = _cfg.http_timeout
+
+INDEXED = ("dni", "apellido", "empresa", "sector", "lugar_trabajo", "creado_en", "actualizado_en")
+
+
+class Replica:
+    def __init__(self, columns: list[str], path: str = REPLICA_PATH):
+        self.columns = [c for c in columns if c != "id"]
+        self.path = path
+        self._local = threading.local()
+        self._thread: threading.Thread | None = None
+        self._thread_pid: int | None = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock_fh = None
+        self.last_error: str | None = None
+        self._schema_ready = False
+
+    # -----------------------------
+    # Conexión / esquema
+    # -----------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._schema_ready:
+                self._create_schema(conn)
+                self._schema_ready = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS afiliados (id INTEGER PRIMARY KEY, {cols}, "
+            "_raw TEXT NOT NULL, _gen INTEGER NOT NULL DEFAULT 0, _seq INTEGER NOT NULL DEFAULT 0)"
+        )
+        for c in INDEXED:
+            if c in self.columns:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS ix_afiliados_{c} ON afiliados ("{c}", id)')
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_afiliados__seq ON afiliados (_seq)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS afiliados_tombstones "
+            "(id INTEGER PRIMARY KEY, dni TEXT, deleted_at TEXT NOT NULL, _seq INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_tombstones_deleted_at ON afiliados_tombstones (deleted_at, id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _meta(self, key: str, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, conn: sqlite3.Connection, **kv):
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(k, str(v)) for k, v in kv.items()],
+        )
+
+    # -----------------------------
+    # Estado
+    # -----------------------------
+    def status(self) -> dict:
+        try:
+            last = self._meta("last_sync_at")
+            full = self._meta("full_loaded_at")
+            rows = self._conn().execute("SELECT COUNT(*) FROM afiliados").fetchone()[0]
+            return {
+                "path": self.path,
+                "rows": rows,
+                "seq": int(self._meta("seq", 0)),
+                "watermark": self._meta("watermark"),
+                "last_sync_at": float(last) if last else None,
+                "full_loaded_at": float(full) if full else None,
+                "age_s": self.age_s(),
+                "syncing_here": self._lock_fh is not None,
+                "last_error": self.last_error,
+            }
+        except sqlite3.Error as e:
+            return {"path": self.path, "error": str(e)}
+
+    def age_s(self) -> float | None:
+        """Segundos desde la última sincronización exitosa (None si nunca hubo carga completa)."""
+        try:
+            if not self._meta("full_loaded_at"):
+                return None
+            last = self._meta("last_sync_at")
+        except sqlite3.Error:
+            return None
+        return round(time.time() - float(last), 1) if last else None
+
+    def seq(self) -> int:
+        return int(self._meta("seq", 0))
+
+    # -----------------------------
+    # Escritura
+    # -----------------------------
+    def _cell(self, v):
+        if isinstance(v, (dict, list)):
+            return json.dumps(v, ensure_ascii=False)
+        return v
+
+    def _upsert(self, conn: sqlite3.Connection, rows: list[dict], gen: int, seq: int):
+        cols = ["id"] + self.columns
+        sql = (
+            f"INSERT OR REPLACE INTO afiliados ({', '.join(chr(34) + c + chr(34) for c in cols)}, _raw, _gen, _seq) "
+            f"VALUES ({', '.join('?' for _ in cols)}, ?, ?, ?)"
+        )
+        conn.executemany(sql, [
+            [self._cell(r.get(c)) for c in cols]
+            + [json.dumps(r, ensure_ascii=False, separators=(",", ":")), gen, seq]
+            for r in rows if r.get("id") is not None
+        ])
+        if rows:
+            conn.executemany("DELETE FROM afiliados_tombstones WHERE id = ?", [(r.get("id"),) for r in rows])
+
+    def _write_batch(self, rows: list[dict], gen: int, **meta):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = int(self._meta("seq", 0)) + 1
+            self._upsert(conn, rows, gen, seq)
+            self._set_meta(conn, seq=seq, **meta)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -----------------------------
+    # Sincronización
+    # -----------------------------
+    def _fetch(self, params: list[tuple[str, str]]) -> list[dict]:
+        supa_url, table, sess = get_client()
+        if not sess:
+            raise RuntimeError("Supabase no configurado")
+        r = sess.get(f"{supa_url}/rest/v1/{table}", params=params, timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+    def full_load(self):
+        gen = int(self._meta("gen", 0)) + 1
+        started = time.time()
+        last_id = None
+        mark = (self._meta("watermark") or "", int(self._meta("watermark_id", 0)))
+        total = 0
+        while not self._stop.is_set():
+            params = [("select", "*"), ("order", "id.asc"), ("limit", str(SYNC_CHUNK))]
+            if last_id is not None:
+                params.append(("id", f"gt.{last_id}"))
+            rows = self._fetch(params)
+            if rows:
+                mark = max([mark] + [(str(r["actualizado_en"]), r["id"]) for r in rows if r.get("actualizado_en")])
+                self._write_batch(rows, gen)
+                total += len(rows)
+                last_id = rows[-1]["id"]
+            if len(rows) < SYNC_CHUNK:
+                break
+        if self._stop.is_set():
+            return
+
+        # Lo que no apareció en esta pasada fue borrado en el origen
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = int(self._meta("seq", 0)) + 1
+            now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            conn.execute(
+                "INSERT OR REPLACE INTO afiliados_tombstones (id, dni, deleted_at, _seq) "
+                "SELECT id, dni, ?, ? FROM afiliados WHERE _gen < ?",
+                (now_iso, seq, gen),
+            )
+            deleted = conn.execute("DELETE FROM afiliados WHERE _gen < ?", (gen,)).rowcount
+            self._set_meta(conn, seq=seq, gen=gen, watermark=mark[0], watermark_id=mark[1],
+                           full_loaded_at=time.time(), last_sync_at=time.time())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        log.info("Réplica: carga completa de %s filas (%s borradas) en %.1fs",
+                 total, deleted, time.time() - started)
+
+    def incremental(self):
+        gen = int(self._meta("gen", 0))
+        watermark = self._meta("watermark")
+        if not watermark:
+            return self.full_load()
+        # Keyset sobre (actualizado_en, id) a partir de la última fila vista
+        last = (watermark, int(self._meta("watermark_id", 0)))
+        total = 0
+        while not self._stop.is_set():
+            ts, i = last
+            params = [
+                ("select", "*"),
+                ("order", "actualizado_en.asc,id.asc"),
+                ("limit", str(SYNC_CHUNK)),
+                ("or", f'(actualizado_en.gt."{ts}",and(actualizado_en.eq."{ts}",id.gt.{i}))'),
+            ]
+            rows = self._fetch(params)
+            if rows:
+                last = (str(rows[-1]["actualizado_en"]), rows[-1]["id"])
+                self._write_batch(rows, gen, watermark=last[0], watermark_id=last[1])
+                total += len(rows)
+            if len(rows) < SYNC_CHUNK:
+                break
+        conn = self._conn()
+        self._set_meta(conn, last_sync_at=time.time())
+        if total:
+            log.info("Réplica: %s filas actualizadas (marca %s)", total, last[0])
+
+    def sync_once(self):
+        full = self._meta("full_loaded_at")
+        if not full or time.time() - float(full) > FULL_RESYNC_S:
+            self.full_load()
+        else:
+            self.incremental()
+
+    def _try_lock(self) -> bool:
+        if self._lock_fh is not None:
+            return True
+        if fcntl is None:
+            self._lock_fh = True
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fh = open(self.path + ".lock", "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._lock_fh = fh
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._try_lock():
+                try:
+                    self.sync_once()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)[:240]
+                    log.warning("Réplica: sincronización fallida: %s", self.last_error)
+            self._wake.wait(SYNC_INTERVAL_S)
+            self._wake.clear()
+
+    def wake(self):
+        """Sincroniza ya, sin esperar SYNC_INTERVAL_S (si este proceso es el que sincroniza)."""
+        self._wake.set()
+
+    def start_sync(self):
+        """Arranca (una vez por proceso) el hilo de sincronización."""
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid:
+            return
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock_fh = None      # un lock heredado por fork no es de este proceso
+        self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+        self._thread_pid = pid
+        self._thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+        self._wake.set()
+
+    # -----------------------------
+    # Lectura
+    # -----------------------------
+    def _where(self, f: dict) -> tuple[list[str], list]:
+        where, args = [], []
+
+        def like(col: str, v: str):
+            where.append(f"\"{col}\" LIKE ? ESCAPE '\\'")
+            args.append(f"%{v}%")
+
+        if f.get("dni"):
+            where.append("dni = ?")
+            args.append(f["dni"])
+        if f.get("q"):
+            where.append("(apellido LIKE ? ESCAPE '\\' OR nombres LIKE ? ESCAPE '\\' OR apellido_nombre LIKE ? ESCAPE '\\')")
+            args += [f"%{f['q']}%"] * 3
+        if f.get("empresa"):
+            like("empresa", f["empresa"])
+        if f.get("sector"):
+            like("sector", f["sector"])
+        if f.get("lugar"):
+            like("lugar_trabajo", f["lugar"])
+        for key, col, op in (("created_from", "creado_en", ">="), ("created_to", "creado_en", "<"),
+                             ("updated_from", "actualizado_en", ">="), ("updated_to", "actualizado_en", "<")):
+            if f.get(key):
+                where.append(f"{col} {op} ?")
+                args.append(f[key])
+        return where, args
+
+    @staticmethod
+    def _order_sql(sort: str, order: str) -> str:
+        # Igual que Postgres: NULL es el valor más grande
+        if sort == "id":
+            return f"id {order.upper()}"
+        if order == "asc":
+            return f'"{sort}" IS NULL, "{sort}" ASC, id ASC'
+        return f'"{sort}" IS NULL DESC, "{sort}" DESC, id DESC'
+
+    @staticmethod
+    def _keyset_sql(sort: str, value, last_id, after: bool) -> tuple[str, list]:
+        if sort == "id":
+            return ("id > ?" if after else "id < ?"), [last_id]
+        s = f'"{sort}"'
+        if value is None:
+            if after:
+                return f"({s} IS NULL AND id > ?)", [last_id]
+            return f"({s} IS NOT NULL OR ({s} IS NULL AND id < ?))", [last_id]
+        if after:
+            return f"({s} > ? OR ({s} = ? AND id > ?) OR {s} IS NULL)", [value, value, last_id]
+        return f"({s} < ? OR ({s} = ? AND id < ?))", [value, value, last_id]
+
+    @staticmethod
+    def _project(raw: str, cols: list[str] | None) -> dict:
+        row = json.loads(raw)
+        return {c: row.get(c) for c in cols} if cols else row
+
+    def query_list(self, filters: dict, sort: str, order: str, limit: int, offset: int = 0,
+                   keyset: tuple | None = None, select: list[str] | None = None) -> list[dict]:
+        """keyset = (value, last_id, direction) con la misma semántica que el cursor del listado."""
+        where, args = self._where(filters)
+        scan_order = order
+        if keyset is not None:
+            value, last_id, direction = keyset
+            after = (order == "asc") == (direction == "next")
+            scan_order = "asc" if after else "desc"
+            cond, cargs = self._keyset_sql(sort, value, last_id, after)
+            where.append(cond)
+            args += cargs
+        sql = "SELECT _raw FROM afiliados"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {self._order_sql(sort, scan_order)} LIMIT ?"
+        args.append(limit)
+        if keyset is None and offset:
+            sql += " OFFSET ?"
+            args.append(offset)
+        return [self._project(r[0], select) for r in self._conn().execute(sql, args)]
+
+    def count(self, filters: dict) -> int:
+        where, args = self._where(filters)
+        sql = "SELECT COUNT(*) FROM afiliados"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._conn().execute(sql, args).fetchone()[0]
+
+    def get_by_dni(self, dni: str, select: list[str] | None = None) -> dict | None:
+        row = self._conn().execute("SELECT _raw FROM afiliados WHERE dni = ? LIMIT 1", (dni,)).fetchone()
+        return self._project(row[0], select) if row else None
+
+    def stats(self, group: str, limit: int = 500) -> list[dict]:
+        sql = (
+            f'SELECT "{group}" AS grupo, COUNT(*) AS cantidad FROM afiliados '
+            f'GROUP BY "{group}" ORDER BY cantidad DESC LIMIT ?'
+        )
+        return [dict(r) for r in self._conn().execute(sql, (limit,))]
+
+    def get_many(self, ids: list[int], select: list[str] | None = None) -> dict[int, dict]:
+        out: dict[int, dict] = {}
+        conn = self._conn()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            sql = f"SELECT id, _raw FROM afiliados WHERE id IN ({','.join('?' for _ in chunk)})"
+            for r in conn.execute(sql, chunk):
+                out[r[0]] = self._project(r[1], select)
+        return out
+
+    # -----------------------------
+    # Cambios por secuencia (para índices/agregados derivados)
+    # -----------------------------
+    def changes_since(self, seq: int, limit: int = 5000) -> tuple[list[dict], list[int], int]:
+        """Devuelve (filas, ids_borrados, nueva_seq) con `_seq` > seq, por bloques de `limit`."""
+        conn = self._conn()
+        current = self.seq()   # leído antes que las filas: lo escrito después queda para la próxima
+        rows = conn.execute(
+            "SELECT _raw, _seq FROM afiliados WHERE _seq > ? AND _seq <= ? ORDER BY _seq, id LIMIT ?",
+            (seq, current, limit),
+        ).fetchall()
+        if len(rows) == limit:
+            # Bloque lleno: avanzar sólo hasta la última secuencia completa
+            top = rows[-1][1]
+            if rows[0][1] != top:
+                rows = [r for r in rows if r[1] < top]
+                top -= 1
+            else:
+                rows = conn.execute(
+                    "SELECT _raw, _seq FROM afiliados WHERE _seq = ? ORDER BY id", (top,)
+                ).fetchall()
+        else:
+            top = current
+        deleted = [r[0] for r in conn.execute(
+            "SELECT id FROM afiliados_tombstones WHERE _seq > ? AND _seq <= ?", (seq, top)
+        )]
+        return [json.loads(r[0]) for r in rows], deleted, top
+
+
+    # -----------------------------
+    # Cambios por (actualizado_en, id) / (deleted_at, id) (feed para clientes)
+    # -----------------------------
+    def updated_after(self, ts: str | None, last_id: int | None, limit: int,
+                      select: list[str] | None = None) -> list[dict]:
+        """Filas con (actualizado_en, id) > (ts, last_id) en ese orden; sin
+        last_id, desde el principio. Las filas sin actualizado_en van primero."""
+        if last_id is None:
+            where, args = "", []
+        elif ts is None:
+            where, args = "WHERE (actualizado_en IS NULL AND id > ?) OR actualizado_en IS NOT NULL", [last_id]
+        else:
+            where, args = "WHERE actualizado_en > ? OR (actualizado_en = ? AND id > ?)", [ts, ts, last_id]
+        rows = self._conn().execute(
+            f"SELECT _raw FROM afiliados {where} ORDER BY actualizado_en, id LIMIT ?", args + [limit]
+        ).fetchall()
+        return [self._project(r[0], select) for r in rows]
+
+    def deleted_after(self, ts: str | None, last_id: int | None, limit: int) -> list[dict]:
+        """Bajas con (deleted_at, id) > (ts, last_id); sin marca, todas."""
+        if ts is None:
+            where, args = "", []
+        else:
+            where, args = "WHERE deleted_at > ? OR (deleted_at = ? AND id > ?)", [ts, ts, last_id or 0]
+        rows = self._conn().execute(
+            f"SELECT id, dni, deleted_at FROM afiliados_tombstones {where} ORDER BY deleted_at, id LIMIT ?",
+            args + [limit],
+        ).fetchall()
+        return [{"id": r[0], "dni": r[1], "deleted_at": r[2]} for r in rows]
+
+    def last_deleted(self) -> tuple[str, int] | None:
+        row = self._conn().execute(
+            "SELECT deleted_at, id FROM afiliados_tombstones ORDER BY deleted_at DESC, id DESC LIMIT 1"
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+
+class ReplicaFollower:
+    """Mantiene una estructura en memoria al día con la réplica.
+
+    `apply(rows, deleted_ids, reset)` recibe los cambios en orden; `reset=True`
+    indica que hay que descartar lo anterior (primera carga o réplica recreada).
+    Cada proceso tiene su propio follower; sólo lee el archivo SQLite.
+    """
+
+    def __init__(self, name: str, replica: Replica, apply, interval_s: float = 5.0):
+        self.name = name
+        self.replica = replica
+        self.apply = apply
+        self.interval_s = interval_s
+        self.seq = 0
+        self.ready = False
+        self.last_error: str | None = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._fast_until = 0.0
+        self._thread: threading.Thread | None = None
+        self._thread_pid: int | None = None
+
+    def poll(self) -> int:
+        """Aplica los cambios pendientes; devuelve cuántas filas procesó."""
+        with self._lock:
+            if self.replica.age_s() is None:
+                return 0
+            current = self.replica.seq()
+            reset = self.seq == 0 or current < self.seq
+            if reset:
+                self.seq = 0
+            n = 0
+            while True:
+                rows, deleted, top = self.replica.changes_since(self.seq)
+                if top <= self.seq and not rows:
+                    break
+                self.apply(rows, deleted, reset)
+                reset = False
+                n += len(rows)
+                self.seq = top
+            self.ready = True
+            return n
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)[:240]
+                log.warning("%s: no se pudo refrescar desde la réplica: %s", self.name, self.last_error)
+            fast = time.monotonic() < self._fast_until
+            self._wake.wait(min(1.0, self.interval_s) if fast else self.interval_s)
+            self._wake.clear()
+
+    def wake(self, window_s: float = 0.0):
+        """Refresca ya y, durante `window_s`, cada segundo: lo que espera (p. ej.
+        una importación) puede tardar hasta una sincronización de la réplica."""
+        self._fast_until = max(self._fast_until, time.monotonic() + window_s)
+        self._wake.set()
+
+    def ensure_started(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid:
+            return
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.seq = 0
+        self.ready = False
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-follower", daemon=True)
+        self._thread_pid = pid
+        self._thread.start()
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "seq": self.seq, "last_error": self.last_error}
+
+
+class TableScanFollower:
+    """Como ReplicaFollower, pero sin réplica: recorre la tabla en Supabase.
+
+    Carga completa por keyset sobre id (sólo `columns`) y después, cada
+    `interval_s`, trae lo que cambió desde la última marca (actualizado_en, id).
+    Las bajas no dejan rastro en Supabase: se detectan en la recarga completa
+    (cada REPLICA_FULL_RESYNC_S) comparando con los ids ya vistos, y de esa
+    pasada sólo se aplican las filas que cambiaron. Una misma pasada alimenta a
+    todos los `applies` (un recorrido por proceso, no uno por estructura).
+    """
+
+    def __init__(self, name: str, columns: list[str], applies: list, interval_s: float = 5.0,
+                 full_every_s: float = FULL_RESYNC_S):
+        self.name = name
+        self.select = ",".join(dict.fromkeys(["id", "actualizado_en", *columns]))
+        self.applies = applies
+        self.interval_s = interval_s
+        self.full_every_s = full_every_s
+        self.ready = False
+        self.last_error: str | None = None
+        self._digest: dict[int, int] = {}       # id -> hash de la fila vista
+        self._mark: tuple[str, int] | None = None
+        self._full_at = 0.0
+        self._last_sync_at: float | None = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._thread_pid: int | None = None
+
+    def _fetch(self, params: list[tuple[str, str]]) -> list[dict]:
+        supa_url, table, sess = get_client()
+        if not sess:
+            raise RuntimeError("Supabase no configurado")
+        r = sess.get(f"{supa_url}/rest/v1/{table}", params=[("select", self.select)] + params,
+                     timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+    def _emit(self, rows: list[dict], deleted_ids: list[int], reset: bool):
+        for apply in self.applies:
+            apply(rows, deleted_ids, reset)
+
+    @staticmethod
+    def _hash(row: dict) -> int:
+        return hash(tuple(sorted(row.items())))
+
+    @staticmethod
+    def _advance(mark: tuple[str, int] | None, rows: list[dict]) -> tuple[str, int] | None:
+        marks = [(str(r["actualizado_en"]), r["id"]) for r in rows if r.get("actualizado_en")]
+        return max(marks + ([mark] if mark else [])) if marks else mark
+
+    def _full_scan(self) -> int:
+        changed: list[dict] = []
+        seen: set[int] = set()
+        digest: dict[int, int] = {}
+        last_id = None
+        mark = self._mark
+        while True:
+            params = [("order", "id.asc"), ("limit", str(SYNC_CHUNK))]
+            if last_id is not None:
+                params.append(("id", f"gt.{last_id}"))
+            rows = self._fetch(params)
+            for row in rows:
+                i = row["id"]
+                h = digest[i] = self._hash(row)
+                seen.add(i)
+                if self._digest.get(i) != h:
+                    changed.append(row)
+            mark = self._advance(mark, rows)
+            if len(rows) < SYNC_CHUNK:
+                break
+            last_id = rows[-1]["id"]
+        # Todo en un solo apply: los índices ordenados se rearman una vez, no por bloque
+        deleted = [i for i in self._digest if i not in seen]
+        self._emit(changed, deleted, not self.ready)
+        self._digest = digest
+        self._mark = mark
+        self._full_at = self._last_sync_at = time.time()
+        if changed or deleted:
+            log.info("%s: recorrido completo, %s filas cambiadas y %s borradas", self.name, len(changed), len(deleted))
+        return len(changed)
+
+    def _incremental(self) -> int:
+        total = 0
+        while self._mark is not None:
+            ts, i = self._mark
+            params = [
+                ("order", "actualizado_en.asc,id.asc"),
+                ("limit", str(SYNC_CHUNK)),
+                ("or", f'(actualizado_en.gt."{ts}",and(actualizado_en.eq."{ts}",id.gt.{i}))'),
+            ]
+            rows = self._fetch(params)
+            if rows:
+                self._emit(rows, [], False)
+                for row in rows:
+                    self._digest[row["id"]] = self._hash(row)
+                self._mark = self._advance(self._mark, rows)
+                total += len(rows)
+            if len(rows) < SYNC_CHUNK:
+                break
+        self._last_sync_at = time.time()
+        return total
+
+    def poll(self) -> int:
+        """Aplica los cambios pendientes; devuelve cuántas filas procesó."""
+        if not get_client()[2]:
+            return 0   # sin Supabase configurado (dev): los endpoints usan su camino sin índice
+        with self._lock:
+            if not self.ready or time.time() - self._full_at > self.full_every_s:
+                n = self._full_scan()
+            else:
+                n = self._incremental()
+            self.ready = True
+            return n
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)[:240]
+                log.warning("%s: no se pudo recorrer Supabase: %s", self.name, self.last_error)
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+
+    def wake(self, window_s: float = 0.0):
+        """Trae los cambios ya, sin esperar `interval_s` (window_s: como ReplicaFollower)."""
+        self._wake.set()
+
+    def ensure_started(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid:
+            return
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-scan", daemon=True)
+        self._thread_pid = pid
+        self._thread.start()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "source": "supabase",
+            "rows": len(self._digest),
+            "watermark": self._mark[0] if self._mark else None,
+            "full_loaded_at": self._full_at or None,
+            "last_sync_at": self._last_sync_at,
+            "last_error": self.last_error,
+        }
@@ -1,22 +1,46 @@
 # backend/routes/afiliados.py — Endpoints REST a Supabase (refinado)
 from __future__ import annotations
 
+import base64
 import datetime as dt
-import os
+import hashlib
+import json
 import re
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Iterable
 
-import requests
 from flask import Blueprint, Response, jsonify, request, stream_with_context, current_app
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from werkzeug.datastructures import MultiDict
+
+from admin_auth import require_admin
+from aggregates import DIMENSIONS, GroupAggregates, parse_dims
+from breaker import CircuitOpenError
+import metrics
+from cache import Coalescer
+from imports import FORMATS as IMPORT_FORMATS, ImportFailed, ImportJob, last_done as last_import_done
+from imports import list_jobs as list_import_jobs
+from json_provider import dumpb
+from lazy import lazy_import
+from ratelimit import cost, per_rows
+from replica import Replica, ReplicaFollower, TableScanFollower
+from search_index import NameIndex, PrefixIndex
+from settings import get_settings
+from shared_cache import get_backend, make_cache
+from supabase_client import fail_fast, get_client, upstream_available
+from supabase_util import bounded_int, content_range_total, parse_total, pg_message, safe_err, upstream_unavailable
+
+# requests (y urllib3) recién se cargan con la primera consulta a Supabase
+requests = lazy_import("requests")
 
 bp = Blueprint("afiliados", __name__, url_prefix="/api/afiliados")
 
 # -----------------------------
 # Config / utilidades
 # -----------------------------
+_cfg = get_settings()
+
 INT_RE = re.compile(r"^\d+$")
 
 FIELDS_ALL = [
@@ -28,7 +52,6 @@ FIELDS_ALL = [
     "creado_en", "actualizado_en", "apellido_nombre",
 ]
 
-DEFAULT_SELECT = os.getenv("DEFAULT_SELECT", "*")
 
 DETAIL_SELECT = ",".join([
     "id", "dni", "numero_socio", "apellido", "nombres", "sexo",
@@ -39,44 +62,404 @@ DETAIL_SELECT = ",".join([
     "creado_en", "actualizado_en",
 ])
 
+# Proyecciones con nombre: fields=preset:<nombre> (combinable: preset:min,email)
+SELECT_PRESETS = {
+    # Lo que muestra la tabla del panel
+    "table": [
+        "id", "dni", "numero_socio", "apellido", "nombres",
+        "empresa", "sector", "lugar_trabajo", "creado_en", "actualizado_en",
+    ],
+    "min": ["id", "dni", "apellido", "nombres"],
+    "detail": DETAIL_SELECT.split(","),
+    "export": list(FIELDS_ALL),
+}
+
+# Sin `fields`, el listado trae sólo las columnas de la tabla ("*" = todas)
+DEFAULT_SELECT = _cfg.default_select
+
 SAFE_SORT_FIELDS = {
     "id", "dni", "numero_socio", "apellido", "nombres", "sexo",
     "empresa", "sector", "lugar_trabajo", "creado_en", "actualizado_en",
 }
 
-MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "10000"))
-HTTP_TIMEOUT  = float(os.getenv("HTTP_TIMEOUT", "30.0"))
+MAX_PAGE_SIZE = _cfg.max_page_size
+HTTP_TIMEOUT  = _cfg.http_timeout
+
+EXPORT_CHUNK_SIZE = _cfg.export_chunk_size
+
+# Feed de cambios (/changes): filas por página
+CHANGES_PAGE_SIZE = _cfg.changes_page_size
+
+# Búsqueda masiva por DNI: dni=in.(...) por bloques, en paralelo
+LOOKUP_MAX_DNIS = _cfg.lookup_max_dnis
+LOOKUP_CHUNK    = _cfg.lookup_chunk
+LOOKUP_WORKERS  = _cfg.lookup_workers
+
+# Caché de detalle por DNI (los padrones cambian poco y se consultan mucho)
+DETAIL_CACHE_SIZE    = _cfg.detail_cache_size
+DETAIL_CACHE_TTL     = _cfg.detail_cache_ttl
+DETAIL_CACHE_NEG_TTL = _cfg.detail_cache_neg_ttl
+
+# Con el circuito de Supabase abierto (ver breaker.py) se sirven entradas vencidas
+# hasta STALE_IF_ERROR_S segundos, marcadas como stale; sin nada guardado, 503
+STALE_IF_ERROR_S = _cfg.stale_if_error_s
+
+# Las cachés de abajo son por proceso o compartidas entre workers según
+# CACHE_BACKEND (ver shared_cache.py)
+# Claves (dni, select): el DNI es el grupo, así DELETE /_cache/<dni> borra sólo ese afiliado
+_detail_cache = make_cache("afiliados_detail", maxsize=DETAIL_CACHE_SIZE, ttl=DETAIL_CACHE_TTL,
+                           stale_ttl=STALE_IF_ERROR_S, group=lambda k: k[0])
+
+# Totales exactos por conjunto de filtros: paginar una búsqueda cuenta una sola vez
+COUNT_CACHE_TTL = _cfg.count_cache_ttl
+COUNT_MODES = {"exact", "planned", "estimated", "none"}
+
+_count_cache = make_cache("afiliados_count", maxsize=512, ttl=COUNT_CACHE_TTL, stale_ttl=STALE_IF_ERROR_S)
+
+# Réplica local (SQLite) sincronizada por actualizado_en; ver replica.py
+READ_MODE = _cfg.read_mode
+REPLICA_SYNC = _cfg.replica_sync
+REPLICA_MAX_STALENESS_S = _cfg.replica_max_staleness_s
+
+_replica = Replica(FIELDS_ALL) if (READ_MODE == "replica" or REPLICA_SYNC) else None
+
+# Índices en memoria: nombres (mode=search), apellidos (autocompletado) y
+# conteos por grupo (/stats). Se alimentan de la réplica. Sin réplica sólo
+# existen con INDEX_SCAN=1: cada worker recorre la tabla por su cuenta (una
+# copia del padrón por worker y un recorrido completo por worker)
+SEARCH_INDEX_ENABLED = _cfg.search_index
+SEARCH_REFRESH_S = _cfg.search_refresh_s
+
+# Autocompletado de apellidos: lista ordenada en memoria (o Supabase + caché si no está lista)
+SUGGEST_MAX = _cfg.suggest_max
+SUGGEST_CACHE_TTL = _cfg.suggest_cache_ttl
+
+# Conteos por grupo: precalculados en memoria, o cacheados desde Supabase
+STATS_CACHE_TTL = _cfg.stats_cache_ttl
+STATS_LIMIT = 500
+
+# Columnas que necesitan los índices (el recorrido sin réplica trae sólo éstas)
+INDEX_SCAN_COLUMNS = ["dni", "apellido", "nombres", *DIMENSIONS, "creado_en"]
+
+_search_index = NameIndex(("apellido", "nombres"))
+_suggest_index = PrefixIndex()
+_aggregates = GroupAggregates()
+
+_index_scan: TableScanFollower | None = None
+if _replica is not None:
+    _search_follower = (
+        ReplicaFollower("search", _replica, _search_index.apply, SEARCH_REFRESH_S) if SEARCH_INDEX_ENABLED else None
+    )
+    _suggest_follower = (
+        ReplicaFollower("suggest", _replica, _suggest_index.apply, SEARCH_REFRESH_S) if SEARCH_INDEX_ENABLED else None
+    )
+    _aggregates_follower = ReplicaFollower("stats", _replica, _aggregates.apply, _cfg.stats_refresh_s)
+elif _cfg.index_scan:
+    _index_scan = TableScanFollower(
+        "index", INDEX_SCAN_COLUMNS,
+        [_aggregates.apply] + ([_search_index.apply, _suggest_index.apply] if SEARCH_INDEX_ENABLED else []),
+        SEARCH_REFRESH_S,
+    )
+    _search_follower = _suggest_follower = _index_scan if SEARCH_INDEX_ENABLED else None
+    _aggregates_follower = _index_scan
+else:
+    _search_follower = _suggest_follower = _aggregates_follower = None
+
+_suggest_cache = make_cache("afiliados_suggest", maxsize=2000, ttl=SUGGEST_CACHE_TTL, stale_ttl=STALE_IF_ERROR_S)
+_stats_cache = make_cache("afiliados_stats", maxsize=256, ttl=STATS_CACHE_TTL, stale_ttl=STALE_IF_ERROR_S)
+
+# Columnas reales de la tabla (/schema/live)
+_schema_cache = make_cache("afiliados_schema", maxsize=4, ttl=_cfg.schema_cache_ttl, stale_ttl=STALE_IF_ERROR_S)
+
+# Páginas de al menos N filas sin cursor: el JSON de Supabase se copia tal cual
+# dentro de la respuesta (sin decodificar ni re-serializar). 0 = desactivado
+JSON_PASSTHROUGH_MIN_ROWS = _cfg.json_passthrough_min_rows
+
+# Caché HTTP por ruta (ETag + 304). "no-cache" = el navegador revalida siempre
+HTTP_DETAIL_MAX_AGE = _cfg.http_detail_max_age
+HTTP_CACHE_POLICY = {
+    "list":   "private, no-cache",
+    "detail": f"private, max-age={HTTP_DETAIL_MAX_AGE}",
+    "count":  "private, no-cache",
+    "stats":  "private, max-age=60",
+    "schema": "public, max-age=3600",
+    "changes": "private, no-cache",
+}
+# Campos que cambian entre respuestas sin que cambien los datos (tiempos, si el
+# total salió de la caché): no entran en el ETag
+_ETAG_VOLATILE = ("duration_ms", "replica_age_s", "count")
+
+# Consultas idénticas en vuelo (mismo URL + params + headers) salen una sola vez;
+# UPSTREAM_MICROCACHE_MS > 0 además reutiliza la respuesta durante ese lapso
+UPSTREAM_MICROCACHE_MS = _cfg.upstream_microcache_ms
+
+_upstream = Coalescer("supabase_get", micro_ttl=UPSTREAM_MICROCACHE_MS / 1000.0)
+
+# Importación masiva (ver imports.py): columnas que se aceptan y sinónimos
+# habituales en las planillas del padrón
+IMPORT_COLUMNS = [c for c in FIELDS_ALL if c not in ("id", "creado_en", "actualizado_en", "apellido_nombre")]
+IMPORT_DATE_FIELDS = ("fecha_nacimiento", "fecha_primer_ingreso")
+IMPORT_ALIASES = {
+    "documento": "dni", "nro_documento": "dni", "nro_doc": "dni",
+    "socio": "numero_socio", "nro_socio": "numero_socio", "n°_socio": "numero_socio",
+    "mail": "email", "correo": "email", "telefono": "celular", "teléfono": "celular",
+    "lugar": "lugar_trabajo", "funcion": "denominacion_funcion", "posicion": "denominacion_posicion",
+}
+IMPORT_RETRIES = _cfg.import_retries
+IMPORT_MAX_ERRORS_SHOWN = 10_000
 
 # En dev, si no hay Supabase, devolvemos 200 "vacío" en vez de 500
-ALLOW_DEV_NO_SUPA = os.getenv("ALLOW_DEV_NO_SUPA", "1") not in {"0", "false", "False"}
+ALLOW_DEV_NO_SUPA = _cfg.allow_dev_no_supa
 
 
 def _get_session():
-    url   = (os.getenv("SUPABASE_URL") or "").rstrip("/")
-    s_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    table = os.getenv("SUPABASE_TABLE", "afiliados_personal")
-    if not url or not s_key:
-        return None, None, None
-
-    sess = requests.Session()
-    retry = Retry(
-        total=3,
-        backoff_factor=0.3,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=frozenset(["GET"]),
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry, pool_connections=10, pool_maxsize=20)
-    sess.mount("http://", adapter)
-    sess.mount("https://", adapter)
+    # Sesión compartida por el proceso (pool keep-alive); ver supabase_client.py
+    return get_client()
+
+
+class _SupaAuthError(Exception):
+    pass
+
+
+class _Upstream:
+    """Respuesta de PostgREST ya decodificada; se comparte entre requests coalescidos."""
+
+    __slots__ = ("status_code", "reason", "url", "content_range", "data")
+
+    def __init__(self, status_code: int, reason: str, url: str, content_range: str | None, data):
+        self.status_code = status_code
+        self.reason = reason
+        self.url = url
+        self.content_range = content_range
+        self.data = data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} {self.reason} for url: {self.url}")
+
+
+def _upstream_get(sess, url: str, params: list[tuple[str, str]], headers: dict | None = None,
+                  raw: bool = False) -> _Upstream:
+    """GET a Supabase con single-flight por (url, params, headers). El resultado
+    (incluida una excepción de red) se reparte entre los requests idénticos en
+    vuelo; los `data` devueltos no se deben mutar. Con raw=True `data` es el
+    cuerpo sin decodificar (bytes)."""
+    headers = {k: v for k, v in (headers or {}).items() if v is not None}
+    key = (url, tuple(params), tuple(sorted(headers.items())), raw)
+
+    def _call() -> _Upstream:
+        r = sess.get(url, params=params, headers=headers or None, timeout=HTTP_TIMEOUT)
+        with metrics.phase("decode"):
+            data = (r.content if raw else r.json()) if r.ok else None
+        return _Upstream(r.status_code, r.reason, r.url, r.headers.get("content-range"), data)
+
+    t0 = time.perf_counter()
+    res, origin = _upstream.do(key, _call, cacheable=lambda u: u.status_code < 400)
+    if origin == "shared":
+        metrics.record_wait(time.perf_counter() - t0)
+    return res
+
+
+@bp.before_app_request
+def _ensure_replica_sync():
+    if _replica is not None and REPLICA_SYNC:
+        _replica.start_sync()
+    if _search_follower is not None:
+        _search_follower.ensure_started()
+    if _suggest_follower is not None:
+        _suggest_follower.ensure_started()
+    if _aggregates_follower is not None:
+        _aggregates_follower.ensure_started()
+    _check_import_done()
+
+
+def _replica_age() -> float | None:
+    """Antigüedad de la réplica si se puede leer de ella; None = ir a Supabase."""
+    if _replica is None or READ_MODE != "replica":
+        return None
+    age = _replica.age_s()
+    if age is None or age > REPLICA_MAX_STALENESS_S:
+        return None
+    return age
+
+
+def _stale_replica_age() -> float | None:
+    """Con el circuito abierto, la réplica sirve aunque esté vieja (o en modo supabase)."""
+    if _replica is None or upstream_available():
+        return None
+    return _replica.age_s()
+
+
+def _replica_meta(age: float) -> dict:
+    return {"source": "replica", "replica_age_s": age}
+
+
+def _rows_by_id(ids: list[int], select_param: str) -> dict[int, dict]:
+    """Filas de los ids pedidos: de la réplica si hay, si no de Supabase (id=in.(...))."""
+    cols = None if select_param == "*" else select_param.split(",")
+    if _replica is not None:
+        return _replica.get_many(ids, cols)
+    supa_url, table, sess = _get_session()
+    if not ids or not sess:
+        return {}
+    select = "*" if cols is None else ",".join(dict.fromkeys(["id", *cols]))
+    r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}",
+                      [("select", select), ("id", f"in.({','.join(str(i) for i in ids)})")])
+    r.raise_for_status()
+    # r.data se comparte entre requests coalescidos: se arman dicts nuevos
+    return {row["id"]: ({c: row.get(c) for c in cols} if cols else row) for row in r.data}
+
+
+def replica_status() -> dict | None:
+    if _replica is None and _index_scan is None:
+        return None
+    out: dict = {"read_mode": READ_MODE}
+    if _replica is not None:
+        out.update(max_staleness_s=REPLICA_MAX_STALENESS_S, **_replica.status())
+    else:
+        out["index_scan"] = _index_scan.status()
+    if _search_follower is not None:
+        out["search_index"] = {**_search_follower.status(), **_search_index.stats()}
+    if _suggest_follower is not None:
+        out["suggest_index"] = {**_suggest_follower.status(), "entries": len(_suggest_index)}
+    if _aggregates_follower is not None:
+        out["aggregates"] = {**_aggregates_follower.status(), "rows": len(_aggregates)}
+    return out
+
+
+# -----------------------------
+# Supabase caído: 503 inmediato o respuesta stale
+# -----------------------------
+bp.register_error_handler(CircuitOpenError, upstream_unavailable)
+
+
+def _mark_stale(resp: Response) -> Response:
+    """Respuesta armada con datos vencidos: que nadie la guarde como fresca."""
+    resp.headers["X-Cache"] = "STALE"
+    resp.headers["Warning"] = '110 - "Response is Stale"'
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def _load_or_stale(cache, key, loader, ttl_for=None) -> tuple:
+    """get_or_load que, con el circuito abierto, devuelve la entrada vencida si
+    la hay. Devuelve (valor, "HIT" | "MISS" | "STALE")."""
+    try:
+        value, hit = cache.get_or_load(key, loader, ttl_for=ttl_for)
+    except CircuitOpenError:
+        found, value = cache.get_stale(key)
+        if not found:
+            raise
+        return value, "STALE"
+    return value, "HIT" if hit else "MISS"
 
-    sess.headers.update({
-        "Authorization": f"Bearer {s_key}",
-        "apikey": s_key,
-        "Content-Type": "application/json",
-        "Prefer": "count=exact",
-    })
-    return url, table, sess
+
+# -----------------------------
+# Caché HTTP: ETag / Last-Modified / 304
+# -----------------------------
+def _payload_etag(payload: dict, raw: bytes = b"") -> str:
+    stable = {k: v for k, v in payload.items() if k not in _ETAG_VOLATILE}
+    return hashlib.sha1(raw + dumpb(current_app, stable)).hexdigest()
+
+
+def _version_etag(prefix: str, version) -> str:
+    """ETag que depende sólo de la versión de los datos y de los parámetros del
+    request: permite contestar 304 sin consultar nada."""
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    digest = hashlib.sha1(f"{request.path}?{args}".encode("utf-8")).hexdigest()[:16]
+    return f"{prefix}{version}-{digest}"
+
+
+def _not_modified(etag: str, policy: str) -> Response | None:
+    if not request.if_none_match.contains(etag):
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = HTTP_CACHE_POLICY[policy]
+    return resp
+
+
+def _http_date(iso: str | None) -> dt.datetime | None:
+    if not iso:
+        return None
+    try:
+        ts = dt.datetime.fromisoformat(str(iso).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+
+
+def _cached_json(payload: dict, policy: str, etag: str | None = None,
+                 last_modified: dt.datetime | None = None) -> Response:
+    """jsonify + ETag (del contenido si no se pasa uno) + Cache-Control de la
+    ruta; devuelve 304 si el cliente ya tiene esta versión."""
+    with metrics.phase("serialize"):
+        resp = jsonify(payload)
+    with metrics.phase("etag"):
+        resp.set_etag(etag or _payload_etag(payload))
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.headers["Cache-Control"] = HTTP_CACHE_POLICY[policy]
+    return resp.make_conditional(request)
+
+
+def _spliced_json(raw_data: bytes, envelope: dict, policy: str) -> Response:
+    """Como _cached_json, pero `data` es un array JSON ya serializado (el cuerpo
+    de PostgREST) que se inserta sin decodificar."""
+    with metrics.phase("serialize"):
+        head = dumpb(current_app, envelope)
+        body = b'{"data":' + raw_data + (b"," + head[1:] if len(head) > 2 else b"}")
+        resp = current_app.response_class(body, mimetype="application/json")
+    with metrics.phase("etag"):
+        resp.set_etag(_payload_etag(envelope, raw_data))
+    resp.headers["Cache-Control"] = HTTP_CACHE_POLICY[policy]
+    return resp.make_conditional(request)
+
+
+_WS = b" \t\r\n"
+
+
+def _last_object_start(raw: bytes, end: int) -> int:
+    """Posición del '{' que abre el objeto que cierra en raw[end] (recorriendo
+    hacia atrás; las comillas escapadas se reconocen por la cantidad de '\\')."""
+    depth = 0
+    in_str = False
+    i = end
+    while i >= 0:
+        c = raw[i]
+        if c == 0x22:   # '"'
+            bs = 0
+            j = i - 1
+            while j >= 0 and raw[j] == 0x5C:
+                bs += 1
+                j -= 1
+            if bs % 2 == 0:
+                in_str = not in_str
+        elif not in_str:
+            if c == 0x7D:   # '}'
+                depth += 1
+            elif c == 0x7B:   # '{'
+                depth -= 1
+                if depth == 0:
+                    return i
+        i -= 1
+    raise ValueError("array JSON inválido")
+
+
+def _edge_rows(raw: bytes) -> tuple[dict, dict] | None:
+    """Primera y última fila de un array JSON de objetos, sin decodificar el resto."""
+    start = len(raw) - len(raw.lstrip(_WS))
+    end = len(raw.rstrip(_WS)) - 1
+    if end - start < 2 or raw[start] != 0x5B or raw[end] != 0x5D:   # '[' ... ']'
+        return None
+    try:
+        text_start = raw.index(b"{", start)
+        first, _ = json.JSONDecoder().raw_decode(raw[text_start:].decode("utf-8"))
+        close = len(raw[:end].rstrip(_WS)) - 1
+        last = json.loads(raw[_last_object_start(raw, close):close + 1])
+    except ValueError:
+        return None
+    return first, last
 
 
 def _clean_dni(s: str | None) -> str | None:
@@ -95,19 +478,22 @@ def _sanitize_like(q: str | None) -> str | None:
     return q[:100] or None
 
 
-def _parse_total(h: str | None) -> int:
-    if not h or "/" not in h:
+def _range_rows(h: str | None) -> int:
+    """Filas devueltas según Content-Range ("0-49/*" -> 50, "*/0" -> 0)."""
+    span = (h or "").split("/")[0]
+    if "-" not in span:
         return 0
     try:
-        return int(h.split("/")[-1])
-    except Exception:
+        start, end = span.split("-", 1)
+        return int(end) - int(start) + 1
+    except ValueError:
         return 0
 
 
 def _parse_date(s: str | None) -> str | None:
     if not s:
         return None
-    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"):
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y"):
         try:
             return dt.datetime.strptime(s, fmt).isoformat()
         except ValueError:
@@ -125,56 +511,252 @@ def _parse_date_range_end(s: str | None) -> str | None:
         return _parse_date(s)
 
 
+def _expand_fields(raw: str) -> list[str]:
+    """Columnas válidas de una lista tipo "preset:min,email", sin repetir."""
+    cols: list[str] = []
+    for c in (c.strip() for c in raw.split(",")):
+        if c.startswith("preset:"):
+            cols.extend(SELECT_PRESETS.get(c[len("preset:"):], ()))
+        elif c in FIELDS_ALL:
+            cols.append(c)
+    return list(dict.fromkeys(cols))
+
+
 def _resolve_select_param(raw: str | None, fallback: str) -> str:
+    fallback = fallback.strip()
+    if fallback != "*":
+        fallback = ",".join(_expand_fields(fallback)) or "*"
     if not raw:
         return fallback
     raw = raw.strip()
     if raw == "*":
         return "*"
-    cols = [c.strip() for c in raw.split(",") if c.strip()]
-    cols = [c for c in cols if c in FIELDS_ALL]
+    cols = _expand_fields(raw)
     return ",".join(cols) if cols else fallback
 
 
-def _bounded_int(value: str | None, default: int, min_v: int, max_v: int) -> int:
-    try:
-        v = int(value) if value is not None else default
-    except Exception:
-        return default
-    return max(min_v, min(v, max_v))
-
-
-def _safe_err(e: Exception) -> str:
-    s = str(e)
-    return (s[:240] + "...") if len(s) > 240 else s
-
-
 def _csv_stream(rows: Iterable[dict], columns: list[str]):
     yield ",".join(columns) + "\r\n"
     for row in rows:
         line = []
         for c in columns:
-            v = row.get(c, "")
-            s = str(v).replace('"', '""')
+            v = row.get(c)
+            s = "" if v is None else str(v).replace('"', '""')
             if any(ch in s for ch in [',', '\n', '\r', '"']):
                 s = f'"{s}"'
             line.append(s)
         yield ",".join(line) + "\r\n"
 
 
-def _csv_response_stream(rows: Iterable[dict], columns: list[str], filename: str) -> Response:
-    gen = stream_with_context(_csv_stream(rows, columns))
+def _ndjson_stream(rows: Iterable[dict], columns: list[str] | None = None):
+    for row in rows:
+        if columns:
+            row = {c: row.get(c) for c in columns}
+        yield json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+
+def _buffered(chunks: Iterable[str], size: int = 64 * 1024):
+    """Agrupa muchos fragmentos chicos en escrituras de ~`size` bytes."""
+    buf: list[str] = []
+    n = 0
+    for c in chunks:
+        buf.append(c)
+        n += len(c)
+        if n >= size:
+            yield "".join(buf).encode("utf-8")
+            buf, n = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def _gzip_stream(chunks: Iterable[bytes]):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for c in chunks:
+        out = z.compress(c)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def _csv_response_stream(rows: Iterable[dict], columns: list[str], filename: str, gzip: bool = False) -> Response:
+    return _stream_response(_csv_stream(rows, columns), "text/csv", filename, gzip)
+
+
+def _stream_response(chunks: Iterable[str], mimetype: str, filename: str, gzip: bool = False) -> Response:
+    body = _buffered(chunks)
+    if gzip:
+        body = _gzip_stream(body)
+        mimetype = "application/gzip"
+        filename += ".gz"
     return Response(
-        gen,
-        mimetype="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
     )
 
+# -----------------------------
+# Filtros comunes (list / export)
+# -----------------------------
+def _list_filters(args) -> dict:
+    """Normaliza los filtros del listado a partir de request.args."""
+    return {
+        "q":            _sanitize_like(args.get("q")),
+        "dni":          _clean_dni(args.get("dni")),
+        "empresa":      _sanitize_like(args.get("empresa")),
+        "sector":       _sanitize_like(args.get("sector")),
+        "lugar":        _sanitize_like(args.get("lugar_trabajo")),
+        "created_from": _parse_date(args.get("created_from")),
+        "created_to":   _parse_date_range_end(args.get("created_to")),
+        "updated_from": _parse_date(args.get("updated_from")),
+        "updated_to":   _parse_date_range_end(args.get("updated_to")),
+    }
+
+
+def _filter_params(f: dict) -> list[tuple[str, str]]:
+    params: list[tuple[str, str]] = []
+    if f.get("dni"):
+        params.append(("dni", f"eq.{f['dni']}"))
+    if f.get("q"):
+        q = f["q"]
+        params.append(("or", f"(apellido.ilike.*{q}*,nombres.ilike.*{q}*,apellido_nombre.ilike.*{q}*)"))
+    if f.get("empresa"):
+        params.append(("empresa", f"ilike.*{f['empresa']}*"))
+    if f.get("sector"):
+        params.append(("sector", f"ilike.*{f['sector']}*"))
+    if f.get("lugar"):
+        params.append(("lugar_trabajo", f"ilike.*{f['lugar']}*"))
+    if f.get("created_from"):
+        params.append(("creado_en", f"gte.{f['created_from']}"))
+    if f.get("created_to"):
+        params.append(("creado_en", f"lt.{f['created_to']}"))
+    if f.get("updated_from"):
+        params.append(("actualizado_en", f"gte.{f['updated_from']}"))
+    if f.get("updated_to"):
+        params.append(("actualizado_en", f"lt.{f['updated_to']}"))
+    return params
+
+
+def _filters_key(f: dict) -> tuple:
+    return tuple(sorted((k, v) for k, v in f.items() if v))
+
+
+def _count_mode(raw: str | None) -> str | None:
+    """None = default (total exacto cacheado por filtros)."""
+    mode = (raw or "").strip().lower()
+    return mode if mode in COUNT_MODES else None
+
+
+# -----------------------------
+# Paginación por cursor (keyset)
+#
+# Orden total: (sort, id), con NULL como el valor más grande (default de
+# Postgres: asc -> nulls last, desc -> nulls first). El cursor guarda el último
+# par visto y el filtro pide "lo que sigue" sin OFFSET.
+# -----------------------------
+def _order_param(sort: str, order: str) -> str:
+    nulls = "nullslast" if order == "asc" else "nullsfirst"
+    if sort == "id":
+        return f"id.{order}"
+    return f"{sort}.{order}.{nulls},id.{order}"
+
+
+def _encode_cursor(sort: str, order: str, row: dict, direction: str, page_size: int) -> str | None:
+    if "id" not in row or sort not in row:
+        return None
+    payload = {"s": sort, "o": order, "v": row.get(sort), "i": row.get("id"), "d": direction, "n": page_size}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(raw: str) -> dict:
+    try:
+        pad = "=" * (-len(raw) % 4)
+        c = json.loads(base64.urlsafe_b64decode(raw + pad))
+        if c["s"] not in SAFE_SORT_FIELDS or c["o"] not in ("asc", "desc") or c["d"] not in ("next", "prev"):
+            raise ValueError("cursor")
+        if c["i"] is None:
+            raise ValueError("cursor")
+        if c.get("n") is not None and not isinstance(c["n"], int):
+            raise ValueError("cursor")
+        return c
+    except Exception as e:
+        raise ValueError("cursor_invalido") from e
+
+
+def _pg_quote(v) -> str:
+    s = str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{s}"'
+
+
+def _keyset_params(sort: str, order: str, value, last_id, direction: str) -> tuple[str, list[tuple[str, str]]]:
+    """Devuelve (order, filtros) para leer la página siguiente/anterior al par (value, last_id)."""
+    # "after" = posteriores en sentido ascendente
+    after = (order == "asc") == (direction == "next")
+    scan_order = "asc" if after else "desc"
+    i = _pg_quote(last_id)
+
+    if sort == "id":
+        return f"id.{scan_order}", [("id", f"{'gt' if after else 'lt'}.{last_id}")]
+
+    if value is None:
+        if after:
+            cond = f"(and({sort}.is.null,id.gt.{i}))"
+        else:
+            cond = f"({sort}.not.is.null,and({sort}.is.null,id.lt.{i}))"
+    else:
+        v = _pg_quote(value)
+        if after:
+            cond = f"({sort}.gt.{v},and({sort}.eq.{v},id.gt.{i}),{sort}.is.null)"
+        else:
+            cond = f"({sort}.lt.{v},and({sort}.eq.{v},id.lt.{i}))"
+    return _order_param(sort, scan_order), [("or", cond)]
+
+
+def _with_keyset_columns(select_param: str, sort: str) -> str:
+    if select_param == "*":
+        return select_param
+    cols = select_param.split(",")
+    for c in ("id", sort):
+        if c not in cols:
+            cols.append(c)
+    return ",".join(cols)
+
+
+def _keyset_extra(select_param: str, sort: str) -> tuple[str, ...]:
+    """Columnas que _with_keyset_columns agrega y que la respuesta no pidió."""
+    if select_param == "*":
+        return ()
+    cols = select_param.split(",")
+    return tuple(c for c in dict.fromkeys(("id", sort)) if c not in cols)
+
+
 # -----------------------------
 # GET /api/afiliados/
+#   Paginación por página (page/page_size) o por cursor (cursor=<opaco>)
 # -----------------------------
+def _list_cost() -> float:
+    """Como per_rows("page_size", 50, 500), pero con cursor el tamaño por defecto es el del cursor."""
+    default = 50
+    raw_cursor = request.args.get("cursor")
+    if raw_cursor:
+        try:
+            default = _decode_cursor(raw_cursor).get("n") or default
+        except ValueError:
+            pass
+    return per_rows("page_size", default, 500)()
+
+
 @bp.get("/")
+@cost(_list_cost)
 def list_afiliados():
+    return _list_afiliados(request.args)
+
+
+def _list_afiliados(args):
     supa_url, table, sess = _get_session()
     if not sess:
         if ALLOW_DEV_NO_SUPA:
@@ -183,8 +765,11 @@ def list_afiliados():
                 "page": 1,
                 "page_size": 0,
                 "total": 0,
+                "count": {"mode": "exact", "cached": False},
                 "has_next": False,
                 "has_prev": False,
+                "next_cursor": None,
+                "prev_cursor": None,
                 "sort": {"field": "apellido", "order": "asc"},
                 "duration_ms": 0,
             }), 200
@@ -192,78 +777,388 @@ def list_afiliados():
 
     t0 = time.perf_counter()
 
-    # Filtros
-    q       = _sanitize_like(request.args.get("q"))
-    dni     = _clean_dni(request.args.get("dni"))
-    empresa = _sanitize_like(request.args.get("empresa"))
-    sector  = _sanitize_like(request.args.get("sector"))
-    lugar   = _sanitize_like(request.args.get("lugar_trabajo"))
-
-    # Rangos de fecha
-    created_from = _parse_date(request.args.get("created_from"))
-    created_to   = _parse_date_range_end(request.args.get("created_to"))
-    updated_from = _parse_date(request.args.get("updated_from"))
-    updated_to   = _parse_date_range_end(request.args.get("updated_to"))
-
-    # Paginación
-    page      = _bounded_int(request.args.get("page"), default=1, min_v=1, max_v=1_000_000)
-    page_size = _bounded_int(request.args.get("page_size"), default=50, min_v=1, max_v=MAX_PAGE_SIZE)
+    filters = _list_filters(args)
+
+    cursor = None
+    raw_cursor = args.get("cursor")
+    if raw_cursor:
+        try:
+            cursor = _decode_cursor(raw_cursor)
+        except ValueError:
+            return jsonify({"error": "cursor_invalido", "detail": "Cursor inválido o corrupto"}), 400
+
+    # Paginación (con cursor, page_size sale del cursor salvo que venga explícito)
+    page      = bounded_int(args.get("page"), default=1, min_v=1, max_v=1_000_000)
+    page_size = bounded_int(args.get("page_size"), default=(cursor or {}).get("n") or 50,
+                            min_v=1, max_v=MAX_PAGE_SIZE)
     offset    = (page - 1) * page_size
 
-    # Orden
-    sort = (request.args.get("sort") or "apellido").strip()
+    # Orden (en modo cursor lo fija el propio cursor)
+    if cursor:
+        sort, order = cursor["s"], cursor["o"]
+    else:
+        sort = (args.get("sort") or "apellido").strip()
+        if sort not in SAFE_SORT_FIELDS:
+            sort = "apellido"
+        order = "desc" if (args.get("order", "asc").lower().startswith("d")) else "asc"
+
+    select_param = _resolve_select_param(args.get("fields"), DEFAULT_SELECT)
+    # id y el campo de orden hacen falta para los cursores; si fields no los
+    # incluye se piden igual y se sacan de la respuesta
+    keyset_select = _with_keyset_columns(select_param, sort)
+    extra_cols = _keyset_extra(select_param, sort)
+
+    # mode=search: ranking por similitud desde el índice en memoria
+    search_mode = (args.get("mode") or "").strip().lower() == "search"
+    raw_q = (args.get("q") or "").strip()
+    if search_mode and raw_q and _search_follower is not None and _search_follower.ready:
+        ranked, total = _search_index.search(raw_q, limit=page_size + 1, offset=offset)
+        try:
+            rows = _rows_by_id([i for i, _ in ranked[:page_size]], select_param)
+        except requests.exceptions.RequestException as e:
+            return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+        data = [rows[i] for i, _ in ranked[:page_size] if i in rows]
+        ms = int((time.perf_counter() - t0) * 1000)
+        return _cached_json({
+            "data": data,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "has_next": len(ranked) > page_size,
+            "has_prev": page > 1,
+            "next_cursor": None,
+            "prev_cursor": None,
+            "sort": {"field": "score", "order": "desc"},
+            "scores": [sc for _, sc in ranked[:page_size]],
+            "search": {"engine": "index", "docs": len(_search_index)},
+            "duration_ms": ms,
+            **(_replica_meta(_replica.age_s() or 0.0) if _replica is not None else {"source": "supabase"}),
+        }, "list")
+
+    count_mode = _count_mode(args.get("count"))
+    count_cached = False
+    source: dict = {"search": {"engine": "ilike"}} if search_mode else {}
+
+    etag = None
+    stale = False
+    replica_age = _replica_age()
+    if replica_age is None:
+        replica_age = _stale_replica_age()
+        stale = replica_age is not None
+    if replica_age is not None:
+        # Misma versión de la réplica + mismos parámetros = misma respuesta
+        etag = _version_etag("r", _replica.seq())
+        unchanged = _not_modified(etag, "list")
+        if unchanged is not None:
+            return unchanged
+        # Réplica local al día: ni red ni COUNT(*) remoto
+        cols = None if select_param == "*" else keyset_select.split(",")
+        keyset = (cursor["v"], cursor["i"], cursor["d"]) if cursor else None
+        data = _replica.query_list(filters, sort, order, page_size + 1, offset, keyset=keyset, select=cols)
+        total = _replica.count(filters) if count_mode != "none" else None
+        source.update(_replica_meta(replica_age))
+        if stale:
+            source["stale"] = True
+    else:
+        # Conteo: default = exacto cacheado; exact = exacto fresco; planned/estimated
+        # = estimación de Postgres; none = sin total. Con cursor el filtro keyset
+        # cambiaría el conteo, así que sólo se usa el total ya cacheado.
+        fkey = _filters_key(filters)
+        total = None
+        if count_mode is None or cursor:
+            count_cached, total = _count_cache.get(fkey)
+        prefer = None
+        if not cursor:
+            if count_mode is None and not count_cached:
+                prefer = "count=exact"
+            elif count_mode in ("exact", "planned", "estimated"):
+                prefer = f"count={count_mode}"
+
+        # Páginas grandes por offset: el total (exacto, estimado o cacheado) dice si
+        # hay página siguiente, así que las filas no hace falta decodificarlas (salvo
+        # la primera y la última, para los cursores). Si hubo que agregar columnas
+        # para el cursor, no: habría que sacarlas de cada fila
+        if not cursor and not extra_cols and count_mode != "none" and 0 < JSON_PASSTHROUGH_MIN_ROWS <= page_size:
+            params = [
+                ("select", select_param),
+                ("order", _order_param(sort, order)),
+                ("limit", str(page_size)),
+                ("offset", str(offset)),
+            ] + _filter_params(filters)
+            try:
+                r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params, {"Prefer": prefer}, raw=True)
+                if r.status_code in (401, 403):
+                    return jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400
+                r.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+            if prefer:
+                total = parse_total(r.content_range)
+                if prefer == "count=exact":
+                    _count_cache.set(fkey, total)
+            returned = _range_rows(r.content_range)
+            has_next = total is not None and offset + returned < total
+            # Los cursores salen de la primera y la última fila: sólo se decodifican esas dos
+            edges = _edge_rows(r.data) if returned else None
+            next_cursor = _encode_cursor(sort, order, edges[1], "next", page_size) if (edges and has_next) else None
+            prev_cursor = _encode_cursor(sort, order, edges[0], "prev", page_size) if (edges and page > 1) else None
+            ms = int((time.perf_counter() - t0) * 1000)
+            return _spliced_json(r.data, {
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+                "count": {"mode": count_mode or "exact", "cached": count_cached},
+                "has_next": has_next,
+                "has_prev": page > 1,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "sort": {"field": sort, "order": order},
+                "passthrough": True,
+                "duration_ms": ms,
+                **source,
+            }, "list")
+
+        # Se pide una fila de más para saber si hay página siguiente sin depender del total
+        if cursor:
+            order_param, keyset = _keyset_params(sort, order, cursor["v"], cursor["i"], cursor["d"])
+            params: list[tuple[str, str]] = [
+                ("select", keyset_select),
+                ("order", order_param),
+                ("limit", str(page_size + 1)),
+            ] + keyset
+        else:
+            params = [
+                ("select", keyset_select),
+                ("order", _order_param(sort, order)),
+                ("limit", str(page_size + 1)),
+                ("offset", str(offset)),
+            ]
+        params += _filter_params(filters)
+
+        try:
+            r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params, {"Prefer": prefer})
+            if r.status_code in (401, 403):
+                return jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400
+            r.raise_for_status()
+            data = r.data
+            if prefer:
+                total = parse_total(r.content_range)
+                if prefer == "count=exact":
+                    _count_cache.set(fkey, total)
+        except requests.exceptions.RequestException as e:
+            return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+
+    more = len(data) > page_size
+    data = data[:page_size]
+    if cursor and cursor["d"] == "prev":
+        data.reverse()
+        has_next, has_prev = True, more
+    elif cursor:
+        has_next, has_prev = more, True
+    else:
+        has_next, has_prev = more, page > 1
+
+    next_cursor = _encode_cursor(sort, order, data[-1], "next", page_size) if (data and has_next) else None
+    prev_cursor = _encode_cursor(sort, order, data[0], "prev", page_size) if (data and has_prev) else None
+    if extra_cols:
+        data = [{k: v for k, v in row.items() if k not in extra_cols} for row in data]
+
+    ms = int((time.perf_counter() - t0) * 1000)
+    resp = _cached_json({
+        "data": data,
+        "page": page if not cursor else None,
+        "page_size": page_size,
+        "total": total,
+        "count": {"mode": count_mode or "exact", "cached": count_cached},
+        "has_next": has_next,
+        "has_prev": has_prev,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "sort": {"field": sort, "order": order},
+        "duration_ms": ms,
+        **source,
+    }, "list", etag=etag)
+    return _mark_stale(resp) if stale else resp
+
+
+# -----------------------------
+# GET /api/afiliados/export?format=csv|ndjson&gzip=1
+#   Mismos filtros que el listado. Lee de Supabase por bloques keyset y
+#   escribe a medida que llegan: la memoria no depende del tamaño del padrón.
+# -----------------------------
+def _iter_keyset_rows(sess, supa_url: str, table: str, select_param: str, sort: str, order: str,
+                      extra: list[tuple[str, str]], chunk: int):
+    last = None
+    while True:
+        if last is None:
+            order_param, keyset = _order_param(sort, order), []
+        else:
+            order_param, keyset = _keyset_params(sort, order, last.get(sort), last["id"], "next")
+        params = [("select", select_param), ("order", order_param), ("limit", str(chunk))] + keyset + extra
+        r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params)
+        r.raise_for_status()
+        rows = r.data
+        yield from rows
+        if len(rows) < chunk:
+            return
+        last = rows[-1]
+
+
+@bp.get("/export")
+@cost(20)
+def export_afiliados():
+    supa_url, table, sess = _get_session()
+    if not sess and not ALLOW_DEV_NO_SUPA:
+        return jsonify({"error": "config_error", "detail": "Faltan SUPABASE_URL/SERVICE_ROLE"}), 500
+
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "formato_invalido", "detail": "format debe ser csv o ndjson"}), 400
+    gzip = (request.args.get("gzip") or "").lower() in {"1", "true", "yes"}
+
+    sort = (request.args.get("sort") or "id").strip()
     if sort not in SAFE_SORT_FIELDS:
-        sort = "apellido"
+        sort = "id"
     order = "desc" if (request.args.get("order", "asc").lower().startswith("d")) else "asc"
 
-    select_param = _resolve_select_param(request.args.get("fields"), DEFAULT_SELECT)
-
-    params: list[tuple[str, str]] = [
-        ("select", select_param),
-        ("order", f"{sort}.{order}"),
-        ("limit", str(page_size)),
-        ("offset", str(offset)),
-    ]
-    if dni:
-        params.append(("dni", f"eq.{dni}"))
-    if q:
-        params.append(("or", f"(apellido.ilike.*{q}*,nombres.ilike.*{q}*,apellido_nombre.ilike.*{q}*)"))
-    if empresa:
-        params.append(("empresa", f"ilike.*{empresa}*"))
-    if sector:
-        params.append(("sector", f"ilike.*{sector}*"))
-    if lugar:
-        params.append(("lugar_trabajo", f"ilike.*{lugar}*"))
-    if created_from:
-        params.append(("creado_en", f"gte.{created_from}"))
-    if created_to:
-        params.append(("creado_en", f"lt.{created_to}"))
-    if updated_from:
-        params.append(("actualizado_en", f"gte.{updated_from}"))
-    if updated_to:
-        params.append(("actualizado_en", f"lt.{updated_to}"))
+    select_param = _resolve_select_param(request.args.get("fields"), "preset:export")
+    columns = FIELDS_ALL if select_param == "*" else select_param.split(",")
+    chunk = bounded_int(request.args.get("chunk_size"), default=EXPORT_CHUNK_SIZE, min_v=100, max_v=MAX_PAGE_SIZE)
+    extra = _filter_params(_list_filters(request.args))
 
-    try:
-        r = sess.get(f"{supa_url}/rest/v1/{table}", params=params, timeout=HTTP_TIMEOUT)
+    if sess:
+        fail_fast()   # mejor un 503 ahora que un archivo vacío con 200
+
+    def _rows():
+        if not sess:
+            return
+        try:
+            yield from _iter_keyset_rows(
+                sess, supa_url, table, _with_keyset_columns(select_param, sort), sort, order, extra, chunk
+            )
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            # Los headers ya salieron: sólo queda cortar el archivo y dejar registro
+            current_app.logger.error("Export afiliados interrumpido: %s", safe_err(e))
+
+    stamp = dt.datetime.now().strftime("%Y%m%d")
+    if fmt == "ndjson":
+        return _stream_response(
+            _ndjson_stream(_rows(), columns), "application/x-ndjson",
+            f"afiliados_{stamp}.ndjson", gzip,
+        )
+    return _csv_response_stream(_rows(), columns, f"afiliados_{stamp}.csv", gzip)
+
+
+# -----------------------------
+# POST /api/afiliados/lookup   {"dnis": [...], "fields": "..."}
+#   Resuelve miles de DNIs con pocas consultas dni=in.(...) en paralelo.
+#   Devuelve un resultado por DNI de entrada, en el mismo orden.
+# -----------------------------
+@bp.post("/lookup")
+@cost(5)
+def lookup_afiliados():
+    supa_url, table, sess = _get_session()
+    if not sess and not ALLOW_DEV_NO_SUPA:
+        return jsonify({"error": "config_error", "detail": "Faltan SUPABASE_URL/SERVICE_ROLE"}), 500
+
+    t0 = time.perf_counter()
+    body = request.get_json(silent=True)
+    raw = body.get("dnis") if isinstance(body, dict) else body
+    if not isinstance(raw, list):
+        return jsonify({"error": "body_invalido", "detail": 'Se espera {"dnis": [...]}'}), 400
+    if len(raw) > LOOKUP_MAX_DNIS:
+        return jsonify({"error": "demasiados_dnis", "detail": f"Máximo {LOOKUP_MAX_DNIS} DNIs por request"}), 400
+
+    fields = body.get("fields") if isinstance(body, dict) else None
+    select_param = _resolve_select_param(fields or request.args.get("fields"), DETAIL_SELECT)
+    if select_param != "*" and "dni" not in select_param.split(","):
+        select_param += ",dni"   # hace falta para mapear cada fila a su DNI
+
+    cleaned = [_clean_dni(str(x)) if x is not None else None for x in raw]
+    unique = list(dict.fromkeys(d for d in cleaned if d))
+
+    # Primero la caché de detalle; sólo lo que falta va a Supabase
+    found: dict[str, dict | None] = {}
+    missing: list[str] = []
+    for d in unique:
+        hit, row = _detail_cache.get((d, select_param))
+        if hit:
+            found[d] = row
+        else:
+            missing.append(d)
+    cached = len(found)
+    stale = 0
+
+    def _fetch(chunk: list[str]) -> list[dict]:
+        params = [("select", select_param), ("dni", f"in.({','.join(chunk)})")]
+        r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params)
         if r.status_code in (401, 403):
-            return jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400
+            raise _SupaAuthError()
         r.raise_for_status()
-        data  = r.json()
-        total = _parse_total(r.headers.get("content-range"))
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "supa_error", "detail": _safe_err(e)}), 400
+        return r.data
 
+    if missing and sess:
+        chunks = [missing[i:i + LOOKUP_CHUNK] for i in range(0, len(missing), LOOKUP_CHUNK)]
+        fresh: list[str] = []   # DNIs de bloques que sí respondieron (encontrados o no)
+        circuit_open: CircuitOpenError | None = None
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(LOOKUP_WORKERS, len(chunks)))) as ex:
+                futures = {ex.submit(_fetch, chunk): chunk for chunk in chunks}
+                for fut in as_completed(futures):
+                    try:
+                        rows = fut.result()
+                    except CircuitOpenError as e:
+                        circuit_open = e
+                        continue
+                    for row in rows:
+                        d = _clean_dni(str(row.get("dni") or ""))
+                        if d and d not in found:
+                            found[d] = row
+                    fresh += futures[fut]
+        except _SupaAuthError:
+            return jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400
+        except requests.exceptions.RequestException as e:
+            return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+
+        for d in fresh:
+            row = found.get(d)
+            _detail_cache.set((d, select_param), row, DETAIL_CACHE_TTL if row is not None else DETAIL_CACHE_NEG_TTL)
+
+        if circuit_open is not None:
+            # Lo que no llegó a consultarse sale de la caché vencida; si falta alguno, 503
+            done = set(fresh)
+            for d in missing:
+                if d in done:
+                    continue
+                hit, row = _detail_cache.get_stale((d, select_param))
+                if not hit:
+                    raise circuit_open
+                found[d] = row
+                stale += 1
+
+    out = []
+    for original, d in zip(raw, cleaned):
+        if not d:
+            out.append({"input": original, "dni": None, "found": False, "data": None, "error": "dni_invalido"})
+            continue
+        row = found.get(d)
+        out.append({"input": original, "dni": d, "found": row is not None, "data": row})
+
+    n_found = sum(1 for d in unique if found.get(d) is not None)
     ms = int((time.perf_counter() - t0) * 1000)
-    return jsonify({
-        "data": data,
-        "page": page,
-        "page_size": page_size,
-        "total": total,
-        "has_next": (offset + page_size) < total,
-        "has_prev": page > 1,
-        "sort": {"field": sort, "order": order},
+    payload = {
+        "data": out,
+        "requested": len(raw),
+        "unique": len(unique),
+        "found": n_found,
+        "not_found": len(unique) - n_found,
+        "cached": cached,
         "duration_ms": ms,
-    }), 200
+    }
+    if stale:
+        payload["stale"] = stale
+        return _mark_stale(jsonify(payload))
+    return jsonify(payload), 200
 
 
 # -----------------------------
@@ -282,20 +1177,50 @@ def get_by_dni(dni: str):
         return jsonify({"error": "dni_invalido", "detail": "El DNI debe contener solo dígitos"}), 400
 
     select_param = _resolve_select_param(request.args.get("fields"), DETAIL_SELECT)
-    params = [("select", select_param), ("dni", f"eq.{d}"), ("limit", "1")]
 
-    try:
-        r = sess.get(f"{supa_url}/rest/v1/{table}", params=params, timeout=HTTP_TIMEOUT)
+    replica_age = _replica_age()
+    if replica_age is not None:
+        row = _replica.get_by_dni(d, None if select_param == "*" else select_param.split(","))
+        return _cached_json({"data": row, "found": row is not None, **_replica_meta(replica_age)}, "detail",
+                            last_modified=_http_date((row or {}).get("actualizado_en")))
+
+    def _load():
+        params = [("select", select_param), ("dni", f"eq.{d}"), ("limit", "1")]
+        r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params)
         if r.status_code in (401, 403):
-            return jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400
+            raise _SupaAuthError()
         r.raise_for_status()
-        rows = r.json()
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "supa_error", "detail": _safe_err(e)}), 400
+        rows = r.data
+        return rows[0] if rows else None
 
-    if not rows:
-        return jsonify({"data": None, "found": False}), 200
-    return jsonify({"data": rows[0], "found": True}), 200
+    try:
+        row, cache_state = _load_or_stale(
+            _detail_cache,
+            (d, select_param),
+            _load,
+            ttl_for=lambda v: DETAIL_CACHE_TTL if v is not None else DETAIL_CACHE_NEG_TTL,
+        )
+    except _SupaAuthError:
+        return jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+    except CircuitOpenError:
+        stale_age = _stale_replica_age()
+        if stale_age is None:
+            raise
+        row = _replica.get_by_dni(d, None if select_param == "*" else select_param.split(","))
+        return _mark_stale(_cached_json(
+            {"data": row, "found": row is not None, **_replica_meta(stale_age), "stale": True}, "detail",
+        ))
+
+    payload = {"data": row, "found": row is not None}
+    if cache_state == "STALE":
+        payload["stale"] = True
+    resp = _cached_json(payload, "detail", last_modified=_http_date((row or {}).get("actualizado_en")))
+    if cache_state == "STALE":
+        return _mark_stale(resp)
+    resp.headers["X-Cache"] = cache_state
+    return resp
 
 
 # --- Alias compatibilidad: /api/afiliados/dni/<dni>
@@ -306,16 +1231,67 @@ def get_by_dni_alias(dni: str):
 
 # --- Alias compatibilidad: /api/afiliados/apellido/<ape>
 @bp.get("/apellido/<ape>")
+@cost(_list_cost)
 def search_by_apellido_alias(ape: str):
-    # Reutiliza list_afiliados con q=<ape>
-    with current_app.test_request_context(f"/api/afiliados/?q={ape}&page=1&page_size=50"):
-        return list_afiliados()
+    # Mismo listado con q=<ape>, sin armar un request falso (test_request_context
+    # tiraba los headers del cliente, y con ellos el ETag/304)
+    return _list_afiliados(MultiDict({"q": ape, "page": "1", "page_size": "50"}))
+
+
+# -----------------------------
+# GET /api/afiliados/suggest?prefix=<texto>&limit=10
+#   Autocompletado de apellidos (con nombres y DNI). Responde desde memoria
+#   y con ETag: el navegador reutiliza prefijos repetidos con un 304.
+# -----------------------------
+@bp.get("/suggest")
+def suggest_afiliados():
+    t0 = time.perf_counter()
+    prefix = (request.args.get("prefix") or "").strip()[:60]
+    limit = bounded_int(request.args.get("limit"), default=10, min_v=1, max_v=SUGGEST_MAX)
+
+    if not prefix:
+        data, engine = [], "none"
+    elif _suggest_follower is not None and _suggest_follower.ready:
+        data, engine = _suggest_index.suggest(prefix, limit), "index"
+    else:
+        supa_url, table, sess = _get_session()
+        like = _sanitize_like(prefix)
+        if not sess or not like:
+            data, engine = [], "none"
+        else:
+            def _load():
+                params = [
+                    ("select", "id,dni,apellido,nombres"),
+                    ("apellido", f"ilike.{like}*"),
+                    ("order", "apellido.asc,nombres.asc"),
+                    ("limit", str(limit)),
+                ]
+                r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params)
+                r.raise_for_status()
+                return r.data
+
+            try:
+                data, cache_state = _load_or_stale(_suggest_cache, (like.lower(), limit), _load)
+            except requests.exceptions.RequestException as e:
+                return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+            engine = "supabase" if cache_state != "STALE" else "supabase-stale"
+
+    body = json.dumps({"prefix": prefix, "data": data}, ensure_ascii=False, separators=(",", ":"))
+    resp = current_app.response_class(body, mimetype="application/json")
+    resp.set_etag(hashlib.sha1(body.encode("utf-8")).hexdigest())
+    resp.headers["Cache-Control"] = f"private, max-age={int(SUGGEST_CACHE_TTL)}"
+    resp.headers["X-Suggest-Engine"] = engine
+    resp.headers["X-Duration-Ms"] = f"{(time.perf_counter() - t0) * 1000:.2f}"
+    if engine == "supabase-stale":
+        _mark_stale(resp)
+    return resp.make_conditional(request)
 
 
 # -----------------------------
 # GET /api/afiliados/count
 # -----------------------------
 @bp.get("/count")
+@cost(2)
 def count_afiliados():
     supa_url, table, sess = _get_session()
     if not sess:
@@ -323,25 +1299,67 @@ def count_afiliados():
             return jsonify({"total": 0}), 200
         return jsonify({"error": "config_error"}), 500
 
+    replica_age = _replica_age()
+    if replica_age is not None:
+        etag = _version_etag("r", _replica.seq())
+        return _not_modified(etag, "count") or _cached_json(
+            {"total": _replica.count({}), "count": {"mode": "exact", "cached": False}, **_replica_meta(replica_age)},
+            "count", etag=etag,
+        )
+
+    # Mismo criterio que el listado: el total sin filtros se comparte con la caché
+    count_mode = _count_mode(request.args.get("count"))
+    if count_mode in (None, "none"):
+        cached, total = _count_cache.get(())
+        if cached:
+            return _cached_json({"total": total, "count": {"mode": "exact", "cached": True}}, "count")
+        count_mode = None
+
     try:
-        r = sess.get(
+        r = _upstream_get(
+            sess,
             f"{supa_url}/rest/v1/{table}",
-            params=[("select", "id")],
-            headers={"Range-Unit": "items", "Range": "0-0"},
-            timeout=HTTP_TIMEOUT,
+            [("select", "id")],
+            {"Range-Unit": "items", "Range": "0-0", "Prefer": f"count={count_mode or 'exact'}"},
         )
         r.raise_for_status()
-        total = _parse_total(r.headers.get("content-range"))
+        total = parse_total(r.content_range)
     except requests.exceptions.RequestException as e:
-        return jsonify({"error": "supa_error", "detail": _safe_err(e)}), 400
-
-    return jsonify({"total": total}), 200
+        return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+    except CircuitOpenError:
+        found, total = _count_cache.get_stale(())
+        if not found:
+            stale_age = _stale_replica_age()
+            if stale_age is None:
+                raise
+            total = _replica.count({})
+        return _mark_stale(_cached_json(
+            {"total": total, "count": {"mode": "exact", "cached": True}, "stale": True}, "count",
+        ))
+
+    if count_mode in (None, "exact"):
+        _count_cache.set((), total)
+    return _cached_json({"total": total, "count": {"mode": count_mode or "exact", "cached": False}}, "count")
 
 
 # -----------------------------
-# GET /api/afiliados/stats?group=empresa|sector|lugar_trabajo
+# GET /api/afiliados/stats?group=empresa|sector|lugar_trabajo[,otra]
+#   &created_from=&created_to=&updated_from=&updated_to=
 # -----------------------------
+def _iso_ts(ts: float | None) -> str | None:
+    if ts is None:
+        return None
+    return dt.datetime.fromtimestamp(ts, dt.timezone.utc).isoformat(timespec="seconds")
+
+
+def _stats_rows(dims: tuple[str, ...], pairs) -> list[dict]:
+    if len(dims) == 1:
+        return [{"grupo": vals[0], "cantidad": n} for vals, n in pairs]
+    return [{"grupo": dict(zip(dims, vals)), "cantidad": n} for vals, n in pairs]
+
+
 @bp.get("/stats")
+@cost(3)
 def stats_afiliados():
     supa_url, table, sess = _get_session()
     if not sess:
@@ -349,25 +1367,71 @@ def stats_afiliados():
             return jsonify({"group_by": "empresa", "data": []}), 200
         return jsonify({"error": "config_error"}), 500
 
-    group = (request.args.get("group") or "empresa").strip()
-    if group not in {"empresa", "sector", "lugar_trabajo"}:
-        group = "empresa"
+    dims = parse_dims(request.args.get("group")) or ("empresa",)
+    group = ",".join(dims)
+    ranges = {
+        "created_from": _parse_date(request.args.get("created_from")),
+        "created_to":   _parse_date_range_end(request.args.get("created_to")),
+        "updated_from": _parse_date(request.args.get("updated_from")),
+        "updated_to":   _parse_date_range_end(request.args.get("updated_to")),
+    }
+
+    # 1) Contadores en memoria (réplica o recorrido de Supabase)
+    if _aggregates_follower is not None and _aggregates_follower.ready:
+        etag = _version_etag("a", _aggregates.version)
+        unchanged = _not_modified(etag, "stats")
+        if unchanged is not None:
+            return unchanged
+        pairs = _aggregates.query(dims, STATS_LIMIT, **ranges)
+        return _cached_json({
+            "group_by": group,
+            "data": _stats_rows(dims, pairs),
+            "as_of": _iso_ts(_aggregates.as_of),
+            "source": "aggregates",
+        }, "stats", etag=etag)
+
+    # 2) Réplica SQLite (sólo agrupaciones simples sin filtros)
+    replica_age = _replica_age()
+    if replica_age is not None and len(dims) == 1 and not any(ranges.values()):
+        return _cached_json({
+            "group_by": group,
+            "data": _replica.stats(group, STATS_LIMIT),
+            "as_of": _iso_ts(time.time() - replica_age),
+            **_replica_meta(replica_age),
+        }, "stats")
+
+    # 3) Supabase, cacheado por grupo + filtros
+    def _load():
+        params = [
+            ("select", f"{group},count:id"),
+            ("group", group),
+            ("order", "count.desc.nullslast"),
+            ("limit", str(STATS_LIMIT)),
+        ]
+        params += _filter_params(ranges)
+        r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params)
+        r.raise_for_status()
+        rows = r.data
+        pairs = [(tuple(row.get(d) for d in dims), row.get("count")) for row in rows]
+        return pairs, time.time()
 
-    params = [
-        ("select", f"{group},count:id"),
-        ("group", group),
-        ("order", "count.desc.nullslast"),
-        ("limit", "500"),
-    ]
     try:
-        r = sess.get(f"{supa_url}/rest/v1/{table}", params=params, timeout=HTTP_TIMEOUT)
-        r.raise_for_status()
-        data = r.json()
+        (pairs, as_of), cache_state = _load_or_stale(_stats_cache, (dims, tuple(sorted(ranges.items()))), _load)
     except requests.exceptions.RequestException as e:
-        return jsonify({"error": "supa_error", "detail": _safe_err(e)}), 400
-
-    out = [{"grupo": row.get(group), "cantidad": row.get("count")} for row in data]
-    return jsonify({"group_by": group, "data": out}), 200
+        return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+
+    payload = {
+        "group_by": group,
+        "data": _stats_rows(dims, pairs),
+        "as_of": _iso_ts(as_of),
+        "source": "supabase",
+    }
+    if cache_state == "STALE":
+        payload["stale"] = True
+        return _mark_stale(_cached_json(payload, "stats"))
+    resp = _cached_json(payload, "stats")
+    resp.headers["X-Cache"] = cache_state
+    return resp
 
 
 # -----------------------------
@@ -375,13 +1439,14 @@ def stats_afiliados():
 # -----------------------------
 @bp.get("/schema")
 def schema_afiliados():
-    return jsonify({
+    return _cached_json({
         "fields_all": FIELDS_ALL,
-        "default_select": DEFAULT_SELECT.split(",") if DEFAULT_SELECT != "*" else ["*"],
+        "default_select": _resolve_select_param(None, DEFAULT_SELECT).split(","),
         "detail_select": DETAIL_SELECT.split(","),
+        "presets": SELECT_PRESETS,
         "sortable": sorted(SAFE_SORT_FIELDS),
         "max_page_size": MAX_PAGE_SIZE,
-    }), 200
+    }, "schema")
 
 
 # -----------------------------
@@ -394,18 +1459,185 @@ def schema_live():
         if ALLOW_DEV_NO_SUPA:
             return jsonify({"columns": []}), 200
         return jsonify({"error": "config_error"}), 500
-    try:
-        r = sess.get(
-            f"{supa_url}/rest/v1/{table}",
-            params=[("select", "*"), ("limit", "1")],
-            timeout=HTTP_TIMEOUT
-        )
+
+    def _load():
+        r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", [("select", "*"), ("limit", "1")])
         r.raise_for_status()
-        rows = r.json()
-        cols = sorted(list(rows[0].keys())) if rows else []
-        return jsonify({"columns": cols}), 200
+        rows = r.data
+        return sorted(list(rows[0].keys())) if rows else []
+
+    try:
+        cols, cache_state = _load_or_stale(_schema_cache, table, _load)
+        resp = jsonify({"columns": cols})
+        if cache_state == "STALE":
+            return _mark_stale(resp), 200
+        resp.headers["X-Cache"] = cache_state
+        return resp, 200
     except requests.exceptions.RequestException as e:
-        return jsonify({"error": "supa_error", "detail": _safe_err(e)}), 400
+        return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+
+
+# -----------------------------
+# GET /api/afiliados/changes?since=<token>&have=<n>&limit=1000&fields=...&format=json|ndjson
+#   Altas/modificaciones (por actualizado_en, id) y bajas desde el token. Sin
+#   since, todo el padrón. Si has_more, pedir de nuevo con since=next; si no,
+#   guardar next para la próxima sincronización.
+#   Sin réplica no hay tombstones: el cliente manda en have cuántas filas tiene
+#   y, si son más que las de Supabase, se le contesta reset=true con la primera
+#   página de una sincronización completa (tiene que descartar lo que tenía).
+# -----------------------------
+def _encode_since(mark: dict) -> str:
+    raw = json.dumps({"v": 1, **mark}, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_since(raw: str) -> dict:
+    try:
+        pad = "=" * (-len(raw) % 4)
+        t = json.loads(base64.urlsafe_b64decode(raw + pad))
+        if t.get("v") != 1:
+            raise ValueError("since")
+        mark = {k: t.get(k) for k in ("u", "i", "du", "di")}
+        for k in ("i", "di"):
+            if mark[k] is not None and not isinstance(mark[k], int):
+                raise ValueError("since")
+        for k in ("u", "du"):
+            if mark[k] is None:
+                continue
+            # Tiene que ser un timestamp: termina dentro de un filtro de PostgREST
+            if not isinstance(mark[k], str):
+                raise ValueError("since")
+            dt.datetime.fromisoformat(mark[k].replace("Z", "+00:00"))
+        if mark["i"] is None and mark["u"] is not None:
+            raise ValueError("since")
+        return mark
+    except Exception as e:
+        raise ValueError("since_invalido") from e
+
+
+def _changes_replica_age() -> float | None:
+    """Las bajas sólo las conoce la réplica: se usa si está al día (o si Supabase no responde)."""
+    if _replica is None:
+        return None
+    age = _replica.age_s()
+    if age is None:
+        return None
+    if age <= REPLICA_MAX_STALENESS_S or not upstream_available():
+        return age
+    return None
+
+
+@bp.get("/changes")
+@cost(per_rows("limit", CHANGES_PAGE_SIZE, 500))
+def changes_afiliados():
+    t0 = time.perf_counter()
+    raw_since = (request.args.get("since") or "").strip()
+    try:
+        mark = _decode_since(raw_since) if raw_since else None
+    except ValueError:
+        return jsonify({"error": "since_invalido", "detail": "Token since inválido o corrupto"}), 400
+    fmt = (request.args.get("format") or "json").strip().lower()
+    if fmt not in ("json", "ndjson"):
+        return jsonify({"error": "formato_invalido", "detail": "format debe ser json o ndjson"}), 400
+    limit = bounded_int(request.args.get("limit"), default=CHANGES_PAGE_SIZE, min_v=1, max_v=MAX_PAGE_SIZE)
+
+    select_param = _resolve_select_param(request.args.get("fields"), "preset:export")
+    # id y actualizado_en hacen falta para armar el token
+    cols = None if select_param == "*" else list(dict.fromkeys(select_param.split(",") + ["id", "actualizado_en"]))
+    ts, last_id = (mark["u"], mark["i"]) if mark else (None, None)
+    del_mark = (mark["du"], mark["di"]) if mark else (None, None)
+
+    reset = False
+    replica_age = _changes_replica_age()
+    if replica_age is not None:
+        rows = _replica.updated_after(ts, last_id, limit, cols)
+        if mark is None:
+            # Primera sincronización: el cliente no tiene nada que borrar
+            deleted = []
+            del_mark = _replica.last_deleted() or (None, None)
+        else:
+            deleted = _replica.deleted_after(del_mark[0], del_mark[1], limit)
+        meta = _replica_meta(replica_age)
+    else:
+        supa_url, table, sess = _get_session()
+        if not sess:
+            if ALLOW_DEV_NO_SUPA:
+                return jsonify({"data": [], "deleted": [], "next": raw_since or None, "has_more": False,
+                                "deletes_tracked": False}), 200
+            return jsonify({"error": "config_error", "detail": "Faltan SUPABASE_URL/SERVICE_ROLE"}), 500
+        have = request.args.get("have")
+        if mark is not None:
+            if have is None or not have.isdigit():
+                return jsonify({
+                    "error": "have_requerido",
+                    "detail": "Sin réplica las bajas se detectan por conteo: mandar have=<filas que tiene el cliente>",
+                }), 409
+            try:
+                # El conteo va antes que la página: una alta posterior sólo puede
+                # hacer que una baja se note un poll más tarde, nunca un reset de más
+                r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", [("select", "id"), ("limit", "1")],
+                                  headers={"Prefer": "count=exact"})
+                r.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+            total = content_range_total(r.content_range)
+            if total is not None and int(have) > total:
+                reset = True
+                ts, last_id = None, None
+        params = [
+            ("select", ",".join(cols) if cols else "*"),
+            ("order", "actualizado_en.asc.nullsfirst,id.asc"),
+            ("limit", str(limit)),
+        ]
+        if last_id is not None and ts is None:
+            params.append(("or", f"(and(actualizado_en.is.null,id.gt.{last_id}),actualizado_en.not.is.null)"))
+        elif last_id is not None:
+            u = _pg_quote(ts)
+            params.append(("or", f"(actualizado_en.gt.{u},and(actualizado_en.eq.{u},id.gt.{last_id}))"))
+        try:
+            r = _upstream_get(sess, f"{supa_url}/rest/v1/{table}", params)
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+        rows = r.data
+        deleted = []
+        meta = {"source": "supabase"}
+
+    if rows:
+        last = rows[-1]
+        ts = str(last["actualizado_en"]) if last.get("actualizado_en") is not None else None
+        last_id = last["id"]
+    if deleted:
+        del_mark = (deleted[-1]["deleted_at"], deleted[-1]["id"])
+    token = _encode_since({"u": ts, "i": last_id, "du": del_mark[0], "di": del_mark[1]})
+    envelope = {
+        "next": token,
+        "has_more": len(rows) >= limit or len(deleted) >= limit,
+        "deletes_tracked": replica_age is not None,
+        "reset": reset,
+        **meta,
+    }
+    if fmt == "ndjson":
+        # Compacto: una línea de encabezado con las columnas y después cada fila
+        # como array en ese orden; las bajas como {"deleted": id, "dni": ...}
+        # (sin la antigüedad de la réplica, para que el ETag no cambie en cada poll)
+        columns = cols or list(FIELDS_ALL)
+        head = {k: v for k, v in envelope.items() if k not in _ETAG_VOLATILE}
+        lines = [dumpb(current_app, {**head, "columns": columns})]
+        lines += [dumpb(current_app, [row.get(c) for c in columns]) for row in rows]
+        lines += [dumpb(current_app, {"deleted": d["id"], "dni": d["dni"]}) for d in deleted]
+        body = b"\n".join(lines) + b"\n"
+        resp = current_app.response_class(body, mimetype="application/x-ndjson")
+        resp.set_etag(hashlib.sha1(body).hexdigest())
+        resp.headers["Cache-Control"] = HTTP_CACHE_POLICY["changes"]
+        return resp.make_conditional(request)
+
+    return _cached_json({
+        "data": rows,
+        "deleted": deleted,
+        **envelope,
+        "duration_ms": int((time.perf_counter() - t0) * 1000),
+    }, "changes")
 
 
 # -----------------------------
@@ -426,3 +1658,270 @@ def ping_supabase():
         return jsonify({"ok": ok, "status": r.status_code}), 200 if ok else 500
     except Exception:
         return jsonify({"ok": False}), 500
+
+
+# -----------------------------
+# Importación masiva del padrón (admin)
+#   POST /api/afiliados/import?format=csv|ndjson&encoding=utf-8-sig
+#        cuerpo = el archivo (o multipart con campo "file") -> 202 + id del trabajo
+#   GET  /api/afiliados/import                -> últimos trabajos
+#   GET  /api/afiliados/import/<id>           -> progreso
+#   GET  /api/afiliados/import/<id>/errors    -> errores por fila (NDJSON)
+#   POST /api/afiliados/import/<id>/resume    -> retomar uno interrumpido/fallido
+#   Upsert a Supabase por lotes con on_conflict=dni.
+# -----------------------------
+def _import_normalize(rec: dict) -> dict:
+    row: dict = {}
+    for k, v in rec.items():
+        col = IMPORT_ALIASES.get(k, k)
+        if col not in IMPORT_COLUMNS:
+            continue
+        if isinstance(v, str):
+            v = v.strip() or None
+        row[col] = v
+    dni = _clean_dni(str(row.get("dni") or ""))
+    if not dni or not 6 <= len(dni) <= 9:
+        raise ValueError(f"DNI faltante o inválido ({row.get('dni')!r})")
+    row["dni"] = dni
+    for col in IMPORT_DATE_FIELDS:
+        if row.get(col):
+            d = _parse_date(str(row[col]))
+            if not d:
+                raise ValueError(f"{col}: fecha inválida ({row[col]!r}); usar AAAA-MM-DD o DD/MM/AAAA")
+            row[col] = d[:10]
+    if row.get("email"):
+        row["email"] = str(row["email"]).lower()
+    return row
+
+
+def _import_upsert(rows: list[dict]) -> list[tuple[int, str]]:
+    supa_url, table, sess = _get_session()
+    if not sess:
+        raise ImportFailed("Faltan SUPABASE_URL/SERVICE_ROLE")
+
+    # Un DNI repetido dentro del mismo lote rompe el upsert: gana la última fila
+    rejected: list[tuple[int, str]] = []
+    last: dict[str, int] = {}
+    for i, row in enumerate(rows):
+        if row["dni"] in last:
+            rejected.append((last[row["dni"]], "DNI repetido en el archivo: lo reemplaza una fila posterior"))
+        last[row["dni"]] = i
+
+    def _post(idx: list[int]) -> list[tuple[int, str]]:
+        batch = [rows[i] for i in idx]
+        cols = sorted({k for row in batch for k in row})
+        body = json.dumps(batch, ensure_ascii=False, default=str).encode("utf-8")
+        for attempt in range(IMPORT_RETRIES + 1):
+            try:
+                r = sess.post(
+                    f"{supa_url}/rest/v1/{table}",
+                    params=[("on_conflict", "dni"), ("columns", ",".join(cols))],
+                    data=body,
+                    headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+                    timeout=HTTP_TIMEOUT,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # El upsert es idempotente: reintentar no duplica nada
+                if attempt < IMPORT_RETRIES:
+                    time.sleep(0.5 * 2 ** attempt)
+                    continue
+                raise
+            if r.status_code < 300:
+                return []
+            if r.status_code in (401, 403):
+                raise ImportFailed("Invalid/unauthorized key (401/403)")
+            if r.status_code >= 500 or r.status_code == 429:
+                if attempt < IMPORT_RETRIES:
+                    time.sleep(0.5 * 2 ** attempt)
+                    continue
+                raise ImportFailed(f"Supabase no acepta el lote: {pg_message(r)}")
+            # 4xx: alguna fila no entra (tipo, NOT NULL, ...); se parte el lote para aislarla
+            if len(idx) == 1:
+                return [(idx[0], pg_message(r))]
+            mid = len(idx) // 2
+            return _post(idx[:mid]) + _post(idx[mid:])
+        return []
+
+    return rejected + _post(sorted(last.values()))
+
+
+_import_seen = {"mark": last_import_done(), "checked": 0.0}
+IMPORT_CHECK_S = 1.0
+
+
+def _refresh_after_import(shared: bool):
+    """Descarta lo cacheado y pone al día los índices en memoria. shared=False
+    deja las cachés compartidas (ya les subió la versión el worker que importó)."""
+    if shared or get_backend() is None:
+        for c in (_detail_cache, _count_cache, _stats_cache, _suggest_cache, _schema_cache):
+            c.clear()
+    if _replica is not None and REPLICA_SYNC:
+        _replica.wake()
+    # Con réplica, los cambios llegan recién cuando la sincroniza el worker que
+    # tiene el lock: los followers miran cada segundo durante ese intervalo
+    window = _cfg.replica_sync_interval_s + 5 if _replica is not None else 0.0
+    for f in {_search_follower, _suggest_follower, _aggregates_follower} - {None}:
+        f.wake(window)
+
+
+def _check_import_done():
+    """Los demás workers se enteran de una importación terminada por la marca en disco."""
+    now = time.monotonic()
+    if now - _import_seen["checked"] < IMPORT_CHECK_S:
+        return
+    _import_seen["checked"] = now
+    mark = last_import_done()
+    if mark != _import_seen["mark"]:
+        _import_seen["mark"] = mark
+        _refresh_after_import(shared=False)
+
+
+def _import_done(state: dict):
+    # Con caché compartida, clear() sube la versión para todos los workers; los
+    # demás limpian su caché local y sus índices al ver la marca nueva
+    _import_seen["mark"] = last_import_done()
+    _refresh_after_import(shared=True)
+
+
+def _start_import(job: ImportJob) -> bool:
+    return job.start(_import_normalize, _import_upsert, _import_done, set(IMPORT_COLUMNS) | set(IMPORT_ALIASES))
+
+
+def _import_job_or_404(job_id: str):
+    try:
+        job = ImportJob(job_id)
+    except KeyError:
+        job = None
+    if job is None or not job.exists():
+        return None, (jsonify({"error": "not_found", "detail": "Importación inexistente"}), 404)
+    return job, None
+
+
+def _import_links(job_id: str) -> dict:
+    base = f"{bp.url_prefix}/import/{job_id}"
+    return {"self": base, "errors": f"{base}/errors", "resume": f"{base}/resume"}
+
+
+@bp.post("/import")
+@cost(10)
+def import_afiliados():
+    denied = require_admin()
+    if denied:
+        return denied
+    supa_url, table, sess = _get_session()
+    if not sess:
+        return jsonify({"error": "config_error", "detail": "Faltan SUPABASE_URL/SERVICE_ROLE"}), 500
+
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    filename = (upload.filename if upload else request.args.get("filename")) or ""
+    fmt = (request.args.get("format") or "").strip().lower()
+    if not fmt:
+        mimetype = upload.mimetype if upload else request.mimetype
+        if "ndjson" in mimetype or "jsonl" in mimetype or filename.lower().endswith((".ndjson", ".jsonl")):
+            fmt = "ndjson"
+        else:
+            fmt = "csv"
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"error": "formato_invalido", "detail": "format debe ser csv o ndjson"}), 400
+    encoding = (request.args.get("encoding") or "utf-8-sig").strip()
+    try:
+        "".encode(encoding)
+    except LookupError:
+        return jsonify({"error": "encoding_invalido", "detail": f"Codificación desconocida: {encoding}"}), 400
+
+    try:
+        job = ImportJob.create(upload.stream if upload else request.stream, fmt, encoding,
+                               options={"filename": filename})
+    except ImportFailed as e:
+        return jsonify({"error": "archivo_demasiado_grande", "detail": str(e)}), 413
+    _start_import(job)
+
+    resp = jsonify({"job": job.status(), "links": _import_links(job.id)})
+    resp.status_code = 202
+    resp.headers["Location"] = _import_links(job.id)["self"]
+    return resp
+
+
+@bp.get("/import")
+def import_list():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({"data": list_import_jobs()}), 200
+
+
+@bp.get("/import/<job_id>")
+def import_status(job_id: str):
+    denied = require_admin()
+    if denied:
+        return denied
+    job, err = _import_job_or_404(job_id)
+    if err:
+        return err
+    resp = jsonify({"job": job.status(), "links": _import_links(job.id)})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@bp.get("/import/<job_id>/errors")
+def import_errors(job_id: str):
+    denied = require_admin()
+    if denied:
+        return denied
+    job, err = _import_job_or_404(job_id)
+    if err:
+        return err
+    limit = bounded_int(request.args.get("limit"), default=IMPORT_MAX_ERRORS_SHOWN, min_v=1, max_v=1_000_000)
+    return Response(stream_with_context(job.iter_errors(limit)), mimetype="application/x-ndjson")
+
+
+@bp.post("/import/<job_id>/resume")
+def import_resume(job_id: str):
+    denied = require_admin()
+    if denied:
+        return denied
+    job, err = _import_job_or_404(job_id)
+    if err:
+        return err
+    st = job.status()
+    if not st["resumable"]:
+        return jsonify({"error": "no_resumible", "detail": f"La importación está {st['status']}", "job": st}), 409
+    if not _start_import(job):
+        return jsonify({"error": "en_curso", "detail": "Otro proceso la está procesando", "job": st}), 409
+    resp = jsonify({"job": job.status(), "links": _import_links(job.id)})
+    resp.status_code = 202
+    return resp
+
+
+# -----------------------------
+# Administración de la caché de detalle
+#   GET    /api/afiliados/_cache        -> contadores (detalle + coalescing upstream)
+#   DELETE /api/afiliados/_cache        -> vaciar todo
+#   DELETE /api/afiliados/_cache/<dni>  -> invalidar un DNI (todas sus proyecciones)
+# -----------------------------
+@bp.get("/_cache")
+def cache_stats():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({"detail": _detail_cache.stats(), "upstream": _upstream.stats()}), 200
+
+
+@bp.delete("/_cache")
+def cache_flush():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({"ok": True, "removed": _detail_cache.clear()}), 200
+
+
+@bp.delete("/_cache/<dni>")
+def cache_invalidate(dni: str):
+    denied = require_admin()
+    if denied:
+        return denied
+    d = _clean_dni(dni)
+    if not d:
+        return jsonify({"error": "dni_invalido", "detail": "El DNI debe contener solo dígitos"}), 400
+    removed = _detail_cache.delete_group(d)
+    return jsonify({"ok": True, "dni": d, "removed": removed}), 200
@@ -0,0 +1,478 @@
+# backend/routes/novedades.py — Novedades: feed publicado servido desde memoria
+#
+# Las novedades se leen en la home y se escriben pocas veces por semana. Las
+# lecturas (listado, búsqueda con q, detalle) salen de novedades_feed.py sin
+# tocar Supabase: páginas ya serializadas y con ETag. Supabase sólo se consulta
+# para la carga inicial del proceso, en las escrituras, y en un hilo que cada
+# NOVEDADES_REFRESH_S trae lo que cambió desde otros workers. Con CACHE_BACKEND
+# compartido además se avisa por un contador y los demás workers se ponen al día
+# en ~1 s.
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from admin_auth import require_admin
+from breaker import CircuitOpenError
+from json_provider import dumpb
+from lazy import lazy_import
+from novedades_feed import NovedadesFeed
+from ratelimit import cost
+from settings import get_settings
+from shared_cache import CACHE_PREFIX, get_backend
+from supabase_client import get_client
+from supabase_util import bounded_int, content_range_total, pg_message, safe_err, upstream_unavailable
+
+requests = lazy_import("requests")
+
+bp = Blueprint("novedades", __name__, url_prefix="/api/novedades")
+log = logging.getLogger(__name__)
+
+_cfg = get_settings()
+
+NOVEDADES_TABLE = _cfg.novedades_table
+REFRESH_S       = _cfg.novedades_refresh_s
+FULL_RELOAD_S   = _cfg.novedades_full_reload_s
+MAX_PAGE_SIZE   = _cfg.novedades_max_page_size
+HTTP_TIMEOUT    = _cfg.http_timeout
+ALLOW_DEV_NO_SUPA = _cfg.allow_dev_no_supa
+
+# Columnas del listado (el contenido completo sólo va en el detalle)
+LIST_FIELDS = ("id", "titulo", "resumen", "imagen_url", "fecha_publicacion", "publicada", "actualizado_en")
+WRITABLE = ("titulo", "resumen", "contenido", "imagen_url", "fecha_publicacion", "publicada")
+TITLE_MAX = 200
+SUMMARY_LEN = 240
+LOAD_CHUNK = 1000
+# Cada cuánto se mira el contador compartido (sin base de por medio)
+NOTIFY_POLL_S = 1.0
+
+HTTP_CACHE_POLICY = {
+    "public": "public, no-cache",
+    "admin":  "private, no-store",
+}
+
+_feed = NovedadesFeed(LIST_FIELDS, page_cache_size=_cfg.novedades_page_cache)
+
+
+def _dumps(value) -> bytes:
+    return dumpb(current_app, value)
+
+
+def _now_iso() -> str:
+    return dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds")
+
+
+# -----------------------------
+# Sincronización con Supabase
+# -----------------------------
+class _FeedSync:
+    """Carga inicial + refresco incremental del feed (un hilo por proceso).
+
+    Incremental: se piden sólo las filas con actualizado_en posterior a la
+    última vista. Después se compara el total de Supabase con lo que hay en
+    memoria y, si difiere, el conjunto de ids (así una baja más un alta entre
+    dos refrescos también se nota). Cada FULL_RELOAD_S se recarga todo."""
+
+    def __init__(self):
+        self.mark: str | None = None     # mayor actualizado_en aplicado
+        self.notified = 0
+        self.last_sync: float | None = None
+        self.last_load: float | None = None
+        self.last_error: str | None = None
+        self.syncs = 0
+        self._lock = threading.Lock()
+        self._thread_pid: int | None = None
+
+    def _url(self, supa_url: str) -> str:
+        return f"{supa_url}/rest/v1/{NOVEDADES_TABLE}"
+
+    def _get(self, sess, url: str, params: list[tuple[str, str]], prefer: str | None = None):
+        r = sess.get(url, params=params, headers={"Prefer": prefer} if prefer else None, timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        return r
+
+    def _advance(self, rows: list[dict]):
+        for row in rows:
+            ts = row.get("actualizado_en")
+            if ts and (self.mark is None or str(ts) > self.mark):
+                self.mark = str(ts)
+
+    def _scan(self, sess, url: str, select: str) -> list[dict]:
+        """Toda la tabla por bloques keyset (id): no depende del max-rows de PostgREST."""
+        rows: list[dict] = []
+        last = 0
+        while True:
+            chunk = self._get(sess, url, [
+                ("select", select), ("id", f"gt.{last}"), ("order", "id.asc"), ("limit", str(LOAD_CHUNK)),
+            ]).json()
+            rows += chunk
+            if len(chunk) < LOAD_CHUNK:
+                return rows
+            last = chunk[-1]["id"]
+
+    def load(self, sess, supa_url: str) -> int:
+        """Carga completa."""
+        rows = self._scan(sess, self._url(supa_url), "*")
+        self.mark = None
+        self._advance(rows)
+        changed = _feed.apply(rows, [], reset=True)
+        self.last_sync = self.last_load = time.time()
+        return changed
+
+    def refresh(self, sess, supa_url: str) -> int:
+        """Trae lo que cambió desde la última vez; devuelve cuántas filas cambiaron."""
+        if self.last_load is None or time.time() - self.last_load >= FULL_RELOAD_S:
+            # Red de seguridad: cualquier cosa que el incremental no haya visto
+            return self.load(sess, supa_url)
+        url = self._url(supa_url)
+        params = [("select", "*"), ("order", "actualizado_en.asc,id.asc")]
+        if self.mark:
+            # gte: filas con el mismo instante que la marca se vuelven a pedir (apply las ignora si no cambiaron)
+            params.append(("actualizado_en", f"gte.{self.mark}"))
+        rows = self._get(sess, url, params + [("limit", str(LOAD_CHUNK))]).json()
+        changed = _feed.apply(rows, [])
+        self._advance(rows)
+        if len(rows) >= LOAD_CHUNK:
+            # Demasiados cambios juntos: recargar todo es más simple y igual de barato
+            self.load(sess, supa_url)
+            return len(rows)
+
+        # Total de la tabla (otra consulta liviana: sólo el header). Con las altas
+        # ya aplicadas, cualquier diferencia es una baja (o un alta posterior a
+        # la consulta de arriba): se comparan los ids
+        total_r = self._get(sess, url, [("select", "id"), ("limit", "0")], prefer="count=exact")
+        total = content_range_total(total_r.headers.get("content-range"))
+        if total is None or total != len(_feed):
+            ids = {row["id"] for row in self._scan(sess, url, "id")}
+            gone = [i for i in _feed.ids() if i not in ids]
+            changed += _feed.apply([], gone)
+        self.last_sync = time.time()
+        return changed
+
+    def _shared_version(self) -> int | None:
+        backend = get_backend()
+        if backend is None:
+            return None
+        try:
+            return backend.get_int(_NOTIFY_KEY)
+        except Exception:
+            return None
+
+    def _run(self):
+        next_refresh = time.monotonic() + REFRESH_S
+        while True:
+            time.sleep(NOTIFY_POLL_S if get_backend() is not None else max(1.0, REFRESH_S))
+            notified = self._shared_version()
+            due = time.monotonic() >= next_refresh or (notified is not None and notified != self.notified)
+            if not due:
+                continue
+            supa_url, _, sess = get_client()
+            if not sess:
+                continue
+            try:
+                with self._lock:
+                    self.refresh(sess, supa_url)
+                    self.syncs += 1
+                if notified is not None:
+                    self.notified = notified
+                self.last_error = None
+            except Exception as e:   # incluye circuito abierto: se sigue sirviendo lo que hay
+                self.last_error = safe_err(e)
+                log.warning("novedades: no se pudo refrescar desde Supabase: %s", self.last_error)
+            next_refresh = time.monotonic() + REFRESH_S
+
+    def ensure_loaded(self):
+        """Primera carga (bloquea sólo al primer request del proceso) y arranque del hilo."""
+        pid = os.getpid()
+        if _feed.loaded and self._thread_pid == pid:
+            return
+        supa_url, _, sess = get_client()
+        with self._lock:
+            if not _feed.loaded:
+                if sess:
+                    self.notified = self._shared_version() or 0
+                    self.load(sess, supa_url)
+                elif ALLOW_DEV_NO_SUPA:
+                    _feed.apply([], [], reset=True)   # desarrollo: feed sólo en memoria
+                else:
+                    raise _NotConfigured()
+            if self._thread_pid != pid:
+                self._thread_pid = pid
+                if sess:
+                    threading.Thread(target=self._run, name="novedades-sync", daemon=True).start()
+
+    def status(self) -> dict:
+        return {
+            "table": NOVEDADES_TABLE,
+            "refresh_s": REFRESH_S,
+            "full_reload_s": FULL_RELOAD_S,
+            "mark": self.mark,
+            "syncs": self.syncs,
+            "last_sync_age_s": round(time.time() - self.last_sync, 1) if self.last_sync else None,
+            "last_error": self.last_error,
+            "shared_notify": get_backend() is not None,
+        }
+
+
+class _NotConfigured(Exception):
+    pass
+
+
+_NOTIFY_KEY = f"{CACHE_PREFIX}:novedades:changes"
+_sync = _FeedSync()
+
+
+def _after_fork_in_child():
+    # El feed heredado puede estar viejo y el hilo de sync no existe en el hijo
+    global _sync
+    _sync = _FeedSync()
+    _feed.loaded = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _notify_workers():
+    """Avisa a los demás workers (con caché compartida) que hay cambios."""
+    backend = get_backend()
+    if backend is None:
+        return
+    try:
+        backend.incr(_NOTIFY_KEY)
+    except Exception as e:
+        log.warning("novedades: no se pudo avisar el cambio a los demás workers: %s", e)
+
+
+# -----------------------------
+# Errores
+# -----------------------------
+bp.register_error_handler(CircuitOpenError, upstream_unavailable)
+
+
+@bp.errorhandler(_NotConfigured)
+def _not_configured(_):
+    return jsonify({"error": "config_error", "detail": "Faltan SUPABASE_URL/SERVICE_ROLE"}), 500
+
+
+def _ensure_feed():
+    """None si el feed está listo; si no, la respuesta de error."""
+    try:
+        _sync.ensure_loaded()
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": "supa_error", "detail": safe_err(e)}), 400
+    return None
+
+
+def _cached_body(etag: str, body: bytes, policy: str) -> Response:
+    resp = current_app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = HTTP_CACHE_POLICY[policy]
+    return resp.make_conditional(request)
+
+
+def _wants_drafts():
+    """estado=todas (borradores y programadas) sólo para administración."""
+    if (request.args.get("estado") or "").strip().lower() != "todas":
+        return False, None
+    denied = require_admin()
+    return (False, denied) if denied else (True, None)
+
+
+# -----------------------------
+# GET /api/novedades?q=&page=&page_size=[&estado=todas]
+# GET /api/novedades/<id>
+# -----------------------------
+@bp.get("/")
+def list_novedades():
+    drafts, denied = _wants_drafts()
+    if denied:
+        return denied
+    err = _ensure_feed()
+    if err:
+        return err
+    page = bounded_int(request.args.get("page"), 1, 1, 100_000)
+    page_size = bounded_int(request.args.get("page_size"), 20, 1, MAX_PAGE_SIZE)
+    q = (request.args.get("q") or "").strip()[:200]
+    etag, body = _feed.page(q, page, page_size, _dumps, drafts=drafts)
+    return _cached_body(etag, body, "admin" if drafts else "public")
+
+
+@bp.get("/<int:novedad_id>")
+def get_novedad(novedad_id: int):
+    drafts, denied = _wants_drafts()
+    if denied:
+        return denied
+    err = _ensure_feed()
+    if err:
+        return err
+    found = _feed.detail(novedad_id, _dumps, drafts=drafts)
+    if found is None:
+        return jsonify({"error": "not_found"}), 404
+    return _cached_body(*found, "admin" if drafts else "public")
+
+
+@bp.get("/_status")
+def novedades_status():
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({"feed": _feed.stats(), "sync": _sync.status()}), 200
+
+
+# -----------------------------
+# POST/PUT/PATCH/DELETE (administración)
+#   Escriben en Supabase y aplican la fila devuelta al feed de este worker;
+#   los demás la toman en el próximo refresco (o enseguida, con caché compartida).
+# -----------------------------
+def _summary(text: str) -> str:
+    text = " ".join(str(text).split())
+    if len(text) <= SUMMARY_LEN:
+        return text
+    cut = text[:SUMMARY_LEN].rsplit(" ", 1)[0]
+    return cut + "…"
+
+
+def _clean_payload(body, partial: bool) -> tuple[dict | None, str | None]:
+    if not isinstance(body, dict):
+        return None, "Se espera un objeto JSON"
+    data = {k: body[k] for k in WRITABLE if k in body}
+    if "titulo" in data or not partial:
+        titulo = str(data.get("titulo") or "").strip()
+        if not titulo:
+            return None, "titulo es obligatorio"
+        if len(titulo) > TITLE_MAX:
+            return None, f"titulo admite hasta {TITLE_MAX} caracteres"
+        data["titulo"] = titulo
+    if "fecha_publicacion" in data and data["fecha_publicacion"]:
+        raw = str(data["fecha_publicacion"]).strip()
+        try:
+            ts = dt.datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except ValueError:
+            return None, "fecha_publicacion inválida; usar ISO 8601 (AAAA-MM-DD[THH:MM])"
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=dt.timezone.utc)
+        data["fecha_publicacion"] = ts.isoformat(timespec="seconds")
+    if "publicada" in data:
+        data["publicada"] = data["publicada"] in (True, 1, "1", "true", "True")
+    if not partial:
+        data.setdefault("fecha_publicacion", _now_iso())
+        data.setdefault("publicada", True)
+    if not data.get("resumen") and data.get("contenido"):
+        data["resumen"] = _summary(data["contenido"])
+    if not data:
+        return None, "No hay campos para actualizar"
+    return data, None
+
+
+def _write(method: str, data: dict | None = None, novedad_id: int | None = None) -> tuple[list[dict] | None, tuple | None]:
+    """Escribe en Supabase con return=representation: (filas, None) o (None, respuesta de error)."""
+    supa_url, _, sess = get_client()
+    params = [("id", f"eq.{novedad_id}")] if novedad_id is not None else []
+    try:
+        r = sess.request(
+            method, f"{supa_url}/rest/v1/{NOVEDADES_TABLE}",
+            params=params, json=data, headers={"Prefer": "return=representation"}, timeout=HTTP_TIMEOUT,
+        )
+    except requests.exceptions.RequestException as e:
+        return None, (jsonify({"error": "supa_error", "detail": safe_err(e)}), 400)
+    if r.status_code in (401, 403):
+        return None, (jsonify({"error": "supa_error", "detail": "Invalid/unauthorized key (401/403)"}), 400)
+    if r.status_code >= 300:
+        return None, (jsonify({"error": "supa_error", "detail": pg_message(r)}), 400)
+    return r.json(), None
+
+
+def _write_local(data: dict | None, novedad_id: int | None) -> list[dict]:
+    """Desarrollo sin Supabase: las escrituras quedan sólo en memoria."""
+    now = _now_iso()
+    if novedad_id is None:
+        row = {"id": _feed.max_id() + 1, "resumen": None, "contenido": None, "imagen_url": None,
+               "creado_en": now, **(data or {}), "actualizado_en": now}
+        return [row]
+    row = _feed.get(novedad_id)
+    if row is None:
+        return []
+    return [{**row, **(data or {}), "actualizado_en": now}] if data is not None else [row]
+
+
+def _mutate(method: str, data: dict | None = None, novedad_id: int | None = None):
+    supa_url, _, sess = get_client()
+    if sess:
+        rows, err = _write(method, data, novedad_id)
+        if err:
+            return None, err
+    else:
+        rows = _write_local(data, novedad_id)
+    if method == "DELETE":
+        _feed.apply([], [r["id"] for r in rows])
+    else:
+        _feed.apply(rows, [])
+    if rows:
+        _notify_workers()
+    return rows, None
+
+
+@bp.post("/")
+@cost(5)
+def create_novedad():
+    denied = require_admin()
+    if denied:
+        return denied
+    err = _ensure_feed()
+    if err:
+        return err
+    data, problem = _clean_payload(request.get_json(silent=True), partial=False)
+    if problem:
+        return jsonify({"error": "body_invalido", "detail": problem}), 400
+    rows, err = _mutate("POST", data)
+    if err:
+        return err
+    return jsonify(rows[0] if rows else data), 201
+
+
+@bp.route("/<int:novedad_id>", methods=["PUT", "PATCH"])
+@cost(5)
+def update_novedad(novedad_id: int):
+    denied = require_admin()
+    if denied:
+        return denied
+    err = _ensure_feed()
+    if err:
+        return err
+    # PUT reemplaza: lo que no viene vuelve a su valor por defecto (como en un
+    # alta). PATCH sólo toca los campos enviados.
+    replace = request.method == "PUT"
+    data, problem = _clean_payload(request.get_json(silent=True), partial=not replace)
+    if problem:
+        return jsonify({"error": "body_invalido", "detail": problem}), 400
+    if replace:
+        data = {**dict.fromkeys(WRITABLE), **data}
+    rows, err = _mutate("PATCH", data, novedad_id)
+    if err:
+        return err
+    if not rows:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(rows[0]), 200
+
+
+@bp.delete("/<int:novedad_id>")
+@cost(5)
+def delete_novedad(novedad_id: int):
+    denied = require_admin()
+    if denied:
+        return denied
+    err = _ensure_feed()
+    if err:
+        return err
+    rows, err = _mutate("DELETE", None, novedad_id)
+    if err:
+        return err
+    if not rows:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify({"ok": True, "id": novedad_id}), 200
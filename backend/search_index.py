@@ -0,0 +1,239 @@
+# backend/search_index.py — Índice de nombres en memoria (trigramas sobre tokens sin acentos)
+#
+# Responde búsquedas por apellido/nombres tolerantes a acentos ("Perez" encuentra
+# "Pérez") y a errores de tipeo ("Gonzales" encuentra "González") sin tocar la
+# base. Cada token de la consulta se compara contra el vocabulario por similitud
+# de trigramas (Jaccard) o por prefijo; un afiliado aparece si todos los tokens
+# de la consulta matchean alguno de sus tokens.
+from __future__ import annotations
+
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+MIN_SIMILARITY = 0.34
+PREFIX_SCORE = 0.9
+
+
+def fold(s: str | None) -> str:
+    """Minúsculas, sin acentos y sólo [0-9a-z] separados por espacio."""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKD", str(s))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM.sub(" ", s).strip()
+
+
+def tokens(s: str | None) -> list[str]:
+    return [t for t in fold(s).split() if t]
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    def __init__(self, fields: tuple[str, ...] = ("apellido", "nombres")):
+        self.fields = fields
+        self._lock = threading.RLock()
+        self._doc_tokens: dict[int, tuple[str, ...]] = {}
+        self._sort_key: dict[int, str] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._tri: dict[str, set[str]] = {}
+        self._tri_len: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_tokens)
+
+    # -----------------------------
+    # Mantenimiento
+    # -----------------------------
+    def clear(self):
+        with self._lock:
+            self._doc_tokens.clear()
+            self._sort_key.clear()
+            self._postings.clear()
+            self._tri.clear()
+            self._tri_len.clear()
+
+    def _remove_locked(self, doc_id: int):
+        toks = self._doc_tokens.pop(doc_id, None)
+        self._sort_key.pop(doc_id, None)
+        if not toks:
+            return
+        for t in set(toks):
+            ids = self._postings.get(t)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self._postings[t]
+                for g in trigrams(t):
+                    vocab = self._tri.get(g)
+                    if vocab is not None:
+                        vocab.discard(t)
+                        if not vocab:
+                            del self._tri[g]
+                self._tri_len.pop(t, None)
+
+    def _add_locked(self, doc_id: int, row: dict):
+        toks = tuple(t for f in self.fields for t in tokens(row.get(f)))
+        if not toks:
+            return
+        self._doc_tokens[doc_id] = toks
+        self._sort_key[doc_id] = " ".join(fold(row.get(f)) for f in self.fields)
+        for t in set(toks):
+            ids = self._postings.get(t)
+            if ids is None:
+                ids = self._postings[t] = set()
+                grams = trigrams(t)
+                self._tri_len[t] = len(grams)
+                for g in grams:
+                    self._tri.setdefault(g, set()).add(t)
+            ids.add(doc_id)
+
+    def apply(self, rows: list[dict], deleted_ids: list[int], reset: bool = False):
+        with self._lock:
+            if reset:
+                self.clear()
+            for i in deleted_ids:
+                self._remove_locked(i)
+            for row in rows:
+                doc_id = row.get("id")
+                if doc_id is None:
+                    continue
+                self._remove_locked(doc_id)
+                self._add_locked(doc_id, row)
+
+    # -----------------------------
+    # Consulta
+    # -----------------------------
+    def _token_matches(self, qt: str) -> dict[str, float]:
+        """Tokens del vocabulario parecidos a `qt`, con su similitud."""
+        grams = trigrams(qt)
+        shared: Counter[str] = Counter()
+        for g in grams:
+            for t in self._tri.get(g, ()):
+                shared[t] += 1
+        out: dict[str, float] = {}
+        for t, common in shared.items():
+            if t == qt:
+                out[t] = 1.0
+            elif t.startswith(qt):
+                out[t] = PREFIX_SCORE
+            else:
+                sim = common / (len(grams) + self._tri_len[t] - common)
+                if sim >= MIN_SIMILARITY:
+                    out[t] = sim
+        return out
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> tuple[list[tuple[int, float]], int]:
+        """Devuelve ([(id, score)], total) ordenado por score desc y nombre."""
+        q = tokens(query)[:5]
+        if not q:
+            return [], 0
+        with self._lock:
+            scores: dict[int, float] | None = None
+            for qt in q:
+                per_doc: dict[int, float] = {}
+                for t, sim in self._token_matches(qt).items():
+                    for doc_id in self._postings.get(t, ()):
+                        if sim > per_doc.get(doc_id, 0.0):
+                            per_doc[doc_id] = sim
+                if scores is None:
+                    scores = per_doc
+                else:
+                    scores = {d: s + per_doc[d] for d, s in scores.items() if d in per_doc}
+                if not scores:
+                    return [], 0
+            # Sólo se ordena lo necesario para la página pedida
+            top = heapq.nsmallest(
+                offset + limit, scores.items(), key=lambda kv: (-kv[1], self._sort_key.get(kv[0], ""))
+            )
+        n = len(q)
+        page = top[offset:offset + limit]
+        return [(d, round(s / n, 4)) for d, s in page], len(scores)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"docs": len(self._doc_tokens), "tokens": len(self._postings), "trigrams": len(self._tri)}
+
+
+class PrefixIndex:
+    """Lista ordenada de "apellido nombres" normalizados para autocompletar por prefijo."""
+
+    def __init__(self, payload_fields: tuple[str, ...] = ("id", "dni", "apellido", "nombres")):
+        self.payload_fields = payload_fields
+        self._lock = threading.RLock()
+        self._keys: list[tuple[str, int]] = []
+        self._key_of: dict[int, tuple[str, int]] = {}
+        self._payload: dict[int, dict] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _key(row: dict) -> str:
+        return f"{fold(row.get('apellido'))} {fold(row.get('nombres'))}".strip()
+
+    def apply(self, rows: list[dict], deleted_ids: list[int], reset: bool = False):
+        with self._lock:
+            if reset or len(rows) > max(1000, len(self._keys) // 10):
+                # Lotes grandes: reconstruir y ordenar una vez sale más barato que insertar uno a uno
+                if reset:
+                    self._key_of.clear()
+                    self._payload.clear()
+                for i in deleted_ids:
+                    self._key_of.pop(i, None)
+                    self._payload.pop(i, None)
+                for row in rows:
+                    i = row.get("id")
+                    if i is None:
+                        continue
+                    k = self._key(row)
+                    if k:
+                        self._key_of[i] = (k, i)
+                        self._payload[i] = {f: row.get(f) for f in self.payload_fields}
+                    else:
+                        self._key_of.pop(i, None)
+                        self._payload.pop(i, None)
+                self._keys = sorted(self._key_of.values())
+            else:
+                for i in list(deleted_ids) + [r.get("id") for r in rows if r.get("id") is not None]:
+                    old = self._key_of.pop(i, None)
+                    if old is not None:
+                        pos = bisect.bisect_left(self._keys, old)
+                        if pos < len(self._keys) and self._keys[pos] == old:
+                            del self._keys[pos]
+                    self._payload.pop(i, None)
+                for row in rows:
+                    i = row.get("id")
+                    k = self._key(row)
+                    if i is None or not k:
+                        continue
+                    self._key_of[i] = (k, i)
+                    self._payload[i] = {f: row.get(f) for f in self.payload_fields}
+                    bisect.insort(self._keys, (k, i))
+            self.version += 1
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict]:
+        p = fold(prefix)
+        if not p:
+            return []
+        out: list[dict] = []
+        with self._lock:
+            pos = bisect.bisect_left(self._keys, (p, -1))
+            while pos < len(self._keys) and len(out) < limit:
+                k, i = self._keys[pos]
+                if not k.startswith(p):
+                    break
+                out.append(self._payload[i])
+                pos += 1
+        return out
@@ -0,0 +1,327 @@
+# backend/settings.py — Configuración del backend, leída una sola vez
+#
+# get_settings() carga el .env (si existe) y parsea las variables de entorno en
+# un objeto inmutable; el resto del código (blueprints, infraestructura y
+# gunicorn.conf.py) lee de ahí en vez de llamar a os.getenv por su cuenta.
+# gunicorn.conf.py fija en el master la clase de worker (use_worker_class) y los
+# workers heredan esas Settings con el fork, con los defaults del pool a
+# Supabase que le corresponden.
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Mapping
+
+_FALSE = {"0", "false", "False", "no"}
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _flag(env: Mapping[str, str], name: str, default: bool) -> bool:
+    raw = env.get(name)
+    if raw is None or raw == "":
+        return default
+    return raw.strip() not in _FALSE
+
+
+def _list(raw: str) -> tuple[str, ...]:
+    return tuple(x.strip() for x in raw.split(",") if x.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    # --- App ---
+    app_name: str = "seccional-backend"
+    app_version: str = "1.0.0"
+    cors_origins: tuple[str, ...] = ("http://localhost:5173", "http://127.0.0.1:5173")
+    log_level: str = "INFO"
+    metrics_enabled: bool = True
+    # Blueprints opcionales a registrar (afiliados siempre se registra)
+    blueprints: tuple[str, ...] = ("ping", "tramites", "solicitudes", "novedades")
+    worker_class: str = "dev"
+    admin_token: str = field(default="", repr=False)
+    json_provider: str = "auto"
+
+    # --- Servidor (gunicorn.conf.py) ---
+    port: int = 5000
+    web_concurrency: int = 2
+    gunicorn_timeout: int = 120
+    gunicorn_keepalive: int = 5
+    gunicorn_worker_class: str = ""      # vacío: gevent si está instalado, si no gthread
+    gunicorn_worker_connections: int = 500
+    gunicorn_threads: int = 32
+    supabase_prewarm_async: bool = False
+
+    # --- Supabase (supabase_client.py) ---
+    supabase_url: str = ""
+    supabase_service_role_key: str = field(default="", repr=False)
+    supabase_table: str = "afiliados_personal"
+    pool_connections: int = 10
+    pool_maxsize: int = 20               # gevent: 100; gthread: GUNICORN_THREADS
+    pool_block: bool = False             # gevent: True
+    keepalive_idle_s: int = 60
+    prewarm_conns: int = 2
+    breaker_enabled: bool = True
+    breaker_window_s: float = 30.0
+    breaker_min_calls: int = 10
+    breaker_error_rate: float = 0.5
+    breaker_slow_call_s: float = 5.0
+    breaker_slow_rate: float = 0.8
+    breaker_open_s: float = 15.0
+    breaker_half_open_calls: int = 3
+    retry_budget_ratio: float = 0.2
+    retry_budget_reserve: float = 10.0
+    upstream_max_inflight: int = 20      # default: pool_maxsize
+    upstream_max_queue: int = 64
+    upstream_queue_timeout_s: float = 2.0
+
+    # --- Caché compartida (shared_cache.py) ---
+    cache_backend: str = "local"
+    cache_prefix: str = "seccional"
+    cache_sqlite_path: str = os.path.join(_HERE, "instance", "cache.sqlite3")
+    cache_redis_url: str = "redis://127.0.0.1:6379/0"
+    cache_timeout_s: float = 0.25
+    cache_version_ttl_s: float = 1.0
+    cache_retry_s: float = 5.0
+    cache_near_ttl_s: float = 1.0
+    cache_near_size: int = 1024
+
+    # --- Compresión (compression.py) ---
+    compress: bool = True
+    compress_min_bytes: int = 1024
+    compress_level: int = 5              # gzip 1-9
+    brotli_quality: int = 4              # 0-11; >5 es caro para respuestas dinámicas
+
+    # --- Profiler (profiler.py) ---
+    profile_max_s: float = 60.0
+    profile_interval_ms: float = 10.0
+    profile_max_depth: int = 128
+
+    # --- Afiliados: consultas ---
+    default_select: str = "preset:table"
+    max_page_size: int = 10000
+    http_timeout: float = 30.0
+    export_chunk_size: int = 1000
+    lookup_max_dnis: int = 5000
+    lookup_chunk: int = 200
+    lookup_workers: int = 4
+    json_passthrough_min_rows: int = 1000
+    changes_page_size: int = 1000
+    upstream_microcache_ms: float = 0.0
+    allow_dev_no_supa: bool = True
+
+    # --- Afiliados: cachés ---
+    detail_cache_size: int = 5000
+    detail_cache_ttl: float = 300.0
+    detail_cache_neg_ttl: float = 30.0
+    count_cache_ttl: float = 30.0
+    suggest_max: int = 20
+    suggest_cache_ttl: float = 60.0
+    stats_cache_ttl: float = 300.0
+    stale_if_error_s: float = 3600.0
+    http_detail_max_age: int = 60
+    schema_cache_ttl: float = 300.0
+
+    # --- Afiliados: réplica e índices ---
+    read_mode: str = "supabase"
+    replica_sync: bool = False
+    replica_max_staleness_s: float = 900.0
+    search_index: bool = True
+    index_scan: bool = False   # recorrido de Supabase por worker sin réplica (opt-in)
+    search_refresh_s: float = 5.0
+    stats_refresh_s: float = 30.0
+    replica_path: str = os.path.join(_HERE, "instance", "afiliados_replica.sqlite3")
+    replica_sync_interval_s: float = 60.0
+    replica_full_resync_s: float = 21600.0
+    replica_sync_chunk: int = 1000
+
+    # --- Rate limit (ratelimit.py) ---
+    rate_limit_enabled: bool = False      # opt-in: detrás de un NAT la IP la comparten muchos
+    rate_limit_rate: float = 20.0         # fichas/s por IP
+    rate_limit_burst: float = 120.0
+    rate_limit_key_rate: float = 50.0     # fichas/s por API key
+    rate_limit_key_burst: float = 300.0
+    rate_limit_max_clients: int = 10000
+    rate_limit_workers: int = 1           # default: WEB_CONCURRENCY
+    # "nombre:clave,nombre2:clave2" -> el cliente se identifica por nombre (header X-API-Key)
+    rate_limit_api_keys: str = ""
+
+    # --- Slowlog (slowlog.py) ---
+    slowlog_enabled: bool = False
+    slowlog_ms: float = 1000.0
+    slowlog_keep: int = 100
+    slowlog_max_calls: int = 20        # llamadas upstream por entrada
+    slowlog_max_value: int = 300       # largo máximo de cada parámetro
+
+    # --- Importación (imports.py) ---
+    import_retries: int = 2
+    imports_dir: str = os.path.join(_HERE, "instance", "imports")
+    import_batch_size: int = 1000
+    import_workers: int = 4
+    import_max_bytes: int = 200 * 1024 * 1024
+    import_max_errors: int = 10000       # más errores = se aborta
+
+    # --- Novedades ---
+    novedades_table: str = "novedades"
+    novedades_refresh_s: float = 30.0
+    novedades_full_reload_s: float = 3600.0
+    novedades_max_page_size: int = 100
+    novedades_page_cache: int = 256
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] | None = None, worker_class: str | None = None) -> "Settings":
+        env = os.environ if env is None else env
+        g = env.get
+        read_mode = (g("AFILIADOS_READ_MODE") or "supabase").strip().lower()
+        worker_class = worker_class or cls.worker_class
+        threads = int(g("GUNICORN_THREADS", cls.gunicorn_threads))
+        # El pool a Supabase acompaña al modelo de concurrencia: con gevent las
+        # greenlets que sobran esperan una conexión libre; con gthread, una por hilo
+        pool_default = {"gevent": 100, "gthread": threads}.get(worker_class, cls.pool_maxsize)
+        pool_maxsize = int(g("SUPABASE_POOL_MAXSIZE") or pool_default)
+        return cls(
+            app_name=g("APP_NAME", cls.app_name),
+            app_version=g("APP_VERSION", cls.app_version),
+            cors_origins=_list(g("CORS_ORIGINS", ",".join(cls.cors_origins))),
+            log_level=g("LOG_LEVEL", cls.log_level),
+            metrics_enabled=_flag(env, "METRICS_ENABLED", True),
+            blueprints=_list(g("BLUEPRINTS", ",".join(cls.blueprints))),
+            worker_class=worker_class,
+            admin_token=g("ADMIN_TOKEN") or "",
+            json_provider=(g("JSON_PROVIDER") or cls.json_provider).strip().lower(),
+
+            port=int(g("PORT", cls.port)),
+            web_concurrency=int(g("WEB_CONCURRENCY", cls.web_concurrency)),
+            gunicorn_timeout=int(g("GUNICORN_TIMEOUT", cls.gunicorn_timeout)),
+            gunicorn_keepalive=int(g("GUNICORN_KEEPALIVE", cls.gunicorn_keepalive)),
+            gunicorn_worker_class=(g("GUNICORN_WORKER_CLASS") or "").strip().lower(),
+            gunicorn_worker_connections=int(g("GUNICORN_WORKER_CONNECTIONS", cls.gunicorn_worker_connections)),
+            gunicorn_threads=threads,
+            supabase_prewarm_async=_flag(env, "SUPABASE_PREWARM_ASYNC", False),
+
+            supabase_url=(g("SUPABASE_URL") or "").rstrip("/"),
+            supabase_service_role_key=g("SUPABASE_SERVICE_ROLE_KEY") or "",
+            supabase_table=g("SUPABASE_TABLE", cls.supabase_table),
+            pool_connections=int(g("SUPABASE_POOL_CONNECTIONS", cls.pool_connections)),
+            pool_maxsize=pool_maxsize,
+            pool_block=_flag(env, "SUPABASE_POOL_BLOCK", worker_class == "gevent"),
+            keepalive_idle_s=int(g("SUPABASE_KEEPALIVE_S", cls.keepalive_idle_s)),
+            prewarm_conns=int(g("SUPABASE_PREWARM", cls.prewarm_conns)),
+            breaker_enabled=_flag(env, "BREAKER_ENABLED", True),
+            breaker_window_s=float(g("BREAKER_WINDOW_S", cls.breaker_window_s)),
+            breaker_min_calls=int(g("BREAKER_MIN_CALLS", cls.breaker_min_calls)),
+            breaker_error_rate=float(g("BREAKER_ERROR_RATE", cls.breaker_error_rate)),
+            breaker_slow_call_s=float(g("BREAKER_SLOW_CALL_S", cls.breaker_slow_call_s)),
+            breaker_slow_rate=float(g("BREAKER_SLOW_RATE", cls.breaker_slow_rate)),
+            breaker_open_s=float(g("BREAKER_OPEN_S", cls.breaker_open_s)),
+            breaker_half_open_calls=int(g("BREAKER_HALF_OPEN_CALLS", cls.breaker_half_open_calls)),
+            retry_budget_ratio=float(g("RETRY_BUDGET_RATIO", cls.retry_budget_ratio)),
+            retry_budget_reserve=float(g("RETRY_BUDGET_RESERVE", cls.retry_budget_reserve)),
+            upstream_max_inflight=int(g("UPSTREAM_MAX_INFLIGHT") or pool_maxsize),
+            upstream_max_queue=int(g("UPSTREAM_MAX_QUEUE", cls.upstream_max_queue)),
+            upstream_queue_timeout_s=float(g("UPSTREAM_QUEUE_TIMEOUT_S", cls.upstream_queue_timeout_s)),
+
+            cache_backend=(g("CACHE_BACKEND") or cls.cache_backend).strip().lower(),
+            cache_prefix=g("CACHE_PREFIX", cls.cache_prefix),
+            cache_sqlite_path=g("CACHE_SQLITE_PATH", cls.cache_sqlite_path),
+            cache_redis_url=g("CACHE_REDIS_URL", cls.cache_redis_url),
+            cache_timeout_s=float(g("CACHE_TIMEOUT_S", cls.cache_timeout_s)),
+            cache_version_ttl_s=float(g("CACHE_VERSION_TTL_S", cls.cache_version_ttl_s)),
+            cache_retry_s=float(g("CACHE_RETRY_S", cls.cache_retry_s)),
+            cache_near_ttl_s=float(g("CACHE_NEAR_TTL_S", cls.cache_near_ttl_s)),
+            cache_near_size=int(g("CACHE_NEAR_SIZE", cls.cache_near_size)),
+
+            compress=_flag(env, "COMPRESS", True),
+            compress_min_bytes=int(g("COMPRESS_MIN_BYTES", cls.compress_min_bytes)),
+            compress_level=int(g("COMPRESS_LEVEL", cls.compress_level)),
+            brotli_quality=int(g("BROTLI_QUALITY", cls.brotli_quality)),
+
+            profile_max_s=float(g("PROFILE_MAX_S", cls.profile_max_s)),
+            profile_interval_ms=float(g("PROFILE_INTERVAL_MS", cls.profile_interval_ms)),
+            profile_max_depth=int(g("PROFILE_MAX_DEPTH", cls.profile_max_depth)),
+
+            default_select=g("DEFAULT_SELECT", cls.default_select),
+            max_page_size=int(g("MAX_PAGE_SIZE", cls.max_page_size)),
+            http_timeout=float(g("HTTP_TIMEOUT", cls.http_timeout)),
+            export_chunk_size=int(g("EXPORT_CHUNK_SIZE", cls.export_chunk_size)),
+            lookup_max_dnis=int(g("LOOKUP_MAX_DNIS", cls.lookup_max_dnis)),
+            lookup_chunk=int(g("LOOKUP_CHUNK", cls.lookup_chunk)),
+            lookup_workers=int(g("LOOKUP_WORKERS", cls.lookup_workers)),
+            json_passthrough_min_rows=int(g("JSON_PASSTHROUGH_MIN_ROWS", cls.json_passthrough_min_rows)),
+            changes_page_size=int(g("CHANGES_PAGE_SIZE", cls.changes_page_size)),
+            upstream_microcache_ms=float(g("UPSTREAM_MICROCACHE_MS", cls.upstream_microcache_ms)),
+            allow_dev_no_supa=_flag(env, "ALLOW_DEV_NO_SUPA", True),
+
+            detail_cache_size=int(g("DETAIL_CACHE_SIZE", cls.detail_cache_size)),
+            detail_cache_ttl=float(g("DETAIL_CACHE_TTL", cls.detail_cache_ttl)),
+            detail_cache_neg_ttl=float(g("DETAIL_CACHE_NEG_TTL", cls.detail_cache_neg_ttl)),
+            count_cache_ttl=float(g("COUNT_CACHE_TTL", cls.count_cache_ttl)),
+            suggest_max=int(g("SUGGEST_MAX", cls.suggest_max)),
+            suggest_cache_ttl=float(g("SUGGEST_CACHE_TTL", cls.suggest_cache_ttl)),
+            stats_cache_ttl=float(g("STATS_CACHE_TTL", cls.stats_cache_ttl)),
+            stale_if_error_s=float(g("STALE_IF_ERROR_S", cls.stale_if_error_s)),
+            http_detail_max_age=int(g("HTTP_DETAIL_MAX_AGE", cls.http_detail_max_age)),
+            schema_cache_ttl=float(g("SCHEMA_CACHE_TTL", cls.schema_cache_ttl)),
+
+            read_mode=read_mode,
+            replica_sync=_flag(env, "REPLICA_SYNC", read_mode == "replica"),
+            replica_max_staleness_s=float(g("REPLICA_MAX_STALENESS_S", cls.replica_max_staleness_s)),
+            search_index=_flag(env, "SEARCH_INDEX", True),
+            index_scan=_flag(env, "INDEX_SCAN", False),
+            search_refresh_s=float(g("SEARCH_REFRESH_S", cls.search_refresh_s)),
+            stats_refresh_s=float(g("STATS_REFRESH_S", cls.stats_refresh_s)),
+            replica_path=g("REPLICA_PATH", cls.replica_path),
+            replica_sync_interval_s=float(g("REPLICA_SYNC_INTERVAL_S", cls.replica_sync_interval_s)),
+            replica_full_resync_s=float(g("REPLICA_FULL_RESYNC_S", cls.replica_full_resync_s)),
+            replica_sync_chunk=int(g("REPLICA_SYNC_CHUNK", cls.replica_sync_chunk)),
+
+            rate_limit_enabled=_flag(env, "RATE_LIMIT_ENABLED", False),
+            rate_limit_rate=float(g("RATE_LIMIT_RATE", cls.rate_limit_rate)),
+            rate_limit_burst=float(g("RATE_LIMIT_BURST", cls.rate_limit_burst)),
+            rate_limit_key_rate=float(g("RATE_LIMIT_KEY_RATE", cls.rate_limit_key_rate)),
+            rate_limit_key_burst=float(g("RATE_LIMIT_KEY_BURST", cls.rate_limit_key_burst)),
+            rate_limit_max_clients=int(g("RATE_LIMIT_MAX_CLIENTS", cls.rate_limit_max_clients)),
+            rate_limit_workers=max(1, int(g("RATE_LIMIT_WORKERS") or g("WEB_CONCURRENCY") or cls.rate_limit_workers)),
+            rate_limit_api_keys=g("RATE_LIMIT_API_KEYS", cls.rate_limit_api_keys),
+
+            slowlog_enabled=_flag(env, "SLOWLOG_ENABLED", False),
+            slowlog_ms=float(g("SLOWLOG_MS", cls.slowlog_ms)),
+            slowlog_keep=int(g("SLOWLOG_KEEP", cls.slowlog_keep)),
+            slowlog_max_calls=int(g("SLOWLOG_MAX_CALLS", cls.slowlog_max_calls)),
+            slowlog_max_value=int(g("SLOWLOG_MAX_VALUE", cls.slowlog_max_value)),
+
+            import_retries=int(g("IMPORT_RETRIES", cls.import_retries)),
+            imports_dir=g("IMPORTS_DIR", cls.imports_dir),
+            import_batch_size=int(g("IMPORT_BATCH_SIZE", cls.import_batch_size)),
+            import_workers=int(g("IMPORT_WORKERS", cls.import_workers)),
+            import_max_bytes=int(g("IMPORT_MAX_BYTES", cls.import_max_bytes)),
+            import_max_errors=int(g("IMPORT_MAX_ERRORS", cls.import_max_errors)),
+
+            novedades_table=g("NOVEDADES_TABLE", cls.novedades_table),
+            novedades_refresh_s=float(g("NOVEDADES_REFRESH_S", cls.novedades_refresh_s)),
+            novedades_full_reload_s=float(g("NOVEDADES_FULL_RELOAD_S", cls.novedades_full_reload_s)),
+            novedades_max_page_size=int(g("NOVEDADES_MAX_PAGE_SIZE", cls.novedades_max_page_size)),
+            novedades_page_cache=int(g("NOVEDADES_PAGE_CACHE", cls.novedades_page_cache)),
+        )
+
+
+_settings: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """Settings del proceso; la primera llamada carga el .env (sin pisar variables ya definidas)."""
+    global _settings
+    if _settings is None:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _settings = Settings.from_env()
+    return _settings
+
+
+def use_worker_class(worker_class: str) -> Settings:
+    """Rearma las Settings del proceso para esa clase de worker (defaults del pool
+    a Supabase incluidos). La llama gunicorn.conf.py en el master, antes del fork."""
+    global _settings
+    get_settings()
+    _settings = Settings.from_env(worker_class=worker_class)
+    return _settings
@@ -0,0 +1,548 @@
+# backend/shared_cache.py — Caché compartida entre workers (SQLite en disco o Redis)
+#
+# Con TTLCache (cache.py) cada worker de gunicorn guarda lo suyo: la misma
+# consulta se hace N veces y cada deploy arranca N cachés frías. make_cache()
+# devuelve, según CACHE_BACKEND:
+#   local  — TTLCache del proceso (por defecto, lo de siempre)
+#   sqlite — un archivo compartido por los workers de la máquina (WAL)
+#   redis  — un Redis (o cualquier servidor que hable RESP), compartido entre máquinas
+# Todas tienen la misma interfaz: get / get_stale / set / get_or_load / delete /
+# delete_group / clear / stats.
+#
+# En las compartidas cada clave lleva la versión de su caché
+# (<prefijo>:<caché>:<versión>:<hash>): clear() es un INCR del contador y las
+# claves viejas vencen solas. Los otros workers ven la versión nueva en
+# CACHE_VERSION_TTL_S (y sus copias locales vencen en CACHE_NEAR_TTL_S). Los
+# valores se guardan con marshal (binario, compacto, sin ejecutar código al
+# leer) detrás de un encabezado con el vencimiento "fresco"; el backend los
+# conserva hasta vencimiento + stale_ttl. Si el backend falla, la caché se
+# comporta como vacía durante CACHE_RETRY_S: nunca rompe un request.
+#
+# Con `group` (p. ej. el DNI de una clave (dni, select)) cada set() anota la
+# clave en un conjunto del grupo en el backend, y delete_group() borra
+# exactamente esas claves sin tocar el resto de la caché.
+from __future__ import annotations
+
+import hashlib
+import logging
+import marshal
+import os
+import queue
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Callable, Hashable
+from urllib.parse import urlsplit
+
+from cache import SingleFlight, TTLCache, _instances
+from settings import get_settings
+
+log = logging.getLogger("shared_cache")
+
+_cfg = get_settings()
+
+CACHE_BACKEND       = _cfg.cache_backend
+CACHE_PREFIX        = _cfg.cache_prefix
+CACHE_SQLITE_PATH   = _cfg.cache_sqlite_path
+CACHE_REDIS_URL     = _cfg.cache_redis_url
+CACHE_TIMEOUT_S     = _cfg.cache_timeout_s
+CACHE_VERSION_TTL_S = _cfg.cache_version_ttl_s
+CACHE_RETRY_S       = _cfg.cache_retry_s
+# Copia local de lo leído del backend: las claves calientes no pagan el viaje en
+# cada request. Como la clave incluye la versión, un clear() la invalida igual
+CACHE_NEAR_TTL_S    = _cfg.cache_near_ttl_s
+CACHE_NEAR_SIZE     = _cfg.cache_near_size
+
+
+# -----------------------------
+# Formato: <B formato><d vencimiento epoch> + marshal(valor)
+# -----------------------------
+_HEADER = struct.Struct("<Bd")
+_FORMAT = marshal.version
+
+
+def encode(value: Any, fresh_until: float) -> bytes:
+    """ValueError si el valor tiene tipos que marshal no admite (fechas, objetos)."""
+    return _HEADER.pack(_FORMAT, fresh_until) + marshal.dumps(value)
+
+
+def decode(raw: bytes) -> tuple[float, Any]:
+    fmt, fresh_until = _HEADER.unpack_from(raw)
+    if fmt != _FORMAT:
+        raise ValueError(f"formato {fmt} (se esperaba {_FORMAT})")
+    return fresh_until, marshal.loads(raw[_HEADER.size:])
+
+
+def _digest(key: Hashable) -> str:
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+class CacheBackendError(Exception):
+    """Error reportado por el servidor de caché."""
+
+
+# -----------------------------
+# Backend SQLite (misma máquina)
+# -----------------------------
+class SqliteBackend:
+    kind = "sqlite"
+    PURGE_EVERY = 500   # cada tantos set() se borran los vencidos
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, timeout: float = CACHE_TIMEOUT_S):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sets = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v BLOB NOT NULL, exp REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_exp ON cache (exp)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (k TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS members (k TEXT NOT NULL, m TEXT NOT NULL, exp REAL NOT NULL, "
+                "PRIMARY KEY (k, m))"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> bytes | None:
+        row = self._conn().execute("SELECT v FROM cache WHERE k = ? AND exp > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO cache (k, v, exp) VALUES (?, ?, ?)", (key, value, now + ttl))
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE exp <= ?", (now,))
+            conn.execute("DELETE FROM members WHERE exp <= ?", (now,))
+
+    def delete(self, key: str) -> bool:
+        return self._conn().execute("DELETE FROM cache WHERE k = ?", (key,)).rowcount > 0
+
+    def incr(self, key: str) -> int:
+        row = self._conn().execute(
+            "INSERT INTO counters (k, n) VALUES (?, 1) ON CONFLICT (k) DO UPDATE SET n = n + 1 RETURNING n", (key,)
+        ).fetchone()
+        return int(row[0])
+
+    def get_int(self, key: str) -> int:
+        row = self._conn().execute("SELECT n FROM counters WHERE k = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def add_member(self, key: str, member: str, ttl: float):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO members (k, m, exp) VALUES (?, ?, ?)", (key, member, time.time() + ttl)
+        )
+
+    def pop_members(self, key: str) -> list[str]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT m FROM members WHERE k = ? AND exp > ?", (key, time.time())).fetchall()
+            conn.execute("DELETE FROM members WHERE k = ?", (key,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [r[0] for r in rows]
+
+    def info(self) -> dict:
+        return {"backend": self.kind, "path": self.path}
+
+
+# -----------------------------
+# Backend Redis (protocolo RESP, sin dependencias)
+# -----------------------------
+def _pack(args: tuple) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for a in args:
+        b = a if isinstance(a, bytes) else str(a).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+    return b"".join(out)
+
+
+def _read_reply(f):
+    line = f.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("conexión cerrada por el servidor de caché")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body
+    if kind == b"-":
+        raise CacheBackendError(body.decode(errors="replace"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        n = int(body)
+        if n < 0:
+            return None
+        data = f.read(n + 2)
+        if len(data) != n + 2:
+            raise ConnectionError("respuesta incompleta del servidor de caché")
+        return data[:-2]
+    if kind == b"*":
+        n = int(body)
+        return None if n < 0 else [_read_reply(f) for _ in range(n)]
+    raise ConnectionError(f"respuesta RESP inválida: {line[:20]!r}")
+
+
+class _RedisConn:
+    __slots__ = ("sock", "rfile", "pid")
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.rfile = sock.makefile("rb")
+        self.pid = os.getpid()
+
+    def call(self, *args):
+        self.sock.sendall(_pack(args))
+        return _read_reply(self.rfile)
+
+    def close(self):
+        try:
+            self.rfile.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """Cliente RESP mínimo (GET/SET PX/DEL/INCR/SADD/SMEMBERS) con un pool de conexiones por proceso.
+
+    url: redis://[[usuario]:clave@]host[:puerto][/db]"""
+
+    kind = "redis"
+    MAX_IDLE = 32
+
+    def __init__(self, url: str = CACHE_REDIS_URL, timeout: float = CACHE_TIMEOUT_S):
+        u = urlsplit(url)
+        self.url = url
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or 6379
+        self.db = int((u.path or "/").lstrip("/") or 0)
+        self.username = u.username or None
+        self.password = u.password or None
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[_RedisConn] = queue.LifoQueue()
+        self._pid = os.getpid()
+
+    def _connect(self) -> _RedisConn:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = _RedisConn(sock)
+        try:
+            if self.password:
+                conn.call(*(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password)))
+            if self.db:
+                conn.call("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _call(self, *args):
+        if self._pid != os.getpid():   # después de un fork: no compartir sockets con el padre
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            reply = conn.call(*args)
+        except CacheBackendError:
+            self._release(conn)   # error del comando: la conexión sigue sincronizada
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn)
+        return reply
+
+    def _release(self, conn: _RedisConn):
+        if self._idle.qsize() < self.MAX_IDLE:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def get(self, key: str) -> bytes | None:
+        return self._call("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._call("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> bool:
+        return self._call("DEL", key) > 0
+
+    def incr(self, key: str) -> int:
+        return self._call("INCR", key)
+
+    def get_int(self, key: str) -> int:
+        raw = self._call("GET", key)
+        return int(raw) if raw is not None else 0
+
+    def add_member(self, key: str, member: str, ttl: float):
+        self._call("SADD", key, member)
+        self._call("PEXPIRE", key, max(1, int(ttl * 1000)))
+
+    def pop_members(self, key: str) -> list[str]:
+        members = self._call("SMEMBERS", key) or []
+        self._call("DEL", key)
+        return [m.decode() for m in members]
+
+    def info(self) -> dict:
+        return {"backend": self.kind, "host": self.host, "port": self.port, "db": self.db}
+
+
+# -----------------------------
+# Caché sobre un backend compartido
+# -----------------------------
+class SharedCache:
+    """Misma interfaz que TTLCache, sobre un backend compartido entre procesos.
+
+    No se pueden recorrer las claves: delete_where() y clear() invalidan la caché
+    entera subiendo la versión (y devuelven 0). Para borrar por partes está
+    `group`: delete_group() borra exactamente las claves de un grupo."""
+
+    def __init__(self, name: str, backend, ttl: float = 60.0, stale_ttl: float = 0.0,
+                 prefix: str = CACHE_PREFIX, version_ttl: float = CACHE_VERSION_TTL_S,
+                 retry_s: float = CACHE_RETRY_S, near_ttl: float = CACHE_NEAR_TTL_S,
+                 near_size: int = CACHE_NEAR_SIZE, group: Callable[[Hashable], Hashable] | None = None):
+        self.name = name
+        self.group = group
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = max(0.0, stale_ttl)
+        self.version_ttl = version_ttl
+        self.retry_s = retry_s
+        self._base = f"{prefix}:{name}"
+        self._ver_key = f"{self._base}:ver"
+        self._version: int | None = None
+        self._version_at = 0.0
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._near = TTLCache(f"{name}_near", maxsize=near_size, ttl=near_ttl) if near_ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.sets = 0
+        self.errors = 0
+        self.skipped = 0         # operaciones salteadas con el backend caído
+        self.encode_errors = 0   # valores que marshal no admite (no se guardan)
+        self.last_error: str | None = None
+        _instances.add(self)
+
+    # -----------------------------
+    # Backend
+    # -----------------------------
+    def _do(self, op: str, *args):
+        """Llama al backend; si falla, lo saltea `retry_s` segundos y devuelve None."""
+        if time.monotonic() < self._down_until:
+            with self._lock:
+                self.skipped += 1
+            return None
+        try:
+            return getattr(self.backend, op)(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self.last_error = f"{op}: {e}"
+            self._down_until = time.monotonic() + self.retry_s
+            log.warning("Caché %s (%s) no disponible por %.0fs: %s", self.name, self.backend.kind, self.retry_s, e)
+            return None
+
+    def _current_version(self) -> int:
+        now = time.monotonic()
+        if self._version is None or now - self._version_at >= self.version_ttl:
+            v = self._do("get_int", self._ver_key)
+            if v is not None:
+                self._version = v
+            self._version_at = now
+        return self._version or 0
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self._base}:{self._current_version()}:{_digest(key)}"
+
+    def _lookup(self, key: Hashable, near: bool = True) -> tuple[float, Any] | None:
+        k = self._key(key)
+        if near and self._near is not None:
+            found, item = self._near.get(k)
+            if found:
+                return item
+        raw = self._do("get", k)
+        if raw is None:
+            return None
+        try:
+            item = decode(raw)
+        except Exception:
+            return None   # otro formato (otra versión de Python): cuenta como miss
+        if self._near is not None and item[0] > time.time():
+            self._near.set(k, item, min(self._near.ttl, item[0] - time.time()))
+        return item
+
+    # -----------------------------
+    # API (la de TTLCache)
+    # -----------------------------
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        item = self._lookup(key)
+        with self._lock:
+            if item is None or item[0] <= time.time():
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, item[1]
+
+    def get_stale(self, key: Hashable) -> tuple[bool, Any]:
+        """Como get(), pero acepta entradas vencidas dentro de `stale_ttl`."""
+        item = self._lookup(key, near=False)
+        if item is None:
+            return False, None
+        with self._lock:
+            self.stale_hits += 1
+        return True, item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        try:
+            raw = encode(value, time.time() + ttl)
+        except ValueError:
+            with self._lock:
+                self.encode_errors += 1
+            return
+        k = self._key(key)
+        self._do("set", k, raw, ttl + self.stale_ttl)
+        if self.group is not None:
+            # El conjunto vive tanto como la entrada más larga que pueda tener
+            self._do("add_member", self._group_key(self.group(key)), k, max(ttl, self.ttl) + self.stale_ttl)
+        if self._near is not None:
+            self._near.delete(k)
+        with self._lock:
+            self.sets += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl_for: Callable[[Any], float] | None = None,
+    ) -> tuple[Any, bool]:
+        """Devuelve (valor, hit). El single-flight es por proceso: entre workers
+        puede haber una carga repetida, no una estampida."""
+        hit, value = self.get(key)
+        if hit:
+            return value, True
+
+        def _load():
+            item = self._lookup(key, near=False)   # otro hilo o worker pudo haberla cargado
+            if item is not None and item[0] > time.time():
+                return item[1]
+            v = loader()
+            self.set(key, v, ttl_for(v) if ttl_for else None)
+            return v
+
+        value, _ = self._flight.do(key, _load)
+        return value, False
+
+    def delete(self, key: Hashable) -> bool:
+        k = self._key(key)
+        if self._near is not None:
+            self._near.delete(k)
+        return bool(self._do("delete", k))
+
+    def _group_key(self, group: Hashable) -> str:
+        return f"{self._base}:{self._current_version()}:g:{_digest(group)}"
+
+    def delete_group(self, group: Hashable) -> int:
+        """Borra las entradas del grupo; devuelve cuántas seguían guardadas."""
+        if self.group is None:
+            raise TypeError(f"la caché {self.name} no tiene `group`")
+        members = self._do("pop_members", self._group_key(group)) or []
+        removed = 0
+        for k in members:
+            if self._near is not None:
+                self._near.delete(k)
+            if self._do("delete", k):
+                removed += 1
+        return removed
+
+    def delete_where(self, pred: Callable[[Hashable], bool]) -> int:
+        self.clear()
+        return 0
+
+    def clear(self) -> int:
+        v = self._do("incr", self._ver_key)
+        if v is not None:
+            self._version = v
+            self._version_at = time.monotonic()
+        if self._near is not None:
+            self._near.clear()
+        return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                **self.backend.info(),
+                "version": self._version or 0,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "sets": self.sets,
+                "stale_ttl_s": self.stale_ttl,
+                "stale_hits": self.stale_hits,
+                "stampedes_avoided": self._flight.shared,
+                "errors": self.errors,
+                "skipped": self.skipped,
+                "encode_errors": self.encode_errors,
+                "last_error": self.last_error,
+            }
+
+
+# -----------------------------
+# Fábrica
+# -----------------------------
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Backend compartido del proceso (None con CACHE_BACKEND=local)."""
+    global _backend
+    if CACHE_BACKEND in {"", "local", "memory"}:
+        return None
+    with _backend_lock:
+        if _backend is None:
+            if CACHE_BACKEND == "sqlite":
+                _backend = SqliteBackend()
+            elif CACHE_BACKEND == "redis":
+                _backend = RedisBackend()
+            else:
+                log.warning("CACHE_BACKEND=%r desconocido: se usa la caché local", CACHE_BACKEND)
+                return None
+        return _backend
+
+
+def make_cache(name: str, maxsize: int = 1024, ttl: float = 60.0, stale_ttl: float = 0.0,
+               group: Callable[[Hashable], Hashable] | None = None):
+    """TTLCache del proceso o SharedCache, según CACHE_BACKEND (maxsize sólo aplica a la local).
+
+    group: función clave -> grupo, para poder invalidar con delete_group()."""
+    backend = get_backend()
+    if backend is None:
+        return TTLCache(name, maxsize=maxsize, ttl=ttl, stale_ttl=stale_ttl, group=group)
+    return SharedCache(name, backend, ttl=ttl, stale_ttl=stale_ttl, group=group)
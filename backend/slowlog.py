@@ -0,0 +1,149 @@
+# backend/slowlog.py — Log de requests lentos con desglose de tiempos
+#
+# Con SLOWLOG_ENABLED=1 cada request se traza (metrics.begin_request(trace=True)):
+# se mide cuánto tardan los hooks antes de la vista, la vista, las llamadas a
+# Supabase (con sus parámetros exactos), el r.json(), el jsonify, el ETag y los
+# hooks posteriores (incluida la compresión). Los que superan SLOWLOG_MS se
+# escriben en el logger "slowlog" como una línea JSON y quedan en un buffer
+# circular (últimos SLOWLOG_KEEP) que se ve en /api/_slowlog.
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from flask import Flask, g, request
+
+import metrics
+from settings import get_settings
+
+_cfg = get_settings()
+
+SLOWLOG_ENABLED   = _cfg.slowlog_enabled
+SLOWLOG_MS        = _cfg.slowlog_ms
+SLOWLOG_KEEP      = _cfg.slowlog_keep
+SLOWLOG_MAX_CALLS = _cfg.slowlog_max_calls
+SLOWLOG_MAX_VALUE = _cfg.slowlog_max_value
+
+log = logging.getLogger("slowlog")
+
+_lock = threading.Lock()
+_entries: deque[dict] = deque(maxlen=max(1, SLOWLOG_KEEP))
+_seen = 0
+_logged = 0
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def _clip(v) -> str:
+    v = str(v)
+    return v if len(v) <= SLOWLOG_MAX_VALUE else v[:SLOWLOG_MAX_VALUE] + "…"
+
+
+def _params(params) -> list | dict | None:
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: _clip(v) for k, v in params.items()}
+    return [[k, _clip(v)] for k, v in params]
+
+
+# -----------------------------
+# Integración con Flask
+# -----------------------------
+def _timed_view(view):
+    @functools.wraps(view)   # copia también _rate_cost (ratelimit.py)
+    def wrapper(*args, **kwargs):
+        timing = metrics.current()
+        if timing is None or timing.phases is None:
+            return view(*args, **kwargs)
+        t0 = time.perf_counter()
+        timing.phases["before"] = t0 - timing.t0
+        try:
+            return view(*args, **kwargs)
+        finally:
+            timing.phases["view"] = time.perf_counter() - t0
+
+    return wrapper
+
+
+def init_app(app: Flask):
+    """Envuelve las vistas ya registradas para medir hooks vs. vista; llamar
+    después de registrar los blueprints."""
+    if not SLOWLOG_ENABLED:
+        return
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint != "static":
+            app.view_functions[endpoint] = _timed_view(view)
+
+
+def observe(timing: metrics.RequestTiming, resp) -> dict | None:
+    """Cierra la traza del request; si pasó el umbral la registra y la devuelve."""
+    global _seen, _logged
+    if timing.phases is None:
+        return None
+    total = time.perf_counter() - timing.t0
+    with _lock:
+        _seen += 1
+    if total * 1000 < SLOWLOG_MS:
+        return None
+
+    ph = timing.phases
+    view = ph.get("view")
+    breakdown = {
+        "before": _ms(ph.get("before", total)),
+        "view": _ms(view) if view is not None else None,
+        "upstream": _ms(timing.upstream_s),
+        "coalesced": _ms(timing.waited_s),
+        "decode": _ms(ph.get("decode", 0.0)),
+        "serialize": _ms(ph.get("serialize", 0.0)),
+        "etag": _ms(ph.get("etag", 0.0)),
+    }
+    if view is not None:
+        # Lo que queda de la vista: filtros, cachés, armado del payload
+        inner = timing.upstream_s + timing.waited_s + sum(ph.get(k, 0.0) for k in ("decode", "serialize", "etag"))
+        breakdown["view_other"] = _ms(max(0.0, view - inner))
+        breakdown["after"] = _ms(max(0.0, total - ph.get("before", 0.0) - view))
+
+    calls = timing.calls or []
+    entry = {
+        "ts": round(time.time(), 3),
+        "request_id": g.get("request_id", "-"),
+        "method": request.method,
+        "route": request.url_rule.rule if request.url_rule is not None else "unmatched",
+        "path": request.path,
+        "query": _clip(request.query_string.decode("latin-1")),
+        "status": resp.status_code,
+        "streamed": resp.is_streamed,
+        "total_ms": _ms(total),
+        "phases_ms": breakdown,
+        "upstream_calls": timing.upstream_calls,
+        "upstream": [
+            {**c, "params": _params(c.get("params"))} for c in calls[:SLOWLOG_MAX_CALLS]
+        ],
+        "pid": os.getpid(),
+    }
+    with _lock:
+        _entries.append(entry)
+        _logged += 1
+    log.warning("slow request %s", json.dumps(entry, ensure_ascii=False, default=str))
+    return entry
+
+
+def status(limit: int = 50) -> dict:
+    with _lock:
+        entries = list(_entries)[-limit:] if limit > 0 else []
+        return {
+            "enabled": SLOWLOG_ENABLED,
+            "threshold_ms": SLOWLOG_MS,
+            "pid": os.getpid(),
+            "traced": _seen,
+            "slow": _logged,
+            "entries": entries[::-1],
+        }
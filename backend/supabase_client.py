@@ -0,0 +1,254 @@
+# backend/supabase_client.py — Cliente HTTP a Supabase compartido por todo el proceso
+#
+# Una sola requests.Session (con su pool de conexiones keep-alive) por proceso.
+# Es segura ante fork (gunicorn): el hijo descarta el pool heredado y arma uno
+# propio en el primer uso. Expone estadísticas del pool para verificar reuso.
+# Todas las llamadas pasan por un circuit breaker (breaker.py) y los reintentos
+# de urllib3 consumen un presupuesto compartido; las llamadas en vuelo están
+# acotadas por una AdmissionGate con cola corta. Las clases que extienden
+# requests/urllib3 viven en supabase_http.py, que se importa recién al armar la
+# primera sesión: importar este módulo no carga requests.
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from breaker import AdmissionGate, CircuitBreaker, CircuitOpenError, RetryBudget
+from settings import get_settings
+
+if TYPE_CHECKING:
+    import requests
+
+_cfg = get_settings()
+
+POOL_CONNECTIONS = _cfg.pool_connections
+POOL_MAXSIZE     = _cfg.pool_maxsize
+POOL_BLOCK       = _cfg.pool_block
+KEEPALIVE_IDLE_S = _cfg.keepalive_idle_s
+PREWARM_CONNS    = _cfg.prewarm_conns
+
+# Circuit breaker: se abre si en la ventana hay >= MIN_CALLS llamadas y la
+# proporción de errores (5xx/429/red) o de llamadas lentas supera el umbral.
+BREAKER_ENABLED         = _cfg.breaker_enabled
+BREAKER_WINDOW_S        = _cfg.breaker_window_s
+BREAKER_MIN_CALLS       = _cfg.breaker_min_calls
+BREAKER_ERROR_RATE      = _cfg.breaker_error_rate
+BREAKER_SLOW_CALL_S     = _cfg.breaker_slow_call_s
+BREAKER_SLOW_RATE       = _cfg.breaker_slow_rate
+BREAKER_OPEN_S          = _cfg.breaker_open_s
+BREAKER_HALF_OPEN_CALLS = _cfg.breaker_half_open_calls
+# Reintentos: como mucho RETRY_BUDGET_RATIO reintentos por request (más una reserva)
+RETRY_BUDGET_RATIO      = _cfg.retry_budget_ratio
+RETRY_BUDGET_RESERVE    = _cfg.retry_budget_reserve
+# Admisión: como mucho UPSTREAM_MAX_INFLIGHT llamadas a la vez por proceso (0 =
+# sin límite); hasta UPSTREAM_MAX_QUEUE esperan UPSTREAM_QUEUE_TIMEOUT_S y el
+# resto falla enseguida (503 + Retry-After)
+UPSTREAM_MAX_INFLIGHT     = _cfg.upstream_max_inflight
+UPSTREAM_MAX_QUEUE        = _cfg.upstream_max_queue
+UPSTREAM_QUEUE_TIMEOUT_S  = _cfg.upstream_queue_timeout_s
+
+
+# -----------------------------
+# Estadísticas del pool
+# -----------------------------
+class _PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.created = 0      # objetos de conexión creados
+        self.new = 0          # checkouts que requirieron handshake TCP+TLS
+        self.reused = 0       # checkouts sobre un socket ya abierto
+        self.in_use = 0
+
+    def on_checkout(self, reused: bool):
+        with self._lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.new += 1
+            self.in_use += 1
+
+    def on_checkin(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def on_create(self):
+        with self._lock:
+            self.created += 1
+
+
+_stats = _PoolStats()
+
+
+# -----------------------------
+# Circuit breaker y presupuesto de reintentos
+# -----------------------------
+_breaker = CircuitBreaker(
+    "supabase",
+    window_s=BREAKER_WINDOW_S,
+    min_calls=BREAKER_MIN_CALLS,
+    error_rate=BREAKER_ERROR_RATE,
+    slow_call_s=BREAKER_SLOW_CALL_S,
+    slow_rate=BREAKER_SLOW_RATE,
+    open_s=BREAKER_OPEN_S,
+    half_open_calls=BREAKER_HALF_OPEN_CALLS,
+)
+_retry_budget = RetryBudget(ratio=RETRY_BUDGET_RATIO, cap=RETRY_BUDGET_RESERVE)
+_gate = AdmissionGate(
+    "supabase",
+    max_inflight=UPSTREAM_MAX_INFLIGHT,
+    max_queue=UPSTREAM_MAX_QUEUE,
+    queue_timeout_s=UPSTREAM_QUEUE_TIMEOUT_S,
+)
+
+
+# -----------------------------
+# Sesión por proceso
+# -----------------------------
+_lock = threading.Lock()
+_client: tuple[str, str, requests.Session] | None = None
+_client_pid: int | None = None
+
+
+def _config() -> tuple[str, str | None, str]:
+    return _cfg.supabase_url, _cfg.supabase_service_role_key or None, _cfg.supabase_table
+
+
+def get_client():
+    """Devuelve (url, tabla, sesión) compartidos por el proceso, o (None, None, None)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+
+    url, s_key, table = _config()
+    if not url or not s_key:
+        return None, None, None
+
+    with _lock:
+        if _client is None or _client_pid != pid:
+            from supabase_http import build_session
+
+            _client = (url, table, build_session(s_key))
+            _client_pid = pid
+        return _client
+
+
+def reset():
+    """Cierra y descarta la sesión actual (p. ej. tras rotar credenciales)."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            try:
+                _client[2].close()
+            except Exception:
+                pass
+        _client = None
+        _client_pid = None
+        _stats.reset()
+
+
+def _after_fork_in_child():
+    # No cerramos los sockets heredados: siguen siendo del padre.
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+    _stats.__init__()
+    _breaker.reset()
+    _retry_budget.reset()
+    _gate.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def warm(n: int | None = None, timeout: float = 5.0) -> int:
+    """Abre `n` conexiones en paralelo para que el primer request no pague el handshake."""
+    n = PREWARM_CONNS if n is None else n
+    url, table, sess = get_client()
+    if not sess or n <= 0:
+        return 0
+    from requests.exceptions import RequestException
+
+    def _hit(_):
+        try:
+            r = sess.get(
+                f"{url}/rest/v1/{table}",
+                params=[("select", "id"), ("limit", "1")],
+                timeout=timeout,
+            )
+            return r.ok
+        except (RequestException, CircuitOpenError):
+            return False
+
+    n = min(n, POOL_MAXSIZE)
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        return sum(1 for ok in ex.map(_hit, range(n)) if ok)
+
+
+def pool_stats() -> dict:
+    """Conexiones abiertas/ociosas y contadores de reuso del proceso actual."""
+    idle = 0
+    pools = 0
+    client = _client if _client_pid == os.getpid() else None
+    if client is not None:
+        # El mismo adapter está montado en http:// y https://
+        adapters = {id(a): a for a in client[2].adapters.values()}
+        for adapter in adapters.values():
+            pm = getattr(adapter, "poolmanager", None)
+            if pm is None:
+                continue
+            for key in list(pm.pools.keys()):
+                pool = pm.pools.get(key)
+                if pool is None or pool.pool is None:
+                    continue
+                pools += 1
+                idle += sum(1 for c in list(pool.pool.queue) if c is not None and getattr(c, "sock", None) is not None)
+
+    with _stats._lock:
+        checkouts = _stats.new + _stats.reused
+        return {
+            "pid": os.getpid(),
+            "configured": client is not None,
+            "pool_maxsize": POOL_MAXSIZE,
+            "pools": pools,
+            "open": idle + _stats.in_use,
+            "idle": idle,
+            "in_use": _stats.in_use,
+            "created": _stats.created,
+            "new": _stats.new,
+            "reused": _stats.reused,
+            "reuse_ratio": round(_stats.reused / checkouts, 4) if checkouts else None,
+        }
+
+
+def upstream_available() -> bool:
+    """False mientras el circuito está abierto: conviene no intentar (ni esperar) nada."""
+    return not BREAKER_ENABLED or not _breaker.is_open()
+
+
+def fail_fast():
+    """Lanza CircuitOpenError si el circuito está abierto."""
+    if not upstream_available():
+        raise CircuitOpenError(_breaker.name, _breaker.retry_after())
+
+
+def breaker_status() -> dict:
+    """Estado del circuit breaker y del presupuesto de reintentos del proceso actual."""
+    return {
+        "enabled": BREAKER_ENABLED,
+        **_breaker.status(),
+        "retry_budget": _retry_budget.status(),
+    }
+
+
+def gate_status() -> dict:
+    """Llamadas en vuelo / en cola hacia Supabase y rechazos de la admisión."""
+    return _gate.status()
@@ -0,0 +1,159 @@
+# backend/supabase_http.py — Sesión requests/urllib3 hacia Supabase
+#
+# Separado de supabase_client.py para que requests y urllib3 (~80 ms de import)
+# se carguen recién con la primera sesión y no en el arranque del worker.
+from __future__ import annotations
+
+import socket
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+import metrics
+from breaker import CircuitOpenError, UpstreamBusyError
+from supabase_client import (
+    BREAKER_ENABLED, KEEPALIVE_IDLE_S, POOL_BLOCK, POOL_CONNECTIONS, POOL_MAXSIZE,
+    _breaker, _gate, _retry_budget, _stats,
+)
+
+
+# -----------------------------
+# Pool con contadores
+# -----------------------------
+class _CountingPoolMixin:
+    def _new_conn(self):
+        _stats.on_create()
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        _stats.on_checkout(reused=getattr(conn, "sock", None) is not None)
+        return conn
+
+    def _put_conn(self, conn):
+        _stats.on_checkin()
+        return super()._put_conn(conn)
+
+
+class _CountingHTTPPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+def _socket_options() -> list[tuple]:
+    opts = list(HTTPConnection.default_socket_options)
+    if KEEPALIVE_IDLE_S <= 0:
+        return opts
+    opts.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # Constantes no disponibles en todas las plataformas (p. ej. macOS/Windows)
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        opts.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE_S))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        opts.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, KEEPALIVE_IDLE_S // 4)))
+    if hasattr(socket, "TCP_KEEPCNT"):
+        opts.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4))
+    return opts
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", _socket_options())
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPPool,
+            "https": _CountingHTTPSPool,
+        }
+
+
+# -----------------------------
+# Reintentos con presupuesto, métricas y circuit breaker
+# -----------------------------
+class _BudgetRetry(Retry):
+    """Retry que sólo reintenta si queda presupuesto; si no, devuelve el error tal cual."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if not _retry_budget.try_spend():
+            # Con raise_on_status=False urllib3 devuelve la respuesta; sin respuesta, requests lo convierte en error
+            raise MaxRetryError(_pool, url, error or ResponseError("presupuesto de reintentos agotado"))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _upstream_ok(status: int) -> bool:
+    return status < 500 and status != 429
+
+
+class _TimedSession(requests.Session):
+    """Registra en metrics.py cada llamada (duración total con reintentos, bytes y reintentos)
+    y la pasa por la admisión (_gate) y el circuit breaker: con demasiadas llamadas
+    en vuelo o con el circuito abierto falla al instante."""
+
+    def request(self, method, url, *args, **kwargs):
+        try:
+            _gate.acquire()
+        except UpstreamBusyError:
+            metrics.upstream_errors.inc(1, "UpstreamBusy")
+            raise
+        try:
+            return self._request(method, url, *args, **kwargs)
+        finally:
+            _gate.release()
+
+    def _request(self, method, url, *args, **kwargs):
+        if BREAKER_ENABLED and not _breaker.allow():
+            metrics.upstream_errors.inc(1, "CircuitOpen")
+            raise CircuitOpenError(_breaker.name, _breaker.retry_after())
+        _retry_budget.deposit()
+        t0 = time.perf_counter()
+        try:
+            r = super().request(method, url, *args, **kwargs)
+        except BaseException as e:
+            secs = time.perf_counter() - t0
+            if BREAKER_ENABLED:
+                _breaker.record(False, secs, type(e).__name__)
+            if isinstance(e, requests.exceptions.RequestException):
+                metrics.record_upstream(method, None, secs, error=type(e).__name__,
+                                        url=url, params=kwargs.get("params"))
+            raise
+        secs = time.perf_counter() - t0
+        if BREAKER_ENABLED:
+            ok = _upstream_ok(r.status_code)
+            _breaker.record(ok, secs, None if ok else f"HTTP {r.status_code}")
+        retries = getattr(getattr(r.raw, "retries", None), "history", None) or ()
+        size = None if kwargs.get("stream") else len(r.content)
+        metrics.record_upstream(method, r.status_code, secs, size, len(retries),
+                                url=url, params=kwargs.get("params"))
+        return r
+
+
+def build_session(s_key: str) -> requests.Session:
+    sess = _TimedSession()
+    retry = _BudgetRetry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = _PooledAdapter(
+        max_retries=retry,
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=POOL_BLOCK,
+    )
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+
+    sess.headers.update({
+        "Authorization": f"Bearer {s_key}",
+        "apikey": s_key,
+        "Content-Type": "application/json",
+    })
+    return sess
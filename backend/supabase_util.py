@@ -0,0 +1,64 @@
+# backend/supabase_util.py — Helpers compartidos por los blueprints que hablan con Supabase
+#
+# Respuesta 503 cuando el breaker o la admisión cortan, mensajes de error de
+# PostgREST y parseo de parámetros/headers. No importa requests: sólo mira
+# objetos respuesta ya armados.
+from __future__ import annotations
+
+import math
+
+from flask import Response, jsonify
+
+from breaker import CircuitOpenError, UpstreamBusyError
+
+
+def upstream_unavailable(e: CircuitOpenError) -> Response:
+    """503 con Retry-After para CircuitOpenError (o UpstreamBusyError)."""
+    retry_after = int(math.ceil(e.retry_after))
+    busy = isinstance(e, UpstreamBusyError)
+    resp = jsonify({
+        "error": "overloaded" if busy else "upstream_unavailable",
+        "detail": "Demasiadas consultas en curso a Supabase; reintentar más tarde" if busy
+        else "Supabase no responde; reintentar más tarde",
+        "retry_after_s": retry_after,
+    })
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(retry_after)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+def safe_err(e: Exception) -> str:
+    s = str(e)
+    return (s[:240] + "...") if len(s) > 240 else s
+
+
+def pg_message(r) -> str:
+    """Mensaje legible de una respuesta de error de PostgREST."""
+    try:
+        body = r.json()
+        msg = " ".join(str(body.get(k)) for k in ("message", "details") if body.get(k))
+    except ValueError:
+        msg = r.text
+    return f"HTTP {r.status_code}: {(msg or r.reason or '')[:200]}"
+
+
+def content_range_total(h: str | None) -> int | None:
+    """Total de un Content-Range ("0-49/1234" -> 1234); None si no vino ("0-49/*")."""
+    if not h or "/" not in h:
+        return None
+    tail = h.rsplit("/", 1)[1].strip()
+    return int(tail) if tail.isdigit() else None
+
+
+def parse_total(h: str | None) -> int:
+    """Como content_range_total, pero 0 cuando no hay total."""
+    return content_range_total(h) or 0
+
+
+def bounded_int(value: str | None, default: int, min_v: int, max_v: int) -> int:
+    try:
+        v = int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        return default
+    return max(min_v, min(v, max_v))
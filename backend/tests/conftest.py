@@ -0,0 +1,69 @@
+# backend/tests/conftest.py — Entorno común de las pruebas
+#
+# Settings se lee una sola vez por proceso, así que el entorno se arma acá,
+# antes de que cualquier prueba importe la app: Supabase es el PostgREST de
+# mentira de bench/ (en memoria, en un hilo), sin réplica, con caché local y
+# sin rate limit.
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from http.server import ThreadingHTTPServer
+import threading
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench import fake_postgrest  # noqa: E402
+
+UPSTREAM_ROWS = 300
+
+_table = fake_postgrest.Table(fake_postgrest.generate(UPSTREAM_ROWS))
+_server = ThreadingHTTPServer(("127.0.0.1", 0), fake_postgrest.make_handler(_table, fake_postgrest.Settings()))
+_server.daemon_threads = True
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+os.environ.update({
+    "SUPABASE_URL": f"http://127.0.0.1:{_server.server_port}",
+    "SUPABASE_SERVICE_ROLE_KEY": "test",
+    "AFILIADOS_READ_MODE": "supabase",
+    "REPLICA_SYNC": "0",
+    "INDEX_SCAN": "0",
+    "CACHE_BACKEND": "local",
+    "RATE_LIMIT_ENABLED": "0",
+    "ADMIN_TOKEN": "test",
+    "IMPORTS_DIR": tempfile.mkdtemp(prefix="imports-"),
+    "LOG_LEVEL": "WARNING",
+})
+
+
+@pytest.fixture(scope="session")
+def upstream() -> fake_postgrest.Table:
+    """La tabla del PostgREST de mentira (se puede modificar desde la prueba)."""
+    return _table
+
+
+@pytest.fixture
+def restore_upstream(upstream):
+    """Para pruebas que dan de alta o borran filas: al terminar, la tabla vuelve a como estaba."""
+    rows = list(upstream.rows)
+    yield upstream
+    with upstream._lock:
+        upstream.rows[:] = rows
+        upstream.by_dni = {r[fake_postgrest._POS["dni"]]: r for r in rows}
+        upstream._sorted.clear()
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
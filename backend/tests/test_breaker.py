@@ -0,0 +1,121 @@
+# backend/tests/test_breaker.py — Estados del circuit breaker con un reloj de mentira
+import pytest
+
+import breaker
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(breaker.time, "monotonic", c)
+    return c
+
+
+def _breaker(**kw) -> CircuitBreaker:
+    opts = dict(window_s=30.0, min_calls=4, error_rate=0.5, slow_call_s=2.0, slow_rate=0.8,
+                open_s=10.0, half_open_calls=2)
+    return CircuitBreaker("test", **{**opts, **kw})
+
+
+def _trip(b: CircuitBreaker):
+    for _ in range(b.min_calls):
+        assert b.allow()
+        b.record(False, 0.01, "HTTP 503")
+    assert b.state == OPEN
+
+
+def test_opens_at_min_calls_with_error_rate(clock):
+    b = _breaker()
+    for ok in (False, True, False):
+        assert b.allow()
+        b.record(ok, 0.01)
+    assert b.state == CLOSED          # 2/3 errores, pero por debajo de min_calls
+    b.record(True, 0.01)
+    assert b.state == OPEN            # 2/4 = error_rate
+
+    assert not b.allow()
+    assert b.rejected == 1
+    assert b.is_open()
+    clock.t += 4
+    assert b.retry_after() == pytest.approx(6.0)
+    assert b.status()["open_for_s"] == 6.0
+
+
+def test_old_errors_leave_the_window(clock):
+    b = _breaker()
+    for _ in range(3):
+        b.record(False, 0.01)
+    clock.t += 31
+    for _ in range(3):
+        b.record(True, 0.01)
+    assert b.state == CLOSED
+    assert b.status()["window_calls"] == 3
+
+
+def test_half_open_probes_then_close(clock):
+    b = _breaker()
+    _trip(b)
+    clock.t += 10
+    assert not b.is_open()
+    assert b.allow() and b.allow()    # half_open_calls=2
+    assert b.state == HALF_OPEN
+    assert not b.allow()              # una tercera no sale mientras las dos están en vuelo
+    b.record(True, 0.01)
+    assert b.state == HALF_OPEN
+    b.record(True, 0.01)
+    assert b.state == CLOSED
+    assert b.status()["window_calls"] == 0
+    assert b.allow()
+
+
+def test_failed_probe_reopens(clock):
+    b = _breaker()
+    _trip(b)
+    clock.t += 10
+    assert b.allow()
+    b.record(False, 0.01, "HTTP 500")
+    assert b.state == OPEN
+    assert b.opened_count == 2
+    assert b.last_error == "HTTP 500"
+    assert not b.allow()
+    assert b.retry_after() == pytest.approx(10.0)
+
+
+def test_slow_calls_trip(clock):
+    b = _breaker()
+    for _ in range(4):
+        b.record(True, 2.5)
+    assert b.state == OPEN
+    assert "llamadas de más de 2s" in b.last_error
+
+
+def test_slow_probe_reopens(clock):
+    b = _breaker()
+    _trip(b)
+    clock.t += 10
+    assert b.allow()
+    b.record(True, 3.0)
+    assert b.state == OPEN
+
+
+def test_open_circuit_is_503(client, clock):
+    import supabase_client
+
+    b = supabase_client._breaker
+    try:
+        _trip(b)
+        resp = client.get("/api/afiliados/", query_string={"q": "breaker-abierto"})
+        assert resp.status_code == 503
+        assert resp.get_json()["error"] == "upstream_unavailable"
+        assert int(resp.headers["Retry-After"]) == int(b.open_s)
+    finally:
+        b.reset()
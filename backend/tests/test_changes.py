@@ -0,0 +1,99 @@
+# backend/tests/test_changes.py — /changes: token since, keyset por (actualizado_en, id) y bajas
+import base64
+import json
+
+import pytest
+
+from routes.afiliados import _decode_since, _encode_since, _pg_quote
+
+
+def _token(**mark) -> str:
+    raw = json.dumps({"v": 1, **mark}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _sync(client, local: dict, since=None, limit=50):
+    """Sincroniza la copia local (id -> fila) hasta has_more=false, como syncAfiliados.
+
+    Devuelve (next, ids recibidos, hubo reset)."""
+    seen, reset = [], False
+    while True:
+        q = {"limit": limit}
+        if since:
+            q.update(since=since, have=len(local))
+        resp = client.get("/api/afiliados/changes", query_string=q)
+        assert resp.status_code == 200, resp.get_json()
+        page = resp.get_json()
+        if page["reset"]:
+            local.clear()
+            seen, reset = [], True
+        for row in page["data"]:
+            local[row["id"]] = row
+            seen.append(row["id"])
+        since = page["next"]
+        if not page["has_more"]:
+            return since, seen, reset
+
+
+def test_since_round_trip():
+    mark = {"u": "2024-05-01T10:00:00+00:00", "i": 9, "du": None, "di": None}
+    assert _decode_since(_encode_since(mark)) == mark
+
+
+@pytest.mark.parametrize("mark", [
+    {"u": "2024-01-01),id.gt.(0", "i": 1},          # intento de colar un filtro
+    {"u": 20240101, "i": 1},
+    {"u": "2024-01-01T00:00:00", "i": "1"},
+    {"u": "2024-01-01T00:00:00", "i": None},
+])
+def test_since_rejects_bad_marks(mark):
+    with pytest.raises(ValueError):
+        _decode_since(_token(**mark))
+
+
+def test_since_invalid_is_400(client):
+    resp = client.get("/api/afiliados/changes", query_string={"since": _token(u="x),or(id.gt.0", i=1), "have": 0})
+    assert resp.status_code == 400
+
+
+def test_pg_quote():
+    assert _pg_quote("2024-01-01T00:00:00+00:00") == '"2024-01-01T00:00:00+00:00"'
+    assert _pg_quote('a"b\\c') == '"a\\"b\\\\c"'
+
+
+def test_changes_same_timestamp_across_pages(client, restore_upstream):
+    upstream = restore_upstream
+    local = {}
+    since, seen, _ = _sync(client, local)
+    assert len(seen) == len(set(seen)) == len(upstream.rows)
+
+    # Un lote con el mismo actualizado_en (con "+00:00": el valor va entre comillas
+    # en el filtro) partido en varias páginas: cada fila una sola vez
+    new = [{"dni": str(70_000_000 + i), "apellido": "Lote", "nombres": f"N{i}"} for i in range(23)]
+    upstream.upsert(new, "dni")
+    since, seen, reset = _sync(client, local, since, limit=5)
+    assert not reset
+    assert len(seen) == len(set(seen)) == len(new)
+    assert sorted(local[i]["dni"] for i in seen) == sorted(r["dni"] for r in new)
+
+    _, seen, _ = _sync(client, local, since)
+    assert seen == []
+
+
+def test_changes_without_replica_needs_have(client):
+    since, _, _ = _sync(client, {})
+    resp = client.get("/api/afiliados/changes", query_string={"since": since})
+    assert resp.status_code == 409
+    assert resp.get_json()["error"] == "have_requerido"
+
+
+def test_changes_reset_after_delete(client, restore_upstream):
+    upstream = restore_upstream
+    local = {}
+    since, _, _ = _sync(client, local)
+    with upstream._lock:
+        upstream.rows.pop(0)
+        upstream._sorted.clear()
+    _, _, reset = _sync(client, local, since, limit=40)
+    assert reset
+    assert len(local) == len(upstream.rows)
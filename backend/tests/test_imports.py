@@ -0,0 +1,73 @@
+# backend/tests/test_imports.py — Importación que falla a mitad de camino y se retoma
+import io
+import json
+
+from imports import ImportJob, last_done
+
+ROWS = 95
+BAD = {5, 62}   # registros inválidos: uno antes del corte y otro en la tanda que falla
+
+
+def _csv() -> io.BytesIO:
+    lines = ["DNI;Apellido;Nombres"]
+    for n in range(1, ROWS + 1):
+        lines.append(f"{'x' if n in BAD else 20_000_000 + n};Apellido{n};Nombre{n}")
+    return io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+def _normalize(rec: dict) -> dict:
+    if not rec["dni"].isdigit():
+        raise ValueError("dni inválido")
+    return {"dni": rec["dni"], "apellido": rec["apellido"], "nombres": rec["nombres"]}
+
+
+class Upstream:
+    """upsert que registra cada DNI y puede fallar a partir del lote N."""
+
+    def __init__(self, fail_on: int | None = None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.dnis: list[str] = []
+
+    def __call__(self, rows: list[dict]) -> list[tuple[int, str]]:
+        self.calls += 1
+        if self.fail_on is not None and self.calls >= self.fail_on:
+            raise ConnectionError("Supabase no responde")
+        self.dnis += [r["dni"] for r in rows]
+        return []
+
+
+def test_import_resumes_from_checkpoint(tmp_path):
+    job = ImportJob.create(_csv(), "csv", root=str(tmp_path))
+
+    first = Upstream(fail_on=7)
+    st = job.run(_normalize, first, batch_size=10, workers=1)
+    assert st["status"] == "failed"
+    assert "Supabase no responde" in st["error"]
+    assert job.status()["resumable"]
+    # El checkpoint es el último lote confirmado: 6 lotes de 10 (más el inválido de la línea 5)
+    assert st["upserted"] == len(first.dnis) == 60
+    assert st["rows_read"] == 61
+    assert st["rejected"] == 1
+    assert last_done(str(tmp_path)) is None
+
+    done = []
+    second = Upstream()
+    st = job.run(_normalize, second, on_done=done.append, batch_size=10, workers=1)
+    assert st["status"] == "done"
+    assert st["attempts"] == 2
+    # Nada del tramo ya confirmado se manda de nuevo
+    assert not set(first.dnis) & set(second.dnis)
+    dnis = first.dnis + second.dnis
+    assert len(dnis) == len(set(dnis)) == ROWS - len(BAD)
+    assert st["upserted"] == ROWS - len(BAD)
+    assert st["rows_read"] == ROWS
+    # El inválido posterior al checkpoint se reprocesa sin quedar dos veces en errors.ndjson
+    errors = [json.loads(line) for line in job.iter_errors()]
+    assert sorted(e["line"] for e in errors) == sorted(n + 1 for n in BAD)
+    assert st["rejected"] == len(BAD)
+    assert done and done[0]["id"] == job.id
+    assert last_done(str(tmp_path)).endswith(job.id)
+
+    # Un trabajo terminado no se vuelve a procesar
+    assert job.run(_normalize, Upstream(fail_on=1), batch_size=10, workers=1)["status"] == "done"
@@ -0,0 +1,48 @@
+# backend/tests/test_passthrough.py — Páginas grandes copiadas de Supabase sin decodificar
+import json
+
+import pytest
+
+import routes.afiliados as af
+from routes.afiliados import _edge_rows, _last_object_start
+
+TRICKY = [
+    {"id": 1, "apellido": "O'Brien", "nota": "llave } suelta"},
+    {"id": 2, "apellido": 'dice "hola"', "nota": "barra \\ y comilla \\\""},
+    {"id": 3, "apellido": "Núñez {anidado}", "extra": {"a": [1, {"b": "}"}]}},
+]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_edge_rows(indent):
+    raw = json.dumps(TRICKY, ensure_ascii=False, indent=indent).encode("utf-8")
+    assert _edge_rows(b"  " + raw + b"\n") == (TRICKY[0], TRICKY[-1])
+
+
+def test_edge_rows_single_and_empty():
+    assert _edge_rows(b'[{"id": 7}]') == ({"id": 7}, {"id": 7})
+    assert _edge_rows(b"[]") is None
+    assert _edge_rows(b"[ ]") is None
+    assert _edge_rows(b'{"id": 1}') is None
+
+
+def test_last_object_start():
+    raw = json.dumps(TRICKY).encode()
+    close = raw.rindex(b"}")
+    assert json.loads(raw[_last_object_start(raw, close):close + 1]) == TRICKY[-1]
+    with pytest.raises(ValueError):
+        _last_object_start(b'"}"', 1)
+
+
+def test_passthrough_page_keeps_cursor(client, monkeypatch):
+    monkeypatch.setattr(af, "JSON_PASSTHROUGH_MIN_ROWS", 50)
+    page = client.get("/api/afiliados/", query_string={"fields": "id,dni,apellido", "page_size": 50}).get_json()
+    assert page["passthrough"] is True
+    assert page["has_next"] and page["next_cursor"]
+    nxt = client.get("/api/afiliados/", query_string={"fields": "id,dni,apellido", "cursor": page["next_cursor"]})
+    assert nxt.get_json()["data"][0]["id"] not in {row["id"] for row in page["data"]}
+
+    # Sin las columnas del cursor no hay passthrough: se decodifica para sacarlas
+    page = client.get("/api/afiliados/", query_string={"fields": "dni", "page_size": 50}).get_json()
+    assert "passthrough" not in page
+    assert page["next_cursor"] and all(set(row) == {"dni"} for row in page["data"])
@@ -78,6 +78,39 @@ export async function getByDni(dni) {
   return data;
 }
 
+/** Cambios desde el último token (altas/modificaciones + bajas)
+ * @param {string|null} since  token `next` de la sincronización anterior (null = todo)
+ * @param {{limit?:number, fields?:string, have?:number}} params
+ * Repetir con since=next mientras has_more sea true; después guardar next.
+ * Sin réplica el backend exige `have` (filas de la copia local) para detectar bajas.
+ */
+export async function getAfiliadosChanges(since = null, params = {}) {
+  const res = await fetch(`${BASE}/changes${qs({ ...params, since })}`, { credentials: "include" });
+  return handle(res); // -> { data, deleted, next, has_more, deletes_tracked, reset, source }
+}
+
+/** Sincroniza una copia local (Map id -> afiliado) desde el token guardado.
+ * Aplica altas/modificaciones y bajas; con reset=true (bajas detectadas por
+ * conteo, sin réplica) vacía la copia y sigue con la carga completa.
+ * @returns {Promise<{since:string|null, deletesTracked:boolean, reset:boolean}>}
+ */
+export async function syncAfiliados(local, since = null, params = {}) {
+  let deletesTracked = true;
+  let reset = false;
+  for (;;) {
+    const page = await getAfiliadosChanges(since, { ...params, have: since ? local.size : undefined });
+    if (page.reset) {
+      local.clear();
+      reset = true;
+    }
+    page.data.forEach((row) => local.set(row.id, row));
+    page.deleted.forEach((d) => local.delete(d.id));
+    deletesTracked = deletesTracked && page.deletes_tracked;
+    since = page.next;
+    if (!page.has_more) return { since, deletesTracked, reset };
+  }
+}
+
 /** Crea un afiliado */
 export async function createAfiliado(payload) {
   const res = await fetch(BASE, {
@@ -115,6 +148,8 @@ export default {
   listAfiliados,
   getAfiliado,
   getByDni,
+  getAfiliadosChanges,
+  syncAfiliados,
   createAfiliado,
   updateAfiliado,
   deleteAfiliado,
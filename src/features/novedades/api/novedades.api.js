@@ -43,7 +43,7 @@ export async function createNovedad(payload) {
 
 export async function updateNovedad(id, payload) {
   const res = await fetch(R.update(id), {
-    method: 'PUT',
+    method: 'PATCH',
     ...json(payload),
     credentials: 'include',
   });